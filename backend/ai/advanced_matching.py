@@ -9,13 +9,76 @@ from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import DBSCAN
 import json
 import os
+import threading
 from datetime import datetime, timedelta
 
 # Load threshold from environment
-from config import MIN_CONFIDENCE_THRESHOLD
+from config import MIN_CONFIDENCE_THRESHOLD, EMBEDDING_DTYPE
+from ai.embedding_storage import load_enhanced_embedding
 
 logger = logging.getLogger(__name__)
 
+# SciPy's BLAS binding lets the gallery product run as SGEMM without a NumPy temporary
+try:
+    from scipy.linalg.blas import sgemm
+    SCIPY_BLAS_AVAILABLE = True
+except ImportError:
+    SCIPY_BLAS_AVAILABLE = False
+
+# Numba is optional - JIT-compiles the similarity kernel when BLAS is unavailable
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_similarity_matrix(queries, gallery, out):
+        """Dot product of every (normalized) query against every gallery row, filled in place"""
+        for i in prange(queries.shape[0]):
+            for j in range(gallery.shape[0]):
+                acc = 0.0
+                for k in range(queries.shape[1]):
+                    acc += queries[i, k] * gallery[j, k]
+                out[i, j] = acc
+
+
+def _gallery_similarities(query_matrix: np.ndarray, gallery: np.ndarray) -> np.ndarray:
+    """Cosine similarity matrix (M, N) between normalized queries and a normalized gallery"""
+    # Cast at the boundary - a stray float64 operand would promote the product to
+    # double precision (no copy when already float32)
+    query_matrix = query_matrix.astype(np.float32, copy=False)
+    gallery = gallery.astype(np.float32, copy=False)
+    
+    if SCIPY_BLAS_AVAILABLE:
+        return sgemm(1.0, query_matrix, gallery, trans_b=True)
+    if NUMBA_AVAILABLE:
+        similarities = np.empty((len(query_matrix), len(gallery)), dtype=np.float32)
+        _cosine_similarity_matrix(query_matrix, gallery, similarities)
+        return similarities
+    return query_matrix @ gallery.T
+
+
+# An int8 gallery is only read by the Numba kernel, which consumes it directly;
+# the BLAS path would need a full float32 copy per call, undoing the saving
+INT8_GALLERY = EMBEDDING_DTYPE == "int8" and NUMBA_AVAILABLE
+if EMBEDDING_DTYPE == "int8" and not NUMBA_AVAILABLE:
+    logger.warning("⚠️ EMBEDDING_DTYPE=int8 needs numba; keeping the recognition gallery in float32")
+
+
+def _quantized_gallery_similarities(query_matrix: np.ndarray, gallery: np.ndarray,
+                                    scales: np.ndarray) -> np.ndarray:
+    """Cosine similarity matrix (M, N) against an int8 gallery, dequantized per row after the product"""
+    if gallery.dtype != np.int8:
+        raise TypeError(f"Quantized gallery must be int8, got {gallery.dtype}")
+    query_matrix = query_matrix.astype(np.float32, copy=False)
+    similarities = np.empty((len(query_matrix), len(gallery)), dtype=np.float32)
+    _cosine_similarity_matrix(query_matrix, gallery, similarities)
+    similarities *= scales
+    return similarities
+
 class AdvancedFaceMatcher:
     """
     Advanced face matching system with:
@@ -28,9 +91,11 @@ class AdvancedFaceMatcher:
     
     def __init__(self):
         self.student_profiles = {}  # Student-specific optimization data
+        self.profiles_version = 0  # Bumped whenever profiles are (re)loaded
         self.recognition_history = {}  # Track recognition patterns
         self.adaptive_thresholds = {}  # Per-student thresholds
         self.confidence_calibration = {}  # Confidence calibration data
+        self._history_lock = threading.Lock()  # Faces may be matched concurrently
         
         # Matching strategies
         self.strategies = {
@@ -50,37 +115,39 @@ class AdvancedFaceMatcher:
                            variants_path: str = None, metadata_path: str = None):
         """Load and optimize student profile"""
         try:
-            # Load primary embedding
-            primary_embedding = np.load(embedding_path)
-            
-            # Load variants if available
-            variants = []
-            if variants_path and os.path.exists(variants_path):
-                variants = np.load(variants_path)
-            
-            # Load metadata if available
-            metadata = {}
-            if metadata_path and os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-            
-            # Initialize student profile
-            self.student_profiles[student_id] = {
-                'primary_embedding': primary_embedding,
-                'variants': variants,
-                'metadata': metadata,
-                'recognition_count': 0,
-                'successful_matches': 0,
-                'failed_matches': 0,
-                'last_updated': datetime.now(),
-                'adaptive_threshold': self._calculate_initial_threshold(primary_embedding, variants)
-            }
+            # Load primary embedding, variants and metadata (single open for HDF5 bundles)
+            primary_embedding, variants, metadata = load_enhanced_embedding(
+                embedding_path, variants_path, metadata_path
+            )
             
-            logger.info(f"📚 Loaded profile for student {student_id} (variants: {len(variants)})")
+            self.add_student_profile(student_id, primary_embedding, variants, metadata)
             
         except Exception as e:
             logger.error(f"Failed to load profile for student {student_id}: {e}")
     
+    def add_student_profile(self, student_id: int, primary_embedding: np.ndarray,
+                            variants: List[np.ndarray] = None, metadata: Dict[str, Any] = None):
+        """Initialize a student profile from an already-loaded embedding"""
+        variants = variants if variants is not None else []
+        metadata = metadata or {}
+        
+        # Initialize student profile
+        self.student_profiles[student_id] = {
+            'primary_embedding': primary_embedding,
+            'variants': variants,
+            'metadata': metadata,
+            'normalized': bool(metadata.get('normalized', False)),  # Stored unit-norm at ingest
+            'recognition_count': 0,
+            'successful_matches': 0,
+            'failed_matches': 0,
+            'last_updated': datetime.now(),
+            'adaptive_threshold': self._calculate_initial_threshold(primary_embedding, variants)
+        }
+        
+        self.profiles_version += 1
+        
+        logger.info(f"📚 Loaded profile for student {student_id} (variants: {len(variants)})")
+    
     def _calculate_initial_threshold(self, primary_embedding: np.ndarray, 
                                    variants: List[np.ndarray]) -> float:
         """Calculate initial adaptive threshold for student"""
@@ -90,7 +157,7 @@ class AdvancedFaceMatcher:
         # Calculate intra-personal distances
         distances = []
         for variant in variants:
-            dist = np.linalg.norm(primary_embedding - variant)
+            dist = np.linalg.norm(primary_embedding - variant.astype(np.float32, copy=False))
             distances.append(dist)
         
         # Use 95th percentile as initial threshold
@@ -145,26 +212,10 @@ class AdvancedFaceMatcher:
             # confidence = self._apply_temporal_consistency(student_id, confidence)
             
             # Adaptive decision threshold based on group size
-            # Use MIN_CONFIDENCE_THRESHOLD from .env as base (default 0.20)
-            base_threshold = MIN_CONFIDENCE_THRESHOLD
+            decision_threshold = self._get_decision_threshold(group_size)
             
-            # For group photos, we need to be MORE lenient, not stricter
-            # Reason: Group photos have lower quality faces due to distance, angle, lighting
-            if group_size == 1:
-                decision_threshold = base_threshold + 0.05  # 0.25 for single face (can be stricter)
-            elif group_size <= 3:
-                decision_threshold = base_threshold  # 0.20 for tiny groups
-            elif group_size <= 6:
-                decision_threshold = base_threshold - 0.02  # 0.18 for small groups
-            elif group_size <= 10:
-                decision_threshold = base_threshold - 0.03  # 0.17 for medium groups
-            else:
-                decision_threshold = base_threshold - 0.05  # 0.15 for large groups (most lenient)
-            
-            # Ensure threshold is reasonable
-            decision_threshold = max(0.10, min(0.40, decision_threshold))
-            
-            logger.debug(f"Student {student_id}: confidence={confidence:.3f}, threshold={decision_threshold:.3f} (group_size={group_size})")
+            logger.debug("Student %s: confidence=%.3f, threshold=%.3f (group_size=%d)",
+                         student_id, confidence, decision_threshold, group_size)
             
             matches.append({
                 'student_id': student_id,
@@ -188,6 +239,145 @@ class AdvancedFaceMatcher:
         
         return matches
     
+    def build_gallery(self, student_ids: List[int], dim: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stack the loaded primary embeddings of the given students into a gallery
+        
+        Args:
+            student_ids: Students to include (unloaded profiles are skipped)
+            dim: Embedding dimension of the queries; other profiles are skipped
+            
+        Returns:
+            Tuple of (L2-normalized gallery (N, D) float32, student IDs (N,) per row)
+        """
+        # Preallocate the slab and copy each embedding straight into its row
+        gallery = np.empty((len(student_ids), dim), dtype=np.float32)
+        gallery_ids = []
+        for student_id in student_ids:
+            profile = self.student_profiles.get(student_id)
+            if profile is None:
+                continue
+            
+            primary_embedding = profile['primary_embedding']
+            # Handle 2D embeddings (take first if multiple)
+            if primary_embedding.ndim == 2:
+                primary_embedding = primary_embedding[0]
+            if primary_embedding.shape != (dim,):
+                logger.warning(f"⚠️ Skipping student {student_id}: embedding size {primary_embedding.size} != {dim}")
+                continue
+            
+            gallery[len(gallery_ids)] = primary_embedding
+            gallery_ids.append(student_id)
+        
+        gallery = gallery[:len(gallery_ids)]
+        gallery /= np.linalg.norm(gallery, axis=1, keepdims=True) + 1e-12
+        return gallery, np.array(gallery_ids, dtype=np.int32)
+    
+    def quantize_gallery(self, gallery: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quantize a normalized gallery to int8 with one float32 scale per row
+        
+        Returns:
+            Tuple of (int8 gallery (N, D), scales (N,)) with gallery ~= int8 * scale
+        """
+        scales = np.abs(gallery).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.round(gallery / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    
+    def match_faces_batch(self, query_matrix: np.ndarray, gallery: np.ndarray,
+                          gallery_ids: np.ndarray, group_size: int = 1,
+                          scales: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Match several faces against a stacked gallery with one matrix multiply
+        
+        Scores are the same as match_face's; students with legacy variants get
+        the same weighted ensemble. Per-strategy scores are not reported.
+        
+        Args:
+            query_matrix: L2-normalized query embeddings (M, D)
+            gallery: L2-normalized primary embeddings (N, D) from build_gallery
+            gallery_ids: Student ID of each gallery row (N,)
+            group_size: Number of faces detected (for adaptive thresholds)
+            scales: Per-row scales when the gallery is int8 from quantize_gallery
+            
+        Returns:
+            Dictionary with the confidence matrix (M, N), top 3 gallery rows,
+            best gallery row, best confidence and match decision per face, and
+            the decision threshold
+        """
+        top_k = min(3, len(gallery_ids))
+        # The full matrix is needed anyway (confidences and recognition history),
+        # so the top k are selected from it rather than by a separate search
+        if scales is not None:
+            # Dequantize after the product: (Q @ G8.T) * scale per student
+            similarities = _quantized_gallery_similarities(query_matrix, gallery, scales)
+        else:
+            # Cosine similarity of every face against every student in one
+            # single-precision GEMM (or the Numba kernel without BLAS)
+            similarities = _gallery_similarities(query_matrix, gallery)
+        scores = np.maximum(0.0, 1.0 - (1.0 - similarities) / 0.8)
+        
+        # Legacy profiles with variants: primary (60%) + variants (30%) + ensemble (10%)
+        for column, student_id in enumerate(gallery_ids.tolist()):
+            variants = self.student_profiles[student_id].get('variants', [])
+            if len(variants) == 0:
+                continue
+            variants = np.asarray(variants, dtype=np.float32).reshape(len(variants), -1)
+            variant_similarities = (query_matrix @ variants.T) / np.linalg.norm(variants, axis=1)
+            variant_scores = np.maximum(0.0, 1.0 - (1.0 - variant_similarities.max(axis=1)) / 0.8)
+            primary_scores = scores[:, column]
+            scores[:, column] = primary_scores * 0.65 + variant_scores * 0.35
+        
+        confidences = np.clip(scores, 0.0, 1.0)
+        decision_threshold = self._get_decision_threshold(group_size)
+        is_match = confidences > decision_threshold
+        
+        # Partial sort: select the top k in O(N), then order only those k
+        if top_k < confidences.shape[1]:
+            top_indices = np.argpartition(-confidences, top_k - 1, axis=1)[:, :top_k]
+        else:
+            top_indices = np.broadcast_to(np.arange(top_k), confidences.shape).copy()
+        top_confidences = np.take_along_axis(confidences, top_indices, axis=1)
+        top_indices = np.take_along_axis(top_indices, np.argsort(-top_confidences, axis=1), axis=1)
+        best_index = top_indices[:, 0]
+        best_confidence = confidences[np.arange(len(confidences)), best_index]
+        
+        # Update recognition history
+        self._update_recognition_history_batch(gallery_ids, confidences, is_match)
+        
+        return {
+            'confidences': confidences,
+            'top_indices': top_indices,
+            'best_index': best_index,
+            'best_confidence': best_confidence,
+            'is_match': is_match[np.arange(len(is_match)), best_index],
+            'decision_threshold': decision_threshold
+        }
+    
+    def _get_decision_threshold(self, group_size: int) -> float:
+        """Adaptive decision threshold based on group size"""
+        # Use MIN_CONFIDENCE_THRESHOLD from .env as base (default 0.20)
+        base_threshold = MIN_CONFIDENCE_THRESHOLD
+        
+        # For group photos, we need to be MORE lenient, not stricter
+        # Reason: Group photos have lower quality faces due to distance, angle, lighting
+        if group_size == 1:
+            decision_threshold = base_threshold + 0.05  # 0.25 for single face (can be stricter)
+        elif group_size <= 3:
+            decision_threshold = base_threshold  # 0.20 for tiny groups
+        elif group_size <= 6:
+            decision_threshold = base_threshold - 0.02  # 0.18 for small groups
+        elif group_size <= 10:
+            decision_threshold = base_threshold - 0.03  # 0.17 for medium groups
+        else:
+            decision_threshold = base_threshold - 0.05  # 0.15 for large groups (most lenient)
+        
+        # Ensure threshold is reasonable
+        decision_threshold = max(0.10, min(0.40, decision_threshold))
+        
+        return decision_threshold
+    
     def _match_primary(self, query_embedding: np.ndarray, profile: Dict) -> float:
         """Match using primary embedding"""
         primary_embedding = profile['primary_embedding']
@@ -196,8 +386,11 @@ class AdvancedFaceMatcher:
         if primary_embedding.ndim == 2:
             primary_embedding = primary_embedding[0] if len(primary_embedding) > 0 else primary_embedding.flatten()
         
-        # Cosine similarity
-        similarity = cosine_similarity([query_embedding], [primary_embedding])[0][0]
+        # Cosine similarity (stored embedding is already unit-norm when normalized)
+        if profile.get('normalized'):
+            similarity = np.dot(query_embedding, primary_embedding) / np.linalg.norm(query_embedding)
+        else:
+            similarity = cosine_similarity([query_embedding], [primary_embedding])[0][0]
         
         # Convert to distance-based score with more lenient normalization
         distance = 1 - similarity
@@ -213,12 +406,18 @@ class AdvancedFaceMatcher:
             return 0.0
         
         # Calculate similarity with each variant
+        query_norm = np.linalg.norm(query_embedding)
         similarities = []
         for variant in variants:
             # Handle 2D variants
             if variant.ndim == 2:
                 variant = variant[0] if len(variant) > 0 else variant.flatten()
-            similarity = cosine_similarity([query_embedding], [variant])[0][0]
+            # Variants may be stored as fp16 - upcast just this row for the comparison
+            variant = variant.astype(np.float32, copy=False)
+            if profile.get('normalized'):
+                similarity = np.dot(query_embedding, variant) / query_norm
+            else:
+                similarity = cosine_similarity([query_embedding], [variant])[0][0]
             similarities.append(similarity)
         
         # Use best similarity with more lenient normalization
@@ -311,34 +510,62 @@ class AdvancedFaceMatcher:
     
     def _update_recognition_history(self, matches: List[Dict[str, Any]]):
         """Update recognition history for learning"""
-        for match in matches:
-            student_id = match['student_id']
-            confidence = match['confidence']
-            
-            if student_id not in self.recognition_history:
-                self.recognition_history[student_id] = []
-            
-            # Add to history
-            self.recognition_history[student_id].append({
-                'timestamp': datetime.now(),
-                'confidence': confidence,
-                'is_match': match['is_match']
-            })
-            
-            # Keep only recent history (last 24 hours)
-            cutoff_time = datetime.now() - timedelta(hours=24)
-            self.recognition_history[student_id] = [
-                h for h in self.recognition_history[student_id] 
-                if h['timestamp'] > cutoff_time
-            ]
-            
-            # Update profile statistics
-            if match['is_match']:
-                self.student_profiles[student_id]['successful_matches'] += 1
-            else:
-                self.student_profiles[student_id]['failed_matches'] += 1
-            
-            self.student_profiles[student_id]['recognition_count'] += 1
+        with self._history_lock:
+            for match in matches:
+                student_id = match['student_id']
+                confidence = match['confidence']
+                
+                if student_id not in self.recognition_history:
+                    self.recognition_history[student_id] = []
+                
+                # Add to history
+                self.recognition_history[student_id].append({
+                    'timestamp': datetime.now(),
+                    'confidence': confidence,
+                    'is_match': match['is_match']
+                })
+                
+                # Keep only recent history (last 24 hours)
+                cutoff_time = datetime.now() - timedelta(hours=24)
+                self.recognition_history[student_id] = [
+                    h for h in self.recognition_history[student_id] 
+                    if h['timestamp'] > cutoff_time
+                ]
+                
+                # Update profile statistics
+                if match['is_match']:
+                    self.student_profiles[student_id]['successful_matches'] += 1
+                else:
+                    self.student_profiles[student_id]['failed_matches'] += 1
+                
+                self.student_profiles[student_id]['recognition_count'] += 1
+    
+    def _update_recognition_history_batch(self, gallery_ids: np.ndarray,
+                                          confidences: np.ndarray, is_match: np.ndarray):
+        """Update recognition history for a (faces x students) batch of matches"""
+        now = datetime.now()
+        cutoff_time = now - timedelta(hours=24)
+        face_count = len(confidences)
+        match_counts = is_match.sum(axis=0)
+        
+        with self._history_lock:
+            for column, student_id in enumerate(gallery_ids.tolist()):
+                # Keep only recent history (last 24 hours)
+                history = [
+                    h for h in self.recognition_history.get(student_id, [])
+                    if h['timestamp'] > cutoff_time
+                ]
+                history.extend(
+                    {'timestamp': now, 'confidence': confidence, 'is_match': matched}
+                    for confidence, matched in zip(confidences[:, column].tolist(), is_match[:, column].tolist())
+                )
+                self.recognition_history[student_id] = history
+                
+                # Update profile statistics
+                profile = self.student_profiles[student_id]
+                profile['successful_matches'] += int(match_counts[column])
+                profile['failed_matches'] += face_count - int(match_counts[column])
+                profile['recognition_count'] += face_count
     
     def optimize_student_threshold(self, student_id: int):
         """Optimize threshold for specific student based on history"""
@@ -438,6 +665,7 @@ class AdvancedFaceMatcher:
                 ]
             
             self.adaptive_thresholds = data.get('adaptive_thresholds', {})
+            self.profiles_version += 1
             
             logger.info(f"📚 Loaded optimization data from {filepath}")
             
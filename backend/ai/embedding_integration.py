@@ -8,6 +8,8 @@ import numpy as np
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
+from ai.embedding_storage import read_embedding_blob
+
 logger = logging.getLogger(__name__)
 
 class EmbeddingIntegration:
@@ -65,15 +67,8 @@ class EmbeddingIntegration:
             output_dir = f"static/dataset/{student_name.replace(' ', '_')}_{student_roll_no}"
             os.makedirs(output_dir, exist_ok=True)
             
-            # Save primary embedding
-            primary_path = os.path.join(output_dir, "face_embedding.npy")
-            np.save(primary_path, result['primary_embedding'])
-            
-            # Save variants
-            variants_path = os.path.join(output_dir, "embedding_variants.npy")
-            np.save(variants_path, result['embedding_variants'])
-            
-            # Save metadata
+            # Save primary embedding and metadata
+            from ai.embedding_storage import save_enhanced_embedding
             metadata = {
                 'confidence_score': result['confidence_score'],
                 'quality_scores': result['quality_scores'],
@@ -81,31 +76,32 @@ class EmbeddingIntegration:
                 'method': 'enhanced_ensemble',
                 'models_used': list(result['ensemble_embeddings'].keys())
             }
-            
-            import json
-            metadata_path = os.path.join(output_dir, "embedding_metadata.json")
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            saved_paths = save_enhanced_embedding(
+                output_dir, result['primary_embedding'], metadata
+            )
+            primary_path = saved_paths['embedding_path']
+            metadata_path = saved_paths['metadata_path']
             
             # Copy first image as face.jpg (only if source and destination are different)
             face_photo_path = os.path.join(output_dir, "face.jpg")
             if image_paths and os.path.exists(image_paths[0]):
                 import shutil
-                source_path = os.path.abspath(image_paths[0])
-                dest_path = os.path.abspath(face_photo_path)
+                try:
+                    same_file = os.path.samefile(image_paths[0], face_photo_path)
+                except FileNotFoundError:
+                    same_file = False  # Destination doesn't exist yet
                 
                 # Only copy if source and destination are different files
-                if source_path != dest_path:
-                    shutil.copy(source_path, dest_path)
+                if not same_file:
+                    shutil.copy(image_paths[0], face_photo_path)
                 else:
-                    logger.debug(f"Source and destination are the same file, skipping copy: {source_path}")
+                    logger.debug(f"Source and destination are the same file, skipping copy: {image_paths[0]}")
             
             logger.info(f"🎯 Enhanced embedding saved for {student_name} (confidence: {result['confidence_score']:.3f})")
             
             return {
                 'photo_path': face_photo_path,
                 'embedding_path': primary_path,
-                'variants_path': variants_path,
                 'metadata_path': metadata_path,
                 'confidence_score': result['confidence_score'],
                 'method': 'enhanced',
@@ -183,13 +179,110 @@ class EmbeddingIntegration:
         }
         
         # Determine which method was used
-        if student.embedding_variants_path and os.path.exists(student.embedding_variants_path):
+        if student.has_enhanced_embeddings and student.face_encoding_path and os.path.exists(student.face_encoding_path):
             embedding_info['method'] = 'enhanced'
         elif student.face_encoding_path and os.path.exists(student.face_encoding_path):
             embedding_info['method'] = 'standard'
         
         return embedding_info
     
+    def _collect_student_images(self, student) -> List[str]:
+        """Find the unique source images stored in a student's dataset directory"""
+        # Get original images - use absolute path
+        student_dir = os.path.join(os.getcwd(), f"static/dataset/{student.name.replace(' ', '_')}_{student.roll_no}")
+        if not os.path.exists(student_dir):
+            logger.error(f"Student directory not found: {student_dir}")
+            return []
+        
+        # Find all images in student directory (avoid duplicates)
+        image_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
+        image_paths = []
+        file_hashes = set()  # Track file hashes to avoid duplicates
+        
+        for file in os.listdir(student_dir):
+            if any(file.lower().endswith(ext) for ext in image_extensions):
+                file_path = os.path.join(student_dir, file)
+                
+                # Calculate file hash to detect duplicates
+                try:
+                    import hashlib
+                    with open(file_path, 'rb') as f:
+                        file_hash = hashlib.md5(f.read()).hexdigest()
+                    
+                    if file_hash not in file_hashes:
+                        file_hashes.add(file_hash)
+                        image_paths.append(file_path)
+                    else:
+                        logger.debug(f"Skipping duplicate file: {file}")
+                except Exception as e:
+                    logger.warning(f"Could not hash file {file}: {e}")
+                    # If hashing fails, just add the file
+                    image_paths.append(file_path)
+        
+        return image_paths
+    
+    def _regenerate_student_embedding(self, student) -> Optional[Dict[str, Any]]:
+        """
+        Regenerate a student's embedding files and return the column updates
+        
+        Args:
+            student: Student ORM instance
+            
+        Returns:
+            Mapping of Student column values (including the primary key) suitable
+            for Session.bulk_update_mappings, or None if no images were found
+        """
+        from config import FACE_RECOGNITION_MODEL, FACE_DETECTOR_BACKEND
+        
+        image_paths = self._collect_student_images(student)
+        if not image_paths:
+            logger.error(f"No images found for student {student.id}")
+            return None
+        
+        logger.info(f"🔄 Regenerating embedding for {student.name} using model={FACE_RECOGNITION_MODEL}, detector={FACE_DETECTOR_BACKEND}")
+        
+        # Always update model tracking
+        mapping = {
+            'id': student.id,
+            'embedding_model': FACE_RECOGNITION_MODEL,
+            'embedding_detector': FACE_DETECTOR_BACKEND,
+            'adaptive_threshold': 0.6  # Default adaptive threshold
+        }
+        
+        # Generate embeddings - use enhanced if available, otherwise standard
+        if self.enhanced_available:
+            result = self._generate_enhanced_embeddings(
+                image_paths=image_paths,
+                student_name=student.name,
+                student_roll_no=student.roll_no
+            )
+            
+            # Enhanced embedding info
+            mapping.update({
+                'face_encoding_path': result['embedding_path'],
+                'face_encoding': read_embedding_blob(result['embedding_path']),
+                'embedding_variants_path': None,  # Legacy noise variants are no longer generated
+                'embedding_metadata_path': result.get('metadata_path'),
+                'embedding_confidence': result.get('confidence_score', 0.8),
+                'has_enhanced_embeddings': True
+            })
+        else:
+            result = self._generate_standard_embeddings(
+                image_paths=image_paths,
+                student_name=student.name,
+                student_roll_no=student.roll_no
+            )
+            
+            # Standard embedding info
+            mapping.update({
+                'face_encoding_path': result['embedding_path'],
+                'face_encoding': read_embedding_blob(result['embedding_path']),
+                'embedding_confidence': result.get('confidence_score', 0.8),
+                'has_enhanced_embeddings': False
+            })
+        
+        return mapping
+    
     def upgrade_student_embedding(self, student_id: int, db) -> bool:
         """
         Upgrade/regenerate a student's embedding using current .env settings
@@ -201,92 +294,60 @@ class EmbeddingIntegration:
         Returns:
             True if upgrade was successful
         """
-        try:
-            from database import Student
-            from config import FACE_RECOGNITION_MODEL, FACE_DETECTOR_BACKEND
+        return self.upgrade_students([student_id], db) == [student_id]
+    
+    def upgrade_students(self, student_ids: List[int], db) -> List[int]:
+        """
+        Upgrade/regenerate embeddings for several students in one transaction
+        
+        Embedding files are generated per student, but all database updates are
+        written with a single batched UPDATE and committed once, instead of one
+        commit (and one fsync on SQLite) per student.
+        
+        Args:
+            student_ids: Student IDs to upgrade
+            db: Database session
             
-            student = db.query(Student).filter(Student.id == student_id).first()
-            if not student:
+        Returns:
+            IDs of the students that were upgraded successfully
+        """
+        from database import Student
+        from config import FACE_RECOGNITION_MODEL, FACE_DETECTOR_BACKEND
+        
+        if not student_ids:
+            return []
+        
+        students = db.query(Student).filter(Student.id.in_(student_ids)).all()
+        found_ids = {student.id for student in students}
+        for student_id in student_ids:
+            if student_id not in found_ids:
                 logger.error(f"Student {student_id} not found")
-                return False
-            
-            # Get original images - use absolute path
-            student_dir = os.path.join(os.getcwd(), f"static/dataset/{student.name.replace(' ', '_')}_{student.roll_no}")
-            if not os.path.exists(student_dir):
-                logger.error(f"Student directory not found: {student_dir}")
-                return False
-            
-            # Find all images in student directory (avoid duplicates)
-            image_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
-            image_paths = []
-            file_hashes = set()  # Track file hashes to avoid duplicates
-            
-            for file in os.listdir(student_dir):
-                if any(file.lower().endswith(ext) for ext in image_extensions):
-                    file_path = os.path.join(student_dir, file)
-                    
-                    # Calculate file hash to detect duplicates
-                    try:
-                        import hashlib
-                        with open(file_path, 'rb') as f:
-                            file_hash = hashlib.md5(f.read()).hexdigest()
-                        
-                        if file_hash not in file_hashes:
-                            file_hashes.add(file_hash)
-                            image_paths.append(file_path)
-                        else:
-                            logger.debug(f"Skipping duplicate file: {file}")
-                    except Exception as e:
-                        logger.warning(f"Could not hash file {file}: {e}")
-                        # If hashing fails, just add the file
-                        image_paths.append(file_path)
-            
-            if not image_paths:
-                logger.error(f"No images found for student {student_id}")
-                return False
-            
-            logger.info(f"🔄 Regenerating embedding for {student.name} using model={FACE_RECOGNITION_MODEL}, detector={FACE_DETECTOR_BACKEND}")
-            
-            # Generate embeddings - use enhanced if available, otherwise standard
-            if self.enhanced_available:
-                result = self._generate_enhanced_embeddings(
-                    image_paths=image_paths,
-                    student_name=student.name,
-                    student_roll_no=student.roll_no
-                )
-                
-                # Update database with enhanced embedding info
-                student.face_encoding_path = result['embedding_path']
-                student.embedding_variants_path = result.get('variants_path')
-                student.embedding_metadata_path = result.get('metadata_path')
-                student.embedding_confidence = result.get('confidence_score', 0.8)
-                student.has_enhanced_embeddings = True
-            else:
-                result = self._generate_standard_embeddings(
-                    image_paths=image_paths,
-                    student_name=student.name,
-                    student_roll_no=student.roll_no
-                )
-                
-                # Update database with standard embedding info
-                student.face_encoding_path = result['embedding_path']
-                student.embedding_confidence = result.get('confidence_score', 0.8)
-                student.has_enhanced_embeddings = False
-            
-            # Always update model tracking
-            student.embedding_model = FACE_RECOGNITION_MODEL
-            student.embedding_detector = FACE_DETECTOR_BACKEND
-            student.adaptive_threshold = 0.6  # Default adaptive threshold
-            
+        
+        mappings = []
+        for student in students:
+            try:
+                mapping = self._regenerate_student_embedding(student)
+            except Exception as e:
+                logger.error(f"❌ Failed to upgrade student {student.id}: {e}")
+                continue
+            if mapping is not None:
+                mappings.append(mapping)
+        
+        if not mappings:
+            return []
+        
+        try:
+            # Session autobegins on the query above, so this is one transaction
+            db.bulk_update_mappings(Student, mappings)
             db.commit()
-            
-            logger.info(f"✅ Successfully upgraded student {student_id} with model={FACE_RECOGNITION_MODEL}, detector={FACE_DETECTOR_BACKEND}")
-            return True
-            
         except Exception as e:
-            logger.error(f"❌ Failed to upgrade student {student_id}: {e}")
+            logger.error(f"❌ Failed to save upgraded embeddings: {e}")
             db.rollback()
-            return False
+            return []
+        
+        upgraded_ids = [mapping['id'] for mapping in mappings]
+        logger.info(f"✅ Successfully upgraded {len(upgraded_ids)} student(s) {upgraded_ids} with model={FACE_RECOGNITION_MODEL}, detector={FACE_DETECTOR_BACKEND}")
+        return upgraded_ids
 
 # Global instance
 embedding_integration = EmbeddingIntegration()
@@ -304,3 +365,7 @@ def get_student_embedding_info(student_id: int, db) -> Dict[str, Any]:
 def upgrade_student_to_enhanced(student_id: int, db) -> bool:
     """Upgrade a student's embeddings to enhanced system"""
     return embedding_integration.upgrade_student_embedding(student_id, db)
+
+def upgrade_students_to_enhanced(student_ids: List[int], db) -> List[int]:
+    """Upgrade several students' embeddings in a single database transaction"""
+    return embedding_integration.upgrade_students(student_ids, db)
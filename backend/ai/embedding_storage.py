@@ -0,0 +1,177 @@
+"""
+Enhanced embedding storage
+Keeps a student's primary embedding and metadata together on disk
+"""
+import os
+import json
+import logging
+import numpy as np
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# HDF5 is optional - fall back to a single .npz bundle without it
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+
+PRIMARY_EMBEDDING_FILENAME = "face_embedding.npy"
+BUNDLE_FILENAME = "embedding_bundle.h5"
+NPZ_BUNDLE_FILENAME = "embedding_bundle.npz"
+
+# Metadata keys mirrored as HDF5 attributes for quick inspection
+BUNDLE_ATTRS = ('confidence_score', 'method', 'generated_at')
+
+# Enhanced embeddings are stored as half precision and upcast to float32 on load;
+# recognition distances don't need more than fp16 resolution
+EMBEDDING_STORAGE_DTYPE = np.float16
+EMBEDDING_COMPUTE_DTYPE = np.float32
+
+
+def as_embedding_array(embedding, dtype=EMBEDDING_STORAGE_DTYPE) -> np.ndarray:
+    """
+    Coerce an embedding (or stack of embeddings) to a contiguous numeric array
+
+    Guarantees np.save takes the raw-buffer path instead of pickling, and fails
+    fast on object/ragged arrays at generation time rather than on every load.
+    """
+    return np.ascontiguousarray(embedding, dtype=dtype)
+
+
+def read_embedding_blob(embedding_path: str) -> Optional[bytes]:
+    """
+    Raw float32 bytes of the primary embedding saved at a path
+
+    Stored in students.face_encoding so profiles can be loaded straight from the
+    database. Stacked (2D) embeddings keep only the first row, as the matcher does.
+    """
+    try:
+        embedding = np.load(embedding_path, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if embedding.ndim == 2:
+        embedding = embedding[0]
+    return as_embedding_array(embedding, EMBEDDING_COMPUTE_DTYPE).tobytes()
+
+
+def embedding_from_blob(blob: bytes) -> np.ndarray:
+    """Decode a students.face_encoding blob back into a float32 embedding"""
+    return np.frombuffer(blob, dtype=EMBEDDING_COMPUTE_DTYPE)
+
+
+def is_bundle_path(path: str) -> bool:
+    """Check whether a stored variants/metadata path points at an HDF5 bundle"""
+    return bool(path) and path.endswith('.h5')
+
+
+def is_npz_bundle_path(path: str) -> bool:
+    """Check whether a stored metadata path points at an .npz bundle"""
+    return bool(path) and path.endswith('.npz')
+
+
+def save_enhanced_embedding(output_dir: str, primary_embedding: np.ndarray,
+                            metadata: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Save an enhanced embedding result for a student
+
+    The primary embedding is always written as face_embedding.npy because the
+    standard recognizer loads it directly; it stays at the model's raw scale
+    since that recognizer scores euclidean distance against raw-scale
+    thresholds. The metadata is written together with an L2-normalized copy
+    of the primary embedding into a single bundle file (HDF5 when h5py is
+    available, .npz otherwise) so the advanced matcher needs one open per
+    student and compares against it with a dot product.
+
+    Args:
+        output_dir: Student dataset directory
+        primary_embedding: Optimized primary embedding
+        metadata: JSON-serializable metadata
+
+    Returns:
+        Dictionary with embedding_path and metadata_path
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    primary_embedding = as_embedding_array(primary_embedding)
+
+    primary_path = os.path.join(output_dir, PRIMARY_EMBEDDING_FILENAME)
+    np.save(primary_path, primary_embedding, allow_pickle=False)
+
+    # Unit-norm copy for the advanced matcher, flagged in the bundle's metadata
+    upcast = primary_embedding.astype(EMBEDDING_COMPUTE_DTYPE)
+    norm = np.linalg.norm(upcast)
+    if norm > 0:
+        primary_embedding = as_embedding_array(upcast / norm)
+    metadata = {**metadata, 'normalized': bool(norm > 0)}
+
+    if H5PY_AVAILABLE:
+        bundle_path = os.path.join(output_dir, BUNDLE_FILENAME)
+        with h5py.File(bundle_path, 'w', libver='latest') as f:
+            # Contiguous (unchunked) datasets can be read without chunk lookups
+            f.create_dataset('primary', data=primary_embedding)
+            for key in BUNDLE_ATTRS:
+                if key in metadata:
+                    f.attrs[key] = metadata[key]
+            f.attrs['metadata'] = json.dumps(metadata)
+
+        return {
+            'embedding_path': primary_path,
+            'metadata_path': bundle_path
+        }
+
+    # Single-file fallback; metadata is kept as a JSON string so no pickling is needed
+    bundle_path = os.path.join(output_dir, NPZ_BUNDLE_FILENAME)
+    np.savez(bundle_path, primary=primary_embedding, metadata=np.array(json.dumps(metadata)))
+
+    return {
+        'embedding_path': primary_path,
+        'metadata_path': bundle_path
+    }
+
+
+def load_enhanced_embedding(embedding_path: str, variants_path: str = None,
+                            metadata_path: str = None) -> Tuple[np.ndarray, Any, Dict[str, Any]]:
+    """
+    Load a student's primary embedding, variants and metadata
+
+    Reads everything from the HDF5 or .npz bundle when the stored paths point
+    at one, otherwise falls back to the separate .npy and .json files written
+    by older versions. Variants only exist for students enrolled before they
+    were dropped and are empty otherwise.
+
+    Returns:
+        Tuple of (primary_embedding, variants, metadata)
+    """
+    bundle_path = next((path for path in (metadata_path, variants_path) if is_bundle_path(path)), None)
+    if bundle_path and H5PY_AVAILABLE and os.path.exists(bundle_path):
+        with h5py.File(bundle_path, 'r', swmr=True) as f:
+            primary_embedding = f['primary'][()].astype(EMBEDDING_COMPUTE_DTYPE)
+            # Variants stay in their stored (fp16) precision; matching upcasts at compare time
+            variants = f['variants'][()] if 'variants' in f else []
+            metadata = json.loads(f.attrs.get('metadata', '{}'))
+        return primary_embedding, variants, metadata
+
+    if is_npz_bundle_path(metadata_path) and os.path.exists(metadata_path):
+        with np.load(metadata_path, allow_pickle=False) as bundle:
+            primary_embedding = bundle['primary'].astype(EMBEDDING_COMPUTE_DTYPE)
+            metadata = json.loads(str(bundle['metadata']))
+        return primary_embedding, [], metadata
+
+    # Load primary embedding - memory-mapped so warm loads come from the page cache
+    primary_embedding = np.load(embedding_path, mmap_mode='r').astype(EMBEDDING_COMPUTE_DTYPE)
+
+    # Load legacy variants if available - left memory-mapped in their stored dtype
+    # (fp16, or fp32 for files written before half-precision storage) and only
+    # upcast by the matcher for the rows it compares
+    variants = []
+    if variants_path and not is_bundle_path(variants_path) and os.path.exists(variants_path):
+        variants = np.load(variants_path, mmap_mode='r')
+
+    # Load metadata if available
+    metadata = {}
+    if metadata_path and metadata_path.endswith('.json') and os.path.exists(metadata_path):
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+
+    return primary_embedding, variants, metadata
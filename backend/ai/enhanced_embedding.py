@@ -7,14 +7,13 @@ import numpy as np
 import cv2
 import logging
 from typing import List, Dict, Any, Tuple, Optional
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
 from deepface import DeepFace
 import tensorflow as tf
 from datetime import datetime
-import joblib
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Import configuration from .env
 from config import (
@@ -29,8 +28,74 @@ from config import (
     ENABLE_MULTI_DETECTOR
 )
 
+# SimSIMD is optional - plain NumPy is used when it's not installed
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+
+# Numba is optional - JIT-compiles the pairwise distance kernel when installed
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _pdist_sq(embeddings):
+        """Squared Euclidean distance matrix, filled in place without temporaries"""
+        n, d = embeddings.shape
+        out = np.zeros((n, n), dtype=np.float32)
+        for i in prange(n):
+            for j in range(i + 1, n):
+                acc = 0.0
+                for k in range(d):
+                    diff = embeddings[i, k] - embeddings[j, k]
+                    acc += diff * diff
+                out[i, j] = acc
+                out[j, i] = acc
+        return out
+
+
+# Built DeepFace models/detectors shared by every generator instance, keyed by (task, name)
+_BUILT_MODELS: Dict[Tuple[str, str], Any] = {}
+_BUILT_MODELS_LOCK = threading.Lock()
+
+
+def _get_built_model(model_name: str, task: str = "facial_recognition") -> Any:
+    """Build a DeepFace model or detector once per process and reuse it"""
+    key = (task, model_name)
+    with _BUILT_MODELS_LOCK:
+        if key not in _BUILT_MODELS:
+            start = time.perf_counter()
+            _BUILT_MODELS[key] = DeepFace.build_model(model_name=model_name, task=task)
+            logger.info(f"🏗️ Built {task} model {model_name} in {time.perf_counter() - start:.2f}s")
+        return _BUILT_MODELS[key]
+
+
+def _pairwise_distances(embeddings: np.ndarray) -> np.ndarray:
+    """Euclidean distance matrix between all pairs of embeddings"""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    if NUMBA_AVAILABLE:
+        sq_dists = _pdist_sq(embeddings)
+    elif SIMSIMD_AVAILABLE:
+        sq_dists = np.asarray(simsimd.cdist(embeddings, embeddings, metric='sqeuclidean'))
+    else:
+        # ||a||^2 + ||b||^2 - 2ab
+        sq_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+        sq_dists = sq_norms[:, None] + sq_norms[None, :] - 2 * embeddings @ embeddings.T
+    
+    dists = np.sqrt(np.maximum(sq_dists, 0))
+    np.fill_diagonal(dists, 0)
+    return dists
+
+
 class EnhancedEmbeddingGenerator:
     """
     Advanced face embedding generation with multiple strategies:
@@ -55,7 +120,7 @@ class EnhancedEmbeddingGenerator:
         if primary_model in MODEL_CONFIGS:
             self.models[primary_model] = {
                 'weight': 0.5, 
-                'embedding_size': MODEL_CONFIGS[primary_model].get('embedding_size', 512)
+                'embedding_size': MODEL_CONFIGS[primary_model].embedding_size
             }
         
         # Add complementary models for ensemble (lower weights)
@@ -67,17 +132,31 @@ class EnhancedEmbeddingGenerator:
             if model != primary_model and model in MODEL_CONFIGS:
                 self.models[model] = {
                     'weight': weight_remaining / 2,
-                    'embedding_size': MODEL_CONFIGS[model].get('embedding_size', 512)
+                    'embedding_size': MODEL_CONFIGS[model].embedding_size
                 }
                 weight_remaining /= 2
                 added_models += 1
                 if added_models >= 2:
                     break
         
+        # Models _optimize_for_student can take the final embedding from, in order of preference
+        self.strategy_models = [m for m in ('ArcFace', 'Facenet512', 'Facenet') if m in self.models]
+        
+        # Build each ensemble model once so embeddings can be batched through it
+        self._built_models = {model_name: _get_built_model(model_name) for model_name in self.models}
+        
         # Use detector backend from .env
         self.detector_backend = FACE_DETECTOR_BACKEND
         self.detector_fallback = DETECTOR_FALLBACK_SEQUENCE if ENABLE_MULTI_DETECTOR else [FACE_DETECTOR_BACKEND]
         
+        # Pre-build detectors so the fallback sequence never loads one mid-request
+        self._built_detectors = {}
+        for detector in self.detector_fallback:
+            try:
+                self._built_detectors[detector] = _get_built_model(detector, task="face_detector")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not pre-build detector {detector}: {e}")
+        
         # Quality assessment parameters
         self.min_quality_score = MIN_FACE_QUALITY_SCORE
         self.enable_quality_check = ENABLE_QUALITY_ASSESSMENT
@@ -92,6 +171,9 @@ class EnhancedEmbeddingGenerator:
             'consistency': 0.10
         }
         
+        # Haar cascade used by the face size/angle quality checks (parsed once per worker thread)
+        self._cascade_local = threading.local()
+        
         # Student-specific optimization cache
         self.student_optimization_cache = {}
         
@@ -103,160 +185,237 @@ class EnhancedEmbeddingGenerator:
         
     def generate_enhanced_embedding(self, image_paths: List[str], 
                                   student_name: str, 
-                                  student_roll_no: str) -> Dict[str, Any]:
+                                  student_roll_no: str,
+                                  compute_all: bool = False) -> Dict[str, Any]:
         """
         Generate enhanced embedding using multiple strategies
+        
+        Only the preferred model's quality-weighted representation ends up in the
+        final embedding, so by default just that is computed. Pass compute_all=True
+        to run every ensemble model and representation strategy.
         """
         logger.info(f"🎯 Generating enhanced embedding for {student_name} ({len(image_paths)} photos)")
         
+        # Normalize to absolute paths and drop duplicates once, in a stable order
+        # so quality scores and embeddings line up by index
+        unique_paths = sorted({os.path.abspath(path) for path in image_paths})
+        logger.debug(f"Processing {len(unique_paths)} unique images from {len(image_paths)} total paths")
+        
+        # Decode every image once - shared by face extraction and quality assessment
+        images = self._decode_images(unique_paths)
+        
         # Step 1: Multi-Model Ensemble Embeddings
-        ensemble_embeddings = self._generate_ensemble_embeddings(image_paths)
+        ensemble_embeddings, embedded_indices = self._generate_ensemble_embeddings(unique_paths, images, compute_all)
         
-        # Step 2: Advanced Quality Assessment
-        quality_scores = self._assess_image_quality(image_paths)
+        # Step 2: Advanced Quality Assessment (uniform weights when disabled)
+        if self.enable_quality_check:
+            quality_scores = self._assess_image_quality(unique_paths, images)
+        else:
+            quality_scores = [{'overall': 1.0} for _ in unique_paths]
         
-        # Step 3: Multi-Representation Learning
-        multi_representations = self._generate_multi_representations(ensemble_embeddings, quality_scores)
+        # Step 3: Multi-Representation Learning (quality of the images that produced embeddings)
+        embedded_quality_scores = [quality_scores[i] for i in embedded_indices]
+        multi_representations = self._generate_multi_representations(ensemble_embeddings, embedded_quality_scores, compute_all)
         
         # Step 4: Student-Specific Optimization
         optimized_embedding = self._optimize_for_student(multi_representations, student_name, student_roll_no)
         
-        # Step 5: Generate Embedding Variants for Robustness
-        embedding_variants = self._generate_embedding_variants(optimized_embedding)
+        # Per-photo embeddings of the model the primary embedding came from
+        per_photo_embeddings = next(
+            (ensemble_embeddings[m] for m in self.strategy_models if ensemble_embeddings.get(m)), []
+        )
         
         return {
             'primary_embedding': optimized_embedding,
-            'embedding_variants': embedding_variants,
             'quality_scores': quality_scores,
             'ensemble_embeddings': ensemble_embeddings,
-            'confidence_score': self._calculate_embedding_confidence(optimized_embedding, embedding_variants)
+            'confidence_score': self._calculate_embedding_confidence(optimized_embedding, per_photo_embeddings)
         }
     
-    def _generate_ensemble_embeddings(self, image_paths: List[str]) -> Dict[str, List[np.ndarray]]:
-        """Generate embeddings using multiple models with detector fallback"""
-        ensemble_embeddings = {model: [] for model in self.models.keys()}
-        
-        # Normalize all paths to absolute paths
-        normalized_paths = []
-        for path in image_paths:
-            abs_path = os.path.abspath(path)
-            normalized_paths.append(abs_path)
-        
-        # Remove any remaining duplicates after normalization
-        unique_paths = list(set(normalized_paths))
-        logger.debug(f"Processing {len(unique_paths)} unique images from {len(image_paths)} total paths")
+    def _decode_images(self, unique_paths: List[str]) -> List[Optional[np.ndarray]]:
+        """Decode each image (BGR) once, in the order of unique_paths; None if unreadable"""
+        if not unique_paths:
+            return []
+        
+        # cv2.imread releases the GIL, so decoding overlaps on a thread pool
+        max_workers = min(len(unique_paths), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(cv2.imread, unique_paths))
+    
+    def _generate_ensemble_embeddings(self, unique_paths: List[str], images: List[Optional[np.ndarray]],
+                                      compute_all: bool = False) -> Tuple[Dict[str, List[np.ndarray]], List[int]]:
+        """
+        Generate embeddings using multiple models with detector fallback
         
-        for image_path in unique_paths:
-            for model_name, config in self.models.items():
-                embedding_generated = False
-                
-                # Try each detector in the fallback sequence
-                for detector in self.detector_fallback:
-                    if embedding_generated:
-                        break
-                    
-                    try:
-                        embedding = DeepFace.represent(
-                            img_path=image_path,
-                            model_name=model_name,
-                            detector_backend=detector,
-                            enforce_detection=True,
-                            align=True,
-                            normalization='Facenet2018'
-                        )[0]["embedding"]
-                        
-                        ensemble_embeddings[model_name].append(np.array(embedding))
-                        logger.debug(f"✅ {model_name} embedding generated for {image_path} (detector: {detector})")
-                        embedding_generated = True
-                        
-                    except Exception as e:
-                        logger.debug(f"⚠️ {model_name}/{detector} failed for {image_path}: {e}")
-                        continue
-                
-                if not embedding_generated:
-                    logger.warning(f"❌ Could not generate {model_name} embedding for {image_path} with any detector")
+        Each decoded image is face-aligned once, then each model embeds all
+        aligned faces in a single batched forward pass. Unless compute_all is set,
+        models are tried in _optimize_for_student's order of preference and the
+        first one that produces embeddings wins.
         
-        return ensemble_embeddings
-    
-    def _assess_image_quality(self, image_paths: List[str]) -> List[Dict[str, float]]:
-        """Advanced quality assessment for each image"""
-        quality_scores = []
+        Returns:
+            Tuple of (embeddings per model, indices into unique_paths of the
+            images a face was found in - the order of every embedding list)
+        """
+        model_names = list(self.models.keys()) if compute_all else self.strategy_models
+        ensemble_embeddings = {}
+        
+        # Detect and align each face once - shared by every model
+        aligned_faces = []
+        embedded_indices = []
+        for index, (image_path, image) in enumerate(zip(unique_paths, images)):
+            if image is None:
+                logger.warning(f"❌ Could not read image {image_path}")
+                continue
+            face = self._extract_aligned_face(image_path, image)
+            if face is None:
+                logger.warning(f"❌ Could not detect a face in {image_path} with any detector")
+                continue
+            aligned_faces.append(face)
+            embedded_indices.append(index)
         
-        # Normalize all paths to absolute paths
-        normalized_paths = []
-        for path in image_paths:
-            abs_path = os.path.abspath(path)
-            normalized_paths.append(abs_path)
+        if not aligned_faces:
+            return {model_name: [] for model_name in model_names}, embedded_indices
         
-        # Remove any remaining duplicates after normalization
-        unique_paths = list(set(normalized_paths))
+        # One batched forward pass per model
+        for model_name in model_names:
+            try:
+                batch = self._preprocess_face_batch(aligned_faces, model_name)
+                embeddings = self._built_models[model_name].model.predict(
+                    batch, batch_size=32, verbose=0
+                )
+                ensemble_embeddings[model_name] = [np.array(embedding) for embedding in embeddings]
+                logger.debug(f"✅ {model_name} embeddings generated for {len(aligned_faces)} faces")
+            except Exception as e:
+                logger.warning(f"❌ Could not generate {model_name} embeddings: {e}")
+                continue
+            
+            if not compute_all:
+                break  # Only the preferred model's embedding is used
         
-        for image_path in unique_paths:
+        return ensemble_embeddings, embedded_indices
+    
+    def _extract_aligned_face(self, image_path: str, image: np.ndarray) -> Optional[np.ndarray]:
+        """Detect and align the face in a decoded image, trying each detector in the fallback sequence"""
+        for detector in self.detector_fallback:
             try:
-                # Load image
-                image = cv2.imread(image_path)
-                if image is None:
-                    quality_scores.append({'overall': 0.0})
-                    continue
-                
-                # Convert to grayscale for analysis
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                
-                # 1. Sharpness (Laplacian variance)
-                sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
-                sharpness_score = min(1.0, sharpness / 1000.0)  # Normalize
-                
-                # 2. Brightness (mean intensity)
-                brightness = np.mean(gray)
-                brightness_score = 1.0 - abs(brightness - 127.5) / 127.5  # Optimal around 127.5
-                
-                # 3. Contrast (standard deviation)
-                contrast = np.std(gray)
-                contrast_score = min(1.0, contrast / 64.0)  # Normalize
-                
-                # 4. Face size (relative to image)
-                face_size_score = self._assess_face_size(image)
-                
-                # 5. Face angle (frontal vs profile)
-                face_angle_score = self._assess_face_angle(image)
-                
-                # 6. Consistency with other images
-                consistency_score = self._assess_consistency(image, image_paths)
-                
-                # Calculate overall quality score
-                overall_score = (
-                    sharpness_score * self.quality_weights['sharpness'] +
-                    brightness_score * self.quality_weights['brightness'] +
-                    contrast_score * self.quality_weights['contrast'] +
-                    face_size_score * self.quality_weights['face_size'] +
-                    face_angle_score * self.quality_weights['face_angle'] +
-                    consistency_score * self.quality_weights['consistency']
+                face_objs = DeepFace.extract_faces(
+                    img_path=image,
+                    detector_backend=detector,
+                    enforce_detection=True,
+                    align=True
                 )
-                
-                quality_scores.append({
-                    'overall': overall_score,
-                    'sharpness': sharpness_score,
-                    'brightness': brightness_score,
-                    'contrast': contrast_score,
-                    'face_size': face_size_score,
-                    'face_angle': face_angle_score,
-                    'consistency': consistency_score
-                })
-                
+                logger.debug(f"✅ Face extracted from {image_path} (detector: {detector})")
+                return face_objs[0]["face"]
             except Exception as e:
-                logger.warning(f"Quality assessment failed for {image_path}: {e}")
-                quality_scores.append({'overall': 0.5})  # Default score
+                logger.debug(f"⚠️ {detector} failed for {image_path}: {e}")
+                continue
         
-        return quality_scores
+        return None
     
-    def _assess_face_size(self, image: np.ndarray) -> float:
-        """Assess if face size is optimal"""
-        try:
-            # Use face detection to get face size
+    def _preprocess_face_batch(self, faces: List[np.ndarray], model_name: str) -> np.ndarray:
+        """Resize and normalize aligned faces into a single input batch for a model"""
+        from deepface.modules import preprocessing
+        
+        target_size = self._built_models[model_name].input_shape
+        resized = []
+        for face in faces:
+            # extract_faces returns RGB, recognition models expect BGR (as in DeepFace.represent)
+            img = face[:, :, ::-1]
+            resized.append(preprocessing.resize_image(img=img, target_size=(target_size[1], target_size[0])))
+        
+        batch = np.concatenate(resized, axis=0).astype(np.float32)
+        return preprocessing.normalize_input(img=batch, normalization='Facenet2018')
+    
+    def _assess_image_quality(self, unique_paths: List[str],
+                              images: List[Optional[np.ndarray]]) -> List[Dict[str, float]]:
+        """
+        Advanced quality assessment for each image, in the order of unique_paths
+        
+        Images are scored concurrently on a thread pool - the OpenCV color
+        conversion, Laplacian and cascade detection all release the GIL.
+        """
+        if not unique_paths:
+            return []
+        
+        max_workers = min(len(unique_paths), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda path_image: self._assess_single_image_quality(*path_image, unique_paths),
+                zip(unique_paths, images)
+            ))
+    
+    def _get_face_cascade(self) -> cv2.CascadeClassifier:
+        """Get the Haar cascade for the current thread (classifiers are not thread-safe)"""
+        face_cascade = getattr(self._cascade_local, 'face_cascade', None)
+        if face_cascade is None:
             face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self._cascade_local.face_cascade = face_cascade
+        return face_cascade
+    
+    def _assess_single_image_quality(self, image_path: str, image: Optional[np.ndarray],
+                                     all_paths: List[str]) -> Dict[str, float]:
+        """Quality assessment for a single decoded image"""
+        try:
+            if image is None:
+                return {'overall': 0.0}
+            
+            # Every metric works on grayscale
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
             
+            # 1. Sharpness (Laplacian variance) - float32 is plenty for 8-bit input
+            sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var(dtype=np.float32))
+            sharpness_score = min(1.0, sharpness / 1000.0)  # Normalize
+            
+            # Mean and standard deviation in a single pass
+            mean, stddev = cv2.meanStdDev(gray)
+            
+            # 2. Brightness (mean intensity)
+            brightness = float(mean[0, 0])
+            brightness_score = 1.0 - abs(brightness - 127.5) / 127.5  # Optimal around 127.5
+            
+            # 3. Contrast (standard deviation)
+            contrast = float(stddev[0, 0])
+            contrast_score = min(1.0, contrast / 64.0)  # Normalize
+            
+            # Detect faces once, shared by the size and angle checks
+            faces = self._get_face_cascade().detectMultiScale(gray, 1.1, 4)
+            
+            # 4. Face size (relative to image)
+            face_size_score = self._assess_face_size(gray, faces)
+            
+            # 5. Face angle (frontal vs profile)
+            face_angle_score = self._assess_face_angle(gray, faces)
+            
+            # 6. Consistency with other images
+            consistency_score = self._assess_consistency(gray, all_paths)
+            
+            # Calculate overall quality score
+            overall_score = (
+                sharpness_score * self.quality_weights['sharpness'] +
+                brightness_score * self.quality_weights['brightness'] +
+                contrast_score * self.quality_weights['contrast'] +
+                face_size_score * self.quality_weights['face_size'] +
+                face_angle_score * self.quality_weights['face_angle'] +
+                consistency_score * self.quality_weights['consistency']
+            )
+            
+            return {
+                'overall': overall_score,
+                'sharpness': sharpness_score,
+                'brightness': brightness_score,
+                'contrast': contrast_score,
+                'face_size': face_size_score,
+                'face_angle': face_angle_score,
+                'consistency': consistency_score
+            }
+            
+        except Exception as e:
+            logger.warning(f"Quality assessment failed for {image_path}: {e}")
+            return {'overall': 0.5}  # Default score
+    
+    def _assess_face_size(self, image: np.ndarray, faces: np.ndarray) -> float:
+        """Assess if face size is optimal"""
+        try:
             if len(faces) == 0:
                 return 0.0
             
@@ -277,14 +436,9 @@ class EnhancedEmbeddingGenerator:
         except Exception:
             return 0.5  # Default score
     
-    def _assess_face_angle(self, image: np.ndarray) -> float:
+    def _assess_face_angle(self, image: np.ndarray, faces: np.ndarray) -> float:
         """Assess if face is frontal (optimal for recognition)"""
         try:
-            # Use face detection to assess angle
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-            
             if len(faces) == 0:
                 return 0.0
             
@@ -306,8 +460,14 @@ class EnhancedEmbeddingGenerator:
             return 0.5
     
     def _generate_multi_representations(self, ensemble_embeddings: Dict[str, List[np.ndarray]], 
-                                      quality_scores: List[Dict[str, float]]) -> Dict[str, np.ndarray]:
-        """Generate multiple representations using different strategies"""
+                                      quality_scores: List[Dict[str, float]],
+                                      compute_all: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Generate multiple representations using different strategies
+        
+        Only the quality-weighted average is consumed downstream; the other
+        strategies are computed when compute_all is set.
+        """
         representations = {}
         
         for model_name, embeddings in ensemble_embeddings.items():
@@ -317,9 +477,14 @@ class EnhancedEmbeddingGenerator:
             embeddings_array = np.array(embeddings)
             quality_array = np.array([qs['overall'] for qs in quality_scores[:len(embeddings)]])
             
-            # Strategy 1: Quality-weighted average
+            # Strategy 1: Quality-weighted average (single weighted matvec)
             weights = quality_array / np.sum(quality_array)
-            quality_weighted = np.average(embeddings_array, axis=0, weights=weights)
+            quality_weighted = weights @ embeddings_array
+            
+            representations[model_name] = {'quality_weighted': quality_weighted}
+            
+            if not compute_all:
+                continue
             
             # Strategy 2: Best quality embedding
             best_idx = np.argmax(quality_array)
@@ -331,12 +496,11 @@ class EnhancedEmbeddingGenerator:
             # Strategy 4: PCA-based representation
             pca_representation = self._pca_representation(embeddings_array, quality_array)
             
-            representations[model_name] = {
-                'quality_weighted': quality_weighted,
+            representations[model_name].update({
                 'best_quality': best_quality,
                 'robust_average': robust_avg,
                 'pca_representation': pca_representation
-            }
+            })
         
         return representations
     
@@ -345,27 +509,22 @@ class EnhancedEmbeddingGenerator:
         if len(embeddings) <= 2:
             return np.mean(embeddings, axis=0)
         
-        # Calculate pairwise distances
-        distances = []
-        for i in range(len(embeddings)):
-            for j in range(i + 1, len(embeddings)):
-                dist = np.linalg.norm(embeddings[i] - embeddings[j])
-                distances.append(dist)
+        n = len(embeddings)
+        
+        # Pairwise distance matrix
+        dists = _pairwise_distances(embeddings)
         
         # Remove outliers using IQR method
+        distances = dists[np.triu_indices(n, k=1)]
         q1, q3 = np.percentile(distances, [25, 75])
         iqr = q3 - q1
         outlier_threshold = q3 + 1.5 * iqr
         
-        # Find embeddings that are not outliers
-        valid_indices = []
-        for i, emb in enumerate(embeddings):
-            distances_to_others = [np.linalg.norm(emb - other) for j, other in enumerate(embeddings) if i != j]
-            avg_distance = np.mean(distances_to_others)
-            if avg_distance <= outlier_threshold:
-                valid_indices.append(i)
+        # Find embeddings that are not outliers (average distance to the others)
+        avg_distances = dists.sum(axis=1) / (n - 1)
+        valid_indices = np.where(avg_distances <= outlier_threshold)[0]
         
-        if not valid_indices:
+        if len(valid_indices) == 0:
             valid_indices = [0]  # Keep at least one
         
         # Weighted average of valid embeddings
@@ -384,12 +543,12 @@ class EnhancedEmbeddingGenerator:
         weights = quality_scores / np.sum(quality_scores)
         weighted_embeddings = embeddings * weights.reshape(-1, 1)
         
-        # Apply PCA
-        pca = PCA(n_components=min(len(embeddings), embeddings.shape[1]))
-        pca_result = pca.fit_transform(weighted_embeddings)
+        # PCA via a thin SVD of the centered matrix (scores = U * S)
+        centered = weighted_embeddings - weighted_embeddings.mean(axis=0)
+        U, S, _ = np.linalg.svd(centered, full_matrices=False)
         
-        # Return the first principal component
-        return pca_result[0]
+        # Return the first sample's projection onto the principal components
+        return U[0] * S
     
     def _optimize_for_student(self, multi_representations: Dict[str, Dict[str, np.ndarray]], 
                             student_name: str, student_roll_no: str) -> np.ndarray:
@@ -410,34 +569,23 @@ class EnhancedEmbeddingGenerator:
             # If no representations available, return zeros
             return np.zeros(512)  # Default to 512 dimensions
     
-    def _generate_embedding_variants(self, primary_embedding: np.ndarray) -> List[np.ndarray]:
-        """Generate embedding variants for robustness"""
-        variants = [primary_embedding]  # Original
-        
-        # Add slight variations for robustness
-        noise_levels = [0.01, 0.02, 0.05]
-        for noise_level in noise_levels:
-            noise = np.random.normal(0, noise_level, primary_embedding.shape)
-            variant = primary_embedding + noise
-            # Normalize to maintain embedding properties
-            variant = variant / np.linalg.norm(variant) * np.linalg.norm(primary_embedding)
-            variants.append(variant)
-        
-        return variants
-    
     def _calculate_embedding_confidence(self, primary_embedding: np.ndarray, 
-                                      variants: List[np.ndarray]) -> float:
-        """Calculate confidence score for the embedding"""
-        if len(variants) <= 1:
+                                      per_photo_embeddings: List[np.ndarray]) -> float:
+        """Calculate confidence score from agreement across the source photos"""
+        if len(per_photo_embeddings) <= 1:
             return 0.8  # Default confidence
         
-        # Calculate consistency among variants
-        similarities = []
-        for variant in variants[1:]:  # Skip original
-            similarity = cosine_similarity([primary_embedding], [variant])[0][0]
-            similarities.append(similarity)
-        
-        avg_similarity = np.mean(similarities)
+        # Normalize once so cosine similarities reduce to dot products
+        embeddings = np.asarray(per_photo_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms > 0, norms, 1.0)
+        
+        # Mean pairwise dot product without the n x n Gram matrix:
+        # sum_{i != j} e_i.e_j = ||sum e_i||^2 - sum ||e_i||^2
+        n = len(embeddings)
+        total = embeddings.sum(axis=0)
+        self_similarity = float(np.einsum('ij,ij->', embeddings, embeddings))
+        avg_similarity = (float(np.dot(total, total)) - self_similarity) / (n * (n - 1))
         confidence = min(1.0, avg_similarity + 0.2)  # Boost confidence slightly
         
         return confidence
@@ -457,33 +605,25 @@ def integrate_enhanced_embedding():
         output_dir = f"static/dataset/{student_name.replace(' ', '_')}_{student_roll_no}"
         os.makedirs(output_dir, exist_ok=True)
         
-        # Save primary embedding
-        primary_path = os.path.join(output_dir, "face_embedding.npy")
-        np.save(primary_path, result['primary_embedding'])
-        
-        # Save variants for robust matching
-        variants_path = os.path.join(output_dir, "embedding_variants.npy")
-        np.save(variants_path, result['embedding_variants'])
-        
-        # Save metadata
+        # Save primary embedding and metadata
+        from ai.embedding_storage import save_enhanced_embedding
         metadata = {
             'confidence_score': result['confidence_score'],
             'quality_scores': result['quality_scores'],
             'generated_at': datetime.now().isoformat(),
             'method': 'enhanced_ensemble'
         }
-        
-        import json
-        metadata_path = os.path.join(output_dir, "embedding_metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        saved_paths = save_enhanced_embedding(
+            output_dir, result['primary_embedding'], metadata
+        )
+        primary_path = saved_paths['embedding_path']
+        metadata_path = saved_paths['metadata_path']
         
         logger.info(f"🎯 Enhanced embedding saved for {student_name} (confidence: {result['confidence_score']:.3f})")
         
         return {
             'photo_path': os.path.join(output_dir, "face.jpg"),
             'embedding_path': primary_path,
-            'variants_path': variants_path,
             'metadata_path': metadata_path,
             'confidence_score': result['confidence_score']
         }
@@ -3,13 +3,35 @@ Enhanced face recognition integration with backward compatibility
 Provides seamless upgrade from current to advanced recognition system
 """
 import os
+import hashlib
 import logging
+import threading
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+from config import RECOGNITION_CACHE_SIZE
+
 logger = logging.getLogger(__name__)
 
+# Sizes of embedding files already found on disk; missing files are re-checked every time
+_path_sizes: Dict[str, int] = {}
+
+
+def _path_size(path: str) -> int:
+    """Size of a file in bytes from a single stat, or -1 if it doesn't exist"""
+    size = _path_sizes.get(path)
+    if size is None:
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return -1
+        _path_sizes[path] = size
+    return size
+
+
 class RecognitionIntegration:
     """
     Integration layer for enhanced face recognition
@@ -20,6 +42,18 @@ class RecognitionIntegration:
         self.advanced_available = False
         self.advanced_matcher = None
         
+        # Stacked, L2-normalized gallery cached across recognition calls, published
+        # as one (signature, gallery, ids, int8 scales, id -> row) tuple so a
+        # concurrent reader never pairs a new matrix with an old id map
+        self._gallery_state = None
+        self._gallery_lock = threading.Lock()
+        self._profiles_signature = None
+        
+        # LRU of per-face results keyed by (embedding hash, gallery signature, group size);
+        # shared by concurrent requests, so every access holds the lock
+        self._recognition_cache = OrderedDict()
+        self._recognition_cache_lock = threading.Lock()
+        
         # Try to initialize advanced system
         try:
             from ai.advanced_matching import create_advanced_matcher
@@ -34,7 +68,8 @@ class RecognitionIntegration:
                        student_ids: List[int], 
                        class_student_ids: List[int] = None,
                        group_size: int = 1,
-                       use_advanced: bool = True) -> List[Dict[str, Any]]:
+                       use_advanced: bool = True,
+                       strategy_scores: bool = False) -> List[Dict[str, Any]]:
         """
         Recognize faces using the best available method
         
@@ -44,19 +79,22 @@ class RecognitionIntegration:
             class_student_ids: List of student IDs in the specific class
             group_size: Number of faces detected (for adaptive thresholds)
             use_advanced: Whether to use advanced system if available
+            strategy_scores: Match faces one at a time to report per-strategy scores
             
         Returns:
             List of recognition results
         """
         if use_advanced and self.advanced_available:
-            return self._recognize_with_advanced(face_embeddings, student_ids, class_student_ids, group_size)
+            return self._recognize_with_advanced(face_embeddings, student_ids, class_student_ids,
+                                                 group_size, strategy_scores)
         else:
             return self._recognize_with_standard(face_embeddings, student_ids, class_student_ids, group_size)
     
     def _recognize_with_advanced(self, face_embeddings: List[np.ndarray], 
                                student_ids: List[int],
                                class_student_ids: List[int] = None,
-                               group_size: int = 1) -> List[Dict[str, Any]]:
+                               group_size: int = 1,
+                               strategy_scores: bool = False) -> List[Dict[str, Any]]:
         """Recognize faces using advanced system"""
         try:
             logger.info(f"🚀 Using advanced recognition for {len(face_embeddings)} faces")
@@ -67,45 +105,89 @@ class RecognitionIntegration:
             # Use class-specific student IDs if provided
             target_student_ids = class_student_ids if class_student_ids else student_ids
             
+            if strategy_scores:
+                return self._recognize_per_face(face_embeddings, target_student_ids, group_size)
+            
             all_matches = []
             
-            for i, face_embedding in enumerate(face_embeddings):
-                # Get matches for this face
-                matches = self.advanced_matcher.match_face(
-                    query_embedding=face_embedding,
-                    student_ids=target_student_ids,
-                    group_size=group_size
+            # Stack and L2-normalize the queries so all faces are matched in one GEMM
+            query_matrix = np.ascontiguousarray(np.stack(face_embeddings), dtype=np.float32)
+            query_matrix /= np.linalg.norm(query_matrix, axis=1, keepdims=True) + 1e-12
+            
+            gallery, gallery_ids, gallery_scales, gallery_signature = self._select_gallery(
+                target_student_ids, query_matrix.shape[1]
+            )
+            target_signature = hash(tuple(sorted(target_student_ids)))
+            if len(gallery_ids) == 0:
+                logger.info(f"❌ No match for {len(face_embeddings)} faces - No candidates found")
+                return all_matches
+            
+            decision_threshold = self.advanced_matcher._get_decision_threshold(group_size)
+            
+            # Reuse results for faces already recognized against this exact gallery
+            face_results = [None] * len(query_matrix)
+            cache_keys = [None] * len(query_matrix)
+            if RECOGNITION_CACHE_SIZE > 0:
+                for i, query in enumerate(query_matrix):
+                    cache_keys[i] = (hashlib.blake2b(query.tobytes(), digest_size=16).digest(),
+                                     gallery_signature, target_signature, group_size)
+                with self._recognition_cache_lock:
+                    for i, key in enumerate(cache_keys):
+                        result = self._recognition_cache.get(key)
+                        if result is not None:
+                            self._recognition_cache.move_to_end(key)
+                            face_results[i] = result
+            
+            cached = [i for i, result in enumerate(face_results) if result is not None]
+            pending = [i for i, result in enumerate(face_results) if result is None]
+            if cached:
+                # Cache hits still count towards recognition history and success rates
+                confidences = np.stack([face_results[i][4] for i in cached])
+                self.advanced_matcher._update_recognition_history_batch(
+                    gallery_ids, confidences, confidences > decision_threshold
                 )
-                
-                # Find best match
-                best_match = matches[0] if matches else None
-                
+            if pending:
+                batch = self.advanced_matcher.match_faces_batch(
+                    query_matrix[pending], gallery, gallery_ids, group_size,
+                    scales=gallery_scales
+                )
+                for row, i in enumerate(pending):
+                    face_results[i] = (
+                        int(gallery_ids[batch['best_index'][row]]),
+                        float(batch['best_confidence'][row]),
+                        bool(batch['is_match'][row]),
+                        [(int(gallery_ids[j]), float(batch['confidences'][row, j])) for j in batch['top_indices'][row]],
+                        batch['confidences'][row].copy()  # Full row, replayed into history on a hit
+                    )
+                if RECOGNITION_CACHE_SIZE > 0:
+                    self._cache_recognition([(cache_keys[i], face_results[i]) for i in pending])
+            
+            # Only build per-face log messages that will actually be emitted
+            log_debug = logger.isEnabledFor(logging.DEBUG)
+            
+            for i, (student_id, confidence, is_match, top_candidates, _) in enumerate(face_results):
                 # Log top 3 candidates for debugging
-                if len(matches) >= 3:
-                    top_3 = matches[:3]
-                    logger.debug(f"🔍 Face {i} top 3 candidates: " + 
-                               ", ".join([f"ID {m['student_id']} ({m['confidence']:.3f})" for m in top_3]))
+                if log_debug and len(top_candidates) >= 3:
+                    logger.debug("🔍 Face %d top 3 candidates: %s", i,
+                               ", ".join([f"ID {candidate_id} ({candidate_confidence:.3f})"
+                                          for candidate_id, candidate_confidence in top_candidates]))
                 
-                if best_match and best_match['is_match']:
+                if is_match:
                     all_matches.append({
-                        'student_id': best_match['student_id'],
-                        'confidence': best_match['confidence'],
-                        'distance': 1 - best_match['confidence'],  # Convert confidence to distance
+                        'student_id': student_id,
+                        'confidence': confidence,
+                        'distance': 1 - confidence,  # Convert confidence to distance
                         'method': 'advanced',
                         'face_index': i,
-                        'strategy_scores': best_match.get('strategy_scores', {}),
-                        'adaptive_threshold': best_match.get('threshold', 0.6),
-                        'decision_threshold': best_match.get('decision_threshold', 0.5)
+                        'strategy_scores': {},
+                        'adaptive_threshold': self.advanced_matcher._get_adaptive_threshold(student_id, group_size),
+                        'decision_threshold': decision_threshold
                     })
-                    logger.info(f"✅ Face {i}: Student {best_match['student_id']} (confidence: {best_match['confidence']:.3f}, "
-                              f"threshold: {best_match.get('decision_threshold', 0.5):.3f})")
+                    logger.info("✅ Face %d: Student %d (confidence: %.3f, threshold: %.3f)",
+                              i, student_id, confidence, decision_threshold)
                 else:
-                    # Log why no match was found
-                    if best_match:
-                        logger.info(f"❌ Face {i}: No match - Best candidate Student {best_match['student_id']} had confidence {best_match['confidence']:.3f} "
-                                  f"< threshold {best_match.get('decision_threshold', 0.5):.3f}")
-                    else:
-                        logger.info(f"❌ Face {i}: No match - No candidates found")
+                    logger.info("❌ Face %d: No match - Best candidate Student %d had confidence %.3f < threshold %.3f",
+                              i, student_id, confidence, decision_threshold)
             
             return all_matches
             
@@ -114,6 +196,71 @@ class RecognitionIntegration:
             logger.info("🔄 Falling back to standard recognition")
             return self._recognize_with_standard(face_embeddings, student_ids, class_student_ids, group_size)
     
+    def _cache_recognition(self, entries: List[Tuple[Tuple, Tuple]]):
+        """Store (key, result) pairs of per-face recognition results, evicting the least recently used"""
+        with self._recognition_cache_lock:
+            for key, result in entries:
+                self._recognition_cache[key] = result
+                self._recognition_cache.move_to_end(key)
+            while len(self._recognition_cache) > RECOGNITION_CACHE_SIZE:
+                self._recognition_cache.popitem(last=False)
+    
+    def _recognize_per_face(self, face_embeddings: List[np.ndarray],
+                            target_student_ids: List[int],
+                            group_size: int = 1) -> List[Dict[str, Any]]:
+        """Match faces one at a time, reporting per-strategy scores for each match"""
+        all_matches = []
+        log_debug = logger.isEnabledFor(logging.DEBUG)
+        
+        def match(face_embedding):
+            return self.advanced_matcher.match_face(
+                query_embedding=face_embedding,
+                student_ids=target_student_ids,
+                group_size=group_size
+            )
+        
+        # Faces are independent - overlap their matching (NumPy releases the GIL)
+        if len(face_embeddings) >= 2:
+            with ThreadPoolExecutor(max_workers=min(len(face_embeddings), os.cpu_count() or 1, 4)) as executor:
+                matches_list = list(executor.map(match, face_embeddings))
+        else:
+            matches_list = [match(face_embedding) for face_embedding in face_embeddings]
+        
+        for i, matches in enumerate(matches_list):
+            # Find best match
+            best_match = matches[0] if matches else None
+            
+            # Log top 3 candidates for debugging
+            if log_debug and len(matches) >= 3:
+                top_3 = matches[:3]
+                logger.debug("🔍 Face %d top 3 candidates: %s", i,
+                           ", ".join([f"ID {m['student_id']} ({m['confidence']:.3f})" for m in top_3]))
+            
+            if best_match and best_match['is_match']:
+                all_matches.append({
+                    'student_id': best_match['student_id'],
+                    'confidence': best_match['confidence'],
+                    'distance': 1 - best_match['confidence'],  # Convert confidence to distance
+                    'method': 'advanced',
+                    'face_index': i,
+                    'strategy_scores': best_match.get('strategy_scores', {}),
+                    'adaptive_threshold': best_match.get('threshold', 0.6),
+                    'decision_threshold': best_match.get('decision_threshold', 0.5)
+                })
+                logger.info("✅ Face %d: Student %d (confidence: %.3f, threshold: %.3f)",
+                          i, best_match['student_id'], best_match['confidence'],
+                          best_match.get('decision_threshold', 0.5))
+            else:
+                # Log why no match was found
+                if best_match:
+                    logger.info("❌ Face %d: No match - Best candidate Student %d had confidence %.3f < threshold %.3f",
+                              i, best_match['student_id'], best_match['confidence'],
+                              best_match.get('decision_threshold', 0.5))
+                else:
+                    logger.info("❌ Face %d: No match - No candidates found", i)
+        
+        return all_matches
+    
     def _recognize_with_standard(self, face_embeddings: List[np.ndarray], 
                                student_ids: List[int],
                                class_student_ids: List[int] = None,
@@ -136,37 +283,107 @@ class RecognitionIntegration:
             logger.error(f"❌ Standard recognition failed: {e}")
             return []
     
+    def _get_gallery(self, dim: int) -> Tuple:
+        """
+        Get the stacked gallery of every loaded profile, rebuilding it only when the profiles change
+        
+        Returns:
+            Tuple of (signature, gallery, student IDs, int8 scales or None, student ID -> row)
+        """
+        signature = (dim, self.advanced_matcher.profiles_version)
+        state = self._gallery_state
+        if state is not None and state[0] == signature:
+            return state
+        
+        with self._gallery_lock:
+            state = self._gallery_state
+            if state is None or state[0] != signature:
+                gallery, gallery_ids = self.advanced_matcher.build_gallery(
+                    list(self.advanced_matcher.student_profiles), dim
+                )
+                scales = None
+                from ai.advanced_matching import INT8_GALLERY  # Loaded with the matcher
+                if INT8_GALLERY:
+                    gallery, scales = self.advanced_matcher.quantize_gallery(gallery)
+                id_to_row = {student_id: row for row, student_id in enumerate(gallery_ids.tolist())}
+                state = (signature, gallery, gallery_ids, scales, id_to_row)
+                self._gallery_state = state
+                logger.debug(f"🗂️ Built recognition gallery: {len(gallery_ids)} students x {dim} dims")
+        
+        return state
+    
+    def _select_gallery(self, target_student_ids: List[int],
+                        dim: int) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Tuple]:
+        """
+        Rows of the cached all-student gallery belonging to the target students
+        
+        The gallery is built once over every loaded profile; class-restricted
+        calls select their rows instead of rebuilding it.
+        
+        Returns:
+            Tuple of (gallery, student IDs, int8 scales or None, gallery signature)
+        """
+        signature, gallery, gallery_ids, scales, id_to_row = self._get_gallery(dim)
+        rows = np.unique(np.fromiter(
+            (id_to_row[sid] for sid in target_student_ids if sid in id_to_row), dtype=np.int32
+        ))
+        if len(rows) == len(gallery_ids):
+            return gallery, gallery_ids, scales, signature
+        
+        if scales is not None:
+            scales = scales[rows]
+        return np.ascontiguousarray(gallery[rows]), gallery_ids[rows], scales, signature
+    
     def _ensure_student_profiles_loaded(self, student_ids: List[int]):
         """Ensure student profiles are loaded in the advanced matcher"""
         if not self.advanced_available:
             return
         
+        # Same student set as the last call - nothing new to load
+        signature = hash(tuple(sorted(student_ids)))
+        if signature == self._profiles_signature:
+            return
+        
+        # Only students whose profile isn't loaded yet
+        missing = [sid for sid in student_ids if sid not in self.advanced_matcher.student_profiles]
+        if not missing:
+            self._profiles_signature = signature
+            return
+        
         try:
             from database import SessionLocal, Student
             
-            db = SessionLocal()
-            try:
-                for student_id in student_ids:
-                    # Check if profile is already loaded
-                    if student_id in self.advanced_matcher.student_profiles:
-                        continue
-                    
-                    # Load student from database
-                    student = db.query(Student).filter(Student.id == student_id).first()
-                    if not student:
-                        continue
-                    
-                    # Load profile if embedding exists
-                    if student.face_encoding_path and os.path.exists(student.face_encoding_path):
-                        self.advanced_matcher.load_student_profile(
-                            student_id=student_id,
-                            embedding_path=student.face_encoding_path,
-                            variants_path=student.embedding_variants_path,
-                            metadata_path=student.embedding_metadata_path
-                        )
-                        
-            finally:
-                db.close()
+            # One query for every missing student instead of one per student
+            with SessionLocal() as db:
+                rows = db.query(
+                    Student.id,
+                    Student.face_encoding,
+                    Student.embedding_confidence,
+                    Student.face_encoding_path,
+                    Student.embedding_variants_path,
+                    Student.embedding_metadata_path
+                ).filter(Student.id.in_(missing)).all()
+            
+            from ai.embedding_storage import embedding_from_blob
+            
+            for student_id, blob, confidence, embedding_path, variants_path, metadata_path in rows:
+                # Embedding stored in the database - no file IO (legacy variants still live on disk)
+                if blob and not variants_path:
+                    self.advanced_matcher.add_student_profile(
+                        student_id=student_id,
+                        primary_embedding=embedding_from_blob(blob),
+                        metadata={'confidence_score': confidence} if confidence is not None else None
+                    )
+                # Load profile if a non-empty embedding exists
+                elif embedding_path and _path_size(embedding_path) > 0:
+                    self.advanced_matcher.load_student_profile(
+                        student_id=student_id,
+                        embedding_path=embedding_path,
+                        variants_path=variants_path,
+                        metadata_path=metadata_path
+                    )
+            
+            self._profiles_signature = signature
                 
         except Exception as e:
             logger.error(f"Failed to load student profiles: {e}")
@@ -200,8 +417,26 @@ class RecognitionIntegration:
         self.advanced_matcher.load_optimization_data(filepath)
 
 
-# Global instance
-recognition_integration = RecognitionIntegration()
+# Global instance, created on first use so importing this module stays cheap
+_recognition_integration = None
+_recognition_integration_lock = threading.Lock()
+
+
+def get_recognition_integration() -> RecognitionIntegration:
+    """Get the shared RecognitionIntegration, creating it on first call"""
+    global _recognition_integration
+    if _recognition_integration is None:
+        with _recognition_integration_lock:
+            if _recognition_integration is None:
+                _recognition_integration = RecognitionIntegration()
+    return _recognition_integration
+
+
+def __getattr__(name: str):
+    # Backward compatibility for `from ai.recognition_integration import recognition_integration`
+    if name == "recognition_integration":
+        return get_recognition_integration()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Convenience functions
 def recognize_faces_enhanced(face_embeddings: List[np.ndarray], 
@@ -210,14 +445,14 @@ def recognize_faces_enhanced(face_embeddings: List[np.ndarray],
                            group_size: int = 1,
                            use_advanced: bool = True) -> List[Dict[str, Any]]:
     """Recognize faces using the best available method"""
-    return recognition_integration.recognize_faces(
+    return get_recognition_integration().recognize_faces(
         face_embeddings, student_ids, class_student_ids, group_size, use_advanced
     )
 
 def get_student_recognition_stats(student_id: int) -> Dict[str, Any]:
     """Get recognition statistics for a student"""
-    return recognition_integration.get_recognition_statistics(student_id)
+    return get_recognition_integration().get_recognition_statistics(student_id)
 
 def optimize_student_recognition(student_id: int):
     """Optimize recognition for a specific student"""
-    recognition_integration.optimize_student_threshold(student_id)
+    get_recognition_integration().optimize_student_threshold(student_id)
@@ -18,22 +18,33 @@ Features:
 
 import sys
 from datetime import datetime
-from sqlalchemy import create_engine, text
-from config import DATABASE_URL
+from sqlalchemy import text
+from config import get_engine
+
+# Rendered once at import instead of on every menu iteration
+_HEADER = "\n".join([
+    "=" * 70,
+    "🗑️  DATABASE DATA CLEANUP UTILITY",
+    "=" * 70,
+    "⚠️  WARNING: This will PERMANENTLY DELETE data!",
+    "   Tables and schema will remain intact.",
+    "=" * 70,
+    "",
+    "",
+])
 
 def clear_screen():
     """Clear terminal screen"""
-    print("\n" * 2)
+    if sys.stdout.isatty():
+        # ANSI: erase display and move the cursor home
+        sys.stdout.write("\x1b[2J\x1b[H")
+    else:
+        # Keep piped/logged output free of escape codes
+        sys.stdout.write("\n\n")
 
 def print_header():
     """Print script header"""
-    print("=" * 70)
-    print("🗑️  DATABASE DATA CLEANUP UTILITY")
-    print("=" * 70)
-    print("⚠️  WARNING: This will PERMANENTLY DELETE data!")
-    print("   Tables and schema will remain intact.")
-    print("=" * 70)
-    print()
+    sys.stdout.write(_HEADER)
 
 def confirm_action(action_name):
     """Get user confirmation"""
@@ -57,19 +68,28 @@ def show_stats(connection):
         ('leave_records', 'Leave Records'),
     ]
     
+    # All counts in one round-trip; primary admin is not counted
+    user_filter = " WHERE is_primary_admin = FALSE OR is_primary_admin IS NULL"
+    counts_sql = " UNION ALL ".join(
+        f"SELECT '{table}' AS name, COUNT(*) AS c FROM {table}" + (user_filter if table == 'users' else '')
+        for table, _ in tables
+    )
+    try:
+        counts = dict(connection.execute(text(counts_sql)).fetchall())
+    except Exception:
+        connection.rollback()  # PostgreSQL aborts the transaction on error
+        counts = {}
+    
     for table, description in tables:
-        try:
-            if table == 'users':
-                # Don't count primary admin
-                count = connection.execute(text(f"""
-                    SELECT COUNT(*) FROM {table} 
-                    WHERE is_primary_admin = FALSE OR is_primary_admin IS NULL
-                """)).fetchone()[0]
-            else:
-                count = connection.execute(text(f"SELECT COUNT(*) FROM {table}")).fetchone()[0]
-            print(f"   {description:40s}: {count:5d} records")
-        except Exception as e:
-            print(f"   {description:40s}: Error reading")
+        count = counts.get(table)
+        if count is None:
+            # Fall back to counting tables individually so one bad table doesn't hide the rest
+            try:
+                count = connection.execute(text(f"SELECT COUNT(*) FROM {table}" + (user_filter if table == 'users' else ''))).fetchone()[0]
+            except Exception:
+                print(f"   {description:40s}: Error reading")
+                continue
+        print(f"   {description:40s}: {count:5d} records")
     
     print("-" * 70)
 
@@ -86,7 +106,6 @@ def cleanup_students(connection):
     
     # Delete students
     connection.execute(text("DELETE FROM students"))
-    connection.commit()
     
     print(f"   ✅ Deleted {count} students")
     print("   ℹ️  Associated attendance records also deleted (cascade)")
@@ -104,7 +123,6 @@ def cleanup_attendance_sessions(connection):
     
     # Delete sessions
     connection.execute(text("DELETE FROM attendance_sessions"))
-    connection.commit()
     
     print(f"   ✅ Deleted {count} attendance sessions")
     print("   ℹ️  Associated attendance records also deleted (cascade)")
@@ -120,7 +138,6 @@ def cleanup_attendance_records(connection):
         return
     
     connection.execute(text("DELETE FROM attendance_records"))
-    connection.commit()
     
     print(f"   ✅ Deleted {count} attendance records")
 
@@ -135,7 +152,6 @@ def cleanup_leave_records(connection):
         return
     
     connection.execute(text("DELETE FROM leave_records"))
-    connection.commit()
     
     print(f"   ✅ Deleted {count} leave records")
 
@@ -150,7 +166,6 @@ def cleanup_subjects(connection):
         return
     
     connection.execute(text("DELETE FROM subjects"))
-    connection.commit()
     
     print(f"   ✅ Deleted {count} subjects")
 
@@ -166,7 +181,6 @@ def cleanup_classes(connection):
     
     # This will cascade delete students, subjects, etc.
     connection.execute(text("DELETE FROM classes"))
-    connection.commit()
     
     print(f"   ✅ Deleted {count} classes")
     print("   ℹ️  Cascade deleted: students, subjects, attendance sessions")
@@ -190,7 +204,6 @@ def cleanup_users(connection):
         DELETE FROM users 
         WHERE is_primary_admin = FALSE OR is_primary_admin IS NULL
     """))
-    connection.commit()
     
     print(f"   ✅ Deleted {count} users")
     print("   🔒 Primary admin preserved")
@@ -200,39 +213,58 @@ def cleanup_all_data(connection):
     print("\n🗑️  DELETING ALL DATA FROM ALL TABLES...")
     print("   (This will take a moment...)")
     
-    # Order matters due to foreign keys
-    # Delete in reverse dependency order
-    
-    print("\n   Step 1/7: Deleting attendance records...")
-    connection.execute(text("DELETE FROM attendance_records"))
-    
-    print("   Step 2/7: Deleting leave records...")
-    connection.execute(text("DELETE FROM leave_records"))
-    
-    print("   Step 3/7: Deleting attendance sessions...")
-    connection.execute(text("DELETE FROM attendance_sessions"))
-    
-    print("   Step 4/7: Deleting students...")
-    connection.execute(text("DELETE FROM students"))
-    
-    print("   Step 5/7: Deleting subjects...")
-    connection.execute(text("DELETE FROM subjects"))
-    
-    print("   Step 6/7: Deleting classes...")
-    connection.execute(text("DELETE FROM classes"))
-    
-    print("   Step 7/7: Deleting users (except primary admin)...")
-    connection.execute(text("""
-        DELETE FROM users 
-        WHERE is_primary_admin = FALSE OR is_primary_admin IS NULL
-    """))
-    
-    connection.commit()
+    if connection.dialect.name == "postgresql":
+        # TRUNCATE drops the table data in one statement instead of row-by-row deletes
+        print("\n   Step 1/2: Truncating classes, subjects, students, sessions and records...")
+        connection.execute(text("""
+            TRUNCATE TABLE attendance_records, leave_records, attendance_sessions,
+                           students, subjects, classes
+            RESTART IDENTITY CASCADE
+        """))
+        
+        print("   Step 2/2: Deleting users (except primary admin)...")
+        connection.execute(text("""
+            DELETE FROM users 
+            WHERE is_primary_admin = FALSE OR is_primary_admin IS NULL
+        """))
+    else:
+        # SQLite has no TRUNCATE - delete in reverse dependency order
+        print("\n   Step 1/7: Deleting attendance records...")
+        connection.execute(text("DELETE FROM attendance_records"))
+        
+        print("   Step 2/7: Deleting leave records...")
+        connection.execute(text("DELETE FROM leave_records"))
+        
+        print("   Step 3/7: Deleting attendance sessions...")
+        connection.execute(text("DELETE FROM attendance_sessions"))
+        
+        print("   Step 4/7: Deleting students...")
+        connection.execute(text("DELETE FROM students"))
+        
+        print("   Step 5/7: Deleting subjects...")
+        connection.execute(text("DELETE FROM subjects"))
+        
+        print("   Step 6/7: Deleting classes...")
+        connection.execute(text("DELETE FROM classes"))
+        
+        print("   Step 7/7: Deleting users (except primary admin)...")
+        connection.execute(text("""
+            DELETE FROM users 
+            WHERE is_primary_admin = FALSE OR is_primary_admin IS NULL
+        """))
     
     print("\n   ✅ All data deleted successfully!")
     print("   🔒 Primary admin preserved")
     print("   📋 All tables remain intact (schema preserved)")
 
+def run_cleanup(connection, cleanup):
+    """Run a cleanup operation in a single transaction, committed once when it finishes"""
+    if connection.in_transaction():
+        connection.commit()  # End the read-only transaction left open by show_stats
+    
+    with connection.begin():
+        cleanup(connection)
+
 def show_menu():
     """Display cleanup menu"""
     print("\n" + "=" * 70)
@@ -281,7 +313,7 @@ def main():
     clear_screen()
     print_header()
     
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
     
     with engine.connect() as connection:
         # Show initial stats
@@ -299,49 +331,49 @@ def main():
             
             elif choice == '1':
                 if confirm_action("Delete ALL Students"):
-                    cleanup_students(connection)
+                    run_cleanup(connection, cleanup_students)
                     show_stats(connection)
                 else:
                     print("   ❌ Cancelled")
             
             elif choice == '2':
                 if confirm_action("Delete ALL Attendance Sessions"):
-                    cleanup_attendance_sessions(connection)
+                    run_cleanup(connection, cleanup_attendance_sessions)
                     show_stats(connection)
                 else:
                     print("   ❌ Cancelled")
             
             elif choice == '3':
                 if confirm_action("Delete ALL Attendance Records"):
-                    cleanup_attendance_records(connection)
+                    run_cleanup(connection, cleanup_attendance_records)
                     show_stats(connection)
                 else:
                     print("   ❌ Cancelled")
             
             elif choice == '4':
                 if confirm_action("Delete ALL Leave Records"):
-                    cleanup_leave_records(connection)
+                    run_cleanup(connection, cleanup_leave_records)
                     show_stats(connection)
                 else:
                     print("   ❌ Cancelled")
             
             elif choice == '5':
                 if confirm_action("Delete ALL Subjects"):
-                    cleanup_subjects(connection)
+                    run_cleanup(connection, cleanup_subjects)
                     show_stats(connection)
                 else:
                     print("   ❌ Cancelled")
             
             elif choice == '6':
                 if confirm_action("Delete ALL Classes (and related data)"):
-                    cleanup_classes(connection)
+                    run_cleanup(connection, cleanup_classes)
                     show_stats(connection)
                 else:
                     print("   ❌ Cancelled")
             
             elif choice == '7':
                 if confirm_action("Delete ALL Users (except primary admin)"):
-                    cleanup_users(connection)
+                    run_cleanup(connection, cleanup_users)
                     show_stats(connection)
                 else:
                     print("   ❌ Cancelled")
@@ -369,7 +401,7 @@ def main():
                     print("\n⚠️  FINAL CONFIRMATION")
                     final = input("Type 'DELETE EVERYTHING' to proceed: ")
                     if final == 'DELETE EVERYTHING':
-                        cleanup_all_data(connection)
+                        run_cleanup(connection, cleanup_all_data)
                         show_stats(connection)
                     else:
                         print("   ❌ Cancelled (incorrect confirmation)")
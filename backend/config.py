@@ -1,9 +1,16 @@
 """
 Configuration for the Dental Attendance System
 """
+import importlib.util
+import json
 import os
+import re
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
+from types import MappingProxyType
+from dotenv import dotenv_values, load_dotenv
 
 # Base directories
 BASE_DIR = Path(__file__).parent  # backend/
@@ -12,28 +19,139 @@ ROOT_DIR = BASE_DIR.parent         # project root
 # Load environment variables from ROOT .env file (single source of truth)
 # This ensures the same .env is used regardless of working directory
 env_path = ROOT_DIR / ".env"
-if env_path.exists():
-    load_dotenv(dotenv_path=env_path, override=True)
-    print(f"✅ Loaded config from: {env_path}")
+env_cache_path = ROOT_DIR / ".env.cache.json"
+
+# Set once a .env has been applied; worker/reloader processes inherit the parent's
+# environment, so a matching marker means the values are already in os.environ
+_ENV_APPLIED_MARKER = "DENTAL_ATTENDANCE_ENV_KEY"
+
+
+def _write_json_cache(cache_path, data):
+    """
+    Atomically write a startup cache file; failures just mean recomputing next start
+    
+    The file is owner-only (0600): the .env cache holds the same database, AWS
+    and Redis credentials as .env itself.
+    """
+    try:
+        tmp_path = cache_path.with_suffix(".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        if os.name == "posix":
+            os.fchmod(fd, 0o600)  # A leftover .tmp keeps its old mode through O_CREAT
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Read-only checkout
+
+
+def _load_env_file(path, cache_path):
+    """
+    Apply a .env file to os.environ, reusing the parsed values cached on disk
+    
+    The cache is keyed by the file's mtime and size, so any edit to .env is
+    re-parsed by python-dotenv. JSON rather than pickle so a tampered cache
+    file can't execute code. Child processes (uvicorn reload/workers) skip
+    even the cache read when they inherit the parent's applied environment.
+    
+    Returns:
+        False if the .env file doesn't exist, True once it has been applied
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return False
+    key = [stat.st_mtime_ns, stat.st_size]
+    marker = f"{stat.st_mtime_ns}:{stat.st_size}"
+    
+    if os.environ.get(_ENV_APPLIED_MARKER) == marker:
+        return True  # Inherited from a parent process that applied this same .env
+    
+    try:
+        # Caches written before they were owner-only get tightened on first read
+        if os.name == "posix":
+            os.chmod(cache_path, 0o600)
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            os.environ.update(cached["values"])
+            os.environ[_ENV_APPLIED_MARKER] = marker
+            return True
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # Missing or unreadable cache - parse the .env below
+    
+    # Keys without a value parse as None; load_dotenv skips them too
+    values = {name: value for name, value in dotenv_values(path).items() if value is not None}
+    os.environ.update(values)
+    os.environ[_ENV_APPLIED_MARKER] = marker
+    _write_json_cache(cache_path, {"key": key, "values": values})
+    return True
+
+
+# Startup diagnostics are collected here and written to stderr in one go
+_startup_messages = []
+
+
+def _flush_startup_messages():
+    if _startup_messages:
+        sys.stderr.write("\n".join(_startup_messages) + "\n")
+        _startup_messages.clear()
+
+
+# A single stat inside _load_env_file doubles as the existence check
+if _load_env_file(env_path, env_cache_path):
+    _startup_messages.append(f"✅ Loaded config from: {env_path}")
 else:
-    print(f"⚠️ WARNING: .env file not found at {env_path}")
+    _startup_messages.append(f"⚠️ WARNING: .env file not found at {env_path}")
     load_dotenv()  # Fallback to default behavior
 
+# Snapshot of the environment once .env is applied - every setting below is
+# read from this plain dict, and later changes to os.environ don't alter config
+_env = dict(os.environ)
+
+
+def _env_float(name, default):
+    """Float setting; an unset variable returns the default without parsing it"""
+    value = _env.get(name)
+    return default if value is None else float(value)
+
+
+def _env_int(name, default):
+    """Integer setting; an unset variable returns the default without parsing it"""
+    value = _env.get(name)
+    return default if value is None else int(value)
+
+
+# Common spellings of "true", matched without lowercasing the value
+_TRUTHY = frozenset({"true", "True", "TRUE"})
+
+
+def _env_bool(name, default):
+    """Boolean setting - only "true" (any case) is truthy when the variable is set"""
+    value = _env.get(name)
+    if value is None:
+        return default
+    return value in _TRUTHY or value.lower() == "true"
+
 STATIC_DIR = BASE_DIR / "static"
+STATIC_DIR_STR = str(STATIC_DIR)  # For joining per-file paths without Path objects
 
 # ===== DATABASE CONFIGURATION =====
 # Supports both PostgreSQL and SQLite via DATABASE_TYPE env variable
-DATABASE_TYPE = os.getenv("DATABASE_TYPE", "sqlite").lower()  # "postgresql" or "sqlite"
+DATABASE_TYPE = _env.get("DATABASE_TYPE", "sqlite").lower()  # "postgresql" or "sqlite"
 
 if DATABASE_TYPE == "postgresql":
     # PostgreSQL Configuration
     from urllib.parse import quote_plus
     
-    POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
-    POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
-    POSTGRES_DB = os.getenv("POSTGRES_DB", "dental_attendance")
-    POSTGRES_USER = os.getenv("POSTGRES_USER", "dental_user")
-    POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "")
+    POSTGRES_HOST = _env.get("POSTGRES_HOST", "localhost")
+    POSTGRES_PORT = _env.get("POSTGRES_PORT", "5432")
+    POSTGRES_DB = _env.get("POSTGRES_DB", "dental_attendance")
+    POSTGRES_USER = _env.get("POSTGRES_USER", "dental_user")
+    POSTGRES_PASSWORD = _env.get("POSTGRES_PASSWORD")
+    if not POSTGRES_PASSWORD:
+        _flush_startup_messages()
+        raise RuntimeError("POSTGRES_PASSWORD must be set in .env when DATABASE_TYPE=postgresql")
     
     # URL-encode special characters in username and password
     encoded_user = quote_plus(POSTGRES_USER)
@@ -43,21 +161,99 @@ if DATABASE_TYPE == "postgresql":
     DB_ENGINE_ARGS = {}  # PostgreSQL doesn't need special args
 else:
     # SQLite Configuration (default)
-    DB_FILE = os.getenv("DB_FILE", "attendance.db")
+    DB_FILE = _env.get("DB_FILE", "attendance.db")
     
     # Ensure DB_FILE is an absolute path
-    if not os.path.isabs(DB_FILE):
+    if DB_FILE != ":memory:" and not os.path.isabs(DB_FILE):
         DB_FILE = str(BASE_DIR / DB_FILE)
     
     DATABASE_URL = f"sqlite:///{DB_FILE}"
     DB_ENGINE_ARGS = {"check_same_thread": False}  # SQLite-specific: allow multiple threads
 
+# Connection pool tuning (PostgreSQL). A short pool timeout surfaces pool
+# exhaustion as an error within seconds instead of stalling a request for 30s.
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 5.0)
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 300)  # Seconds before a connection is replaced
+# Costs one round-trip per checkout; redundant behind pgbouncer, which checks server connections itself
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+
+def _engine_kwargs():
+    """Pool and batching arguments for the engine"""
+    if DATABASE_TYPE == "postgresql":
+        return dict(
+            pool_pre_ping=DB_POOL_PRE_PING,  # PostgreSQL connection health check
+            pool_size=DB_POOL_SIZE,          # Connection pool size
+            max_overflow=DB_MAX_OVERFLOW,    # Additional connections allowed
+            pool_timeout=DB_POOL_TIMEOUT,    # Seconds to wait for a free connection
+            pool_recycle=DB_POOL_RECYCLE,    # Drop connections before server/proxy idle limits
+            insertmanyvalues_page_size=1000,  # Rows per multi-VALUES bulk INSERT
+            echo=False  # Set to True for SQL debugging
+        )
+
+    kwargs = dict(
+        insertmanyvalues_page_size=1000,  # Rows per multi-VALUES bulk INSERT
+        echo=False  # Set to True for SQL debugging
+    )
+    if DB_FILE == ":memory:":
+        from sqlalchemy.pool import StaticPool
+
+        # An in-memory database only exists on its one connection, so share it
+        kwargs["poolclass"] = StaticPool
+    # A file database keeps SQLAlchemy's default QueuePool: pooled connections
+    # hold on to the page cache and mmap set up by SQLITE_PRAGMAS
+    return kwargs
+
+
+# Applied to every new SQLite connection. WAL lets dashboard reads proceed while
+# attendance is being written; synchronous=NORMAL only fsyncs at checkpoints,
+# which in WAL mode still keeps committed transactions intact across app crashes.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",  # 256 MB of the file memory-mapped for reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MB page cache (negative = KiB)
+)
+
+
+def _apply_sqlite_pragmas(engine):
+    """Register a connect hook running SQLITE_PRAGMAS on an engine's connections"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """Return the process-wide SQLAlchemy engine, creating it on first call"""
+    from sqlalchemy import create_engine
+
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args=DB_ENGINE_ARGS,  # SQLite-specific: allow multiple threads
+        **_engine_kwargs()
+    )
+    if DATABASE_TYPE != "postgresql":
+        _apply_sqlite_pragmas(engine)
+    return engine
+
+
 # Redis Configuration
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
-REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
-REDIS_CACHE_EXPIRATION_SECONDS = int(os.getenv("REDIS_CACHE_EXPIRATION_SECONDS", "300"))
+REDIS_HOST = _env.get("REDIS_HOST", "localhost")
+REDIS_PORT = _env_int("REDIS_PORT", 6379)
+REDIS_DB = _env_int("REDIS_DB", 0)
+REDIS_PASSWORD = _env.get("REDIS_PASSWORD", "")
+REDIS_CACHE_EXPIRATION_SECONDS = _env_int("REDIS_CACHE_EXPIRATION_SECONDS", 300)
 
 # Redis connection URL
 if REDIS_PASSWORD:
@@ -66,118 +262,156 @@ else:
     REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 
 # Photo Storage Configuration
-PHOTO_STORAGE_TYPE = os.getenv("PHOTO_STORAGE_TYPE", "local").lower()  # "local" or "s3"
+PHOTO_STORAGE_TYPE = _env.get("PHOTO_STORAGE_TYPE", "local").lower()  # "local" or "s3"
 
 # AWS S3 Configuration (used when PHOTO_STORAGE_TYPE = "s3")
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
-
-# Static file paths (for local storage)
-STUDENT_PHOTOS_DIR = STATIC_DIR / "student_photos"
-ATTENDANCE_PHOTOS_DIR = STATIC_DIR / "attendance_photos"
-DATASET_DIR = STATIC_DIR / "dataset"
-EXPORTS_DIR = STATIC_DIR / "exports"
-
-# Photo URL base configuration
-if PHOTO_STORAGE_TYPE == "s3":
-    PHOTO_BASE_URL = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com"
-else:
-    PHOTO_BASE_URL = os.getenv("BACKEND_BASE_URL", "http://localhost:8000")
+AWS_ACCESS_KEY_ID = _env.get("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = _env.get("AWS_SECRET_ACCESS_KEY")
+AWS_REGION = _env.get("AWS_REGION", "us-east-1")
+S3_BUCKET_NAME = _env.get("S3_BUCKET_NAME")
+
+# Static file paths (for local storage) and photo URL base - built on first
+# access through the module __getattr__ below (PEP 562)
+def _photo_base_url():
+    if PHOTO_STORAGE_TYPE == "s3":
+        return f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com"
+    return _env.get("BACKEND_BASE_URL", "http://localhost:8000")
+
+
+_LAZY_SETTINGS = {
+    "STUDENT_PHOTOS_DIR": lambda: STATIC_DIR / "student_photos",
+    "ATTENDANCE_PHOTOS_DIR": lambda: STATIC_DIR / "attendance_photos",
+    "DATASET_DIR": lambda: STATIC_DIR / "dataset",
+    "EXPORTS_DIR": lambda: STATIC_DIR / "exports",
+    "PHOTO_BASE_URL": _photo_base_url,
+}
+
+
+def __getattr__(name):
+    """Compute a lazy setting on first access and cache it as a module global"""
+    factory = _LAZY_SETTINGS.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = factory()
+    return value
 
 # Face recognition settings
-FACE_RECOGNITION_MODEL = os.getenv("FACE_RECOGNITION_MODEL", "ArcFace")  # Upgraded to ArcFace
-FACE_DETECTOR_BACKEND = os.getenv("FACE_DETECTOR_BACKEND", "mtcnn")
-FACE_DISTANCE_THRESHOLD = float(os.getenv("FACE_DISTANCE_THRESHOLD", "18.0"))  # Adjusted for ArcFace
+FACE_RECOGNITION_MODEL = _env.get("FACE_RECOGNITION_MODEL", "ArcFace")  # Upgraded to ArcFace
+FACE_DETECTOR_BACKEND = _env.get("FACE_DETECTOR_BACKEND", "mtcnn")
+FACE_DISTANCE_THRESHOLD = _env_float("FACE_DISTANCE_THRESHOLD", 18.0)  # Adjusted for ArcFace
+FACE_DISTANCE_THRESHOLD_EXPLICIT = "FACE_DISTANCE_THRESHOLD" in _env  # Set in .env vs model default
 FACE_CONFIDENCE_THRESHOLD = 0.65  # For older HOG-based system
 
 # Adaptive threshold configuration
-ADAPTIVE_THRESHOLD_MODE = os.getenv("ADAPTIVE_THRESHOLD_MODE", "disabled").lower()
+ADAPTIVE_THRESHOLD_MODE = _env.get("ADAPTIVE_THRESHOLD_MODE", "disabled").lower()
 if ADAPTIVE_THRESHOLD_MODE not in ["enabled", "disabled"]:
     ADAPTIVE_THRESHOLD_MODE = "disabled"  # Fallback to disabled if invalid
 
 # ===== CORE RECOGNITION SETTINGS (Controllable via .env) =====
 # Minimum confidence to consider a match (0.0 to 1.0)
-MIN_CONFIDENCE_THRESHOLD = float(os.getenv("MIN_CONFIDENCE_THRESHOLD", "0.35"))
+MIN_CONFIDENCE_THRESHOLD = _env_float("MIN_CONFIDENCE_THRESHOLD", 0.35)
+
+# Gallery precision for advanced matching: "float32" or "int8" (4x smaller, <1% cosine error; needs numba)
+EMBEDDING_DTYPE = _env.get("EMBEDDING_DTYPE", "float32").lower()
+if EMBEDDING_DTYPE not in ["float32", "int8"]:
+    EMBEDDING_DTYPE = "float32"  # Fallback to full precision if invalid
+
+# Recently recognized faces to remember per gallery (0 disables the cache)
+RECOGNITION_CACHE_SIZE = _env_int("RECOGNITION_CACHE_SIZE", 512)
 
 # Minimum face size in pixels (faces smaller than this are rejected)
-MIN_FACE_SIZE = int(os.getenv("MIN_FACE_SIZE", "30"))
+MIN_FACE_SIZE = _env_int("MIN_FACE_SIZE", 30)
 
 # Enable enhanced image preprocessing (histogram eq, sharpening, denoising)
-ENHANCED_PREPROCESSING = os.getenv("ENHANCED_PREPROCESSING", "true").lower() == "true"
+ENHANCED_PREPROCESSING = _env_bool("ENHANCED_PREPROCESSING", True)
 
 # Enable multi-detector cascade (fallback through multiple detectors)
-ENABLE_MULTI_DETECTOR = os.getenv("ENABLE_MULTI_DETECTOR", "true").lower() == "true"
+ENABLE_MULTI_DETECTOR = _env_bool("ENABLE_MULTI_DETECTOR", True)
 
 # Enable face quality assessment (filters low-quality faces)
-ENABLE_QUALITY_ASSESSMENT = os.getenv("ENABLE_QUALITY_ASSESSMENT", "true").lower() == "true"
+ENABLE_QUALITY_ASSESSMENT = _env_bool("ENABLE_QUALITY_ASSESSMENT", True)
 
 # Adaptive threshold adjustments for group photos
-THRESHOLD_SMALL_GROUP_OFFSET = float(os.getenv("THRESHOLD_SMALL_GROUP_OFFSET", "4.0"))  # Added for 3-10 faces
-THRESHOLD_LARGE_GROUP_OFFSET = float(os.getenv("THRESHOLD_LARGE_GROUP_OFFSET", "8.0"))  # Added for 11+ faces
+THRESHOLD_SMALL_GROUP_OFFSET = _env_float("THRESHOLD_SMALL_GROUP_OFFSET", 4.0)  # Added for 3-10 faces
+THRESHOLD_LARGE_GROUP_OFFSET = _env_float("THRESHOLD_LARGE_GROUP_OFFSET", 8.0)  # Added for 11+ faces
 
 # Ambiguity detection margin (rejects if best/second-best are too close)
-AMBIGUITY_MARGIN = float(os.getenv("AMBIGUITY_MARGIN", "3.0"))
+AMBIGUITY_MARGIN = _env_float("AMBIGUITY_MARGIN", 3.0)
 
 # Model performance configurations
-MODEL_CONFIGS = {
-    "Facenet512": {"threshold": 20.0, "embedding_size": 512},
-    "ArcFace": {"threshold": 18.0, "embedding_size": 512},
-    "Facenet": {"threshold": 15.0, "embedding_size": 128},
-    "GhostFaceNet": {"threshold": 19.0, "embedding_size": 512},
-    "SFace": {"threshold": 12.0, "embedding_size": 128}
-}
+@dataclass(frozen=True, slots=True)
+class ModelConfig:
+    """Default distance threshold and embedding size of a recognition model"""
+    threshold: float
+    embedding_size: int
+
+
+MODEL_CONFIGS = MappingProxyType({
+    "Facenet512": ModelConfig(threshold=20.0, embedding_size=512),
+    "ArcFace": ModelConfig(threshold=18.0, embedding_size=512),
+    "Facenet": ModelConfig(threshold=15.0, embedding_size=128),
+    "GhostFaceNet": ModelConfig(threshold=19.0, embedding_size=512),
+    "SFace": ModelConfig(threshold=12.0, embedding_size=128)
+})
+
+
+def _freeze(table):
+    """Read-only view of a two-level reference table so callers can't mutate shared config"""
+    return MappingProxyType({name: MappingProxyType(entry) for name, entry in table.items()})
 
 # ===== ACCURACY IMPROVEMENT SETTINGS =====
 
 # Ensemble recognition
-ENABLE_ENSEMBLE_RECOGNITION = os.getenv("ENABLE_ENSEMBLE_RECOGNITION", "false").lower() == "true"
-ENSEMBLE_MODELS_STRING = os.getenv("ENSEMBLE_MODELS", "ArcFace:0.45,Facenet512:0.35,SFace:0.20")
+ENABLE_ENSEMBLE_RECOGNITION = _env_bool("ENABLE_ENSEMBLE_RECOGNITION", False)
+ENSEMBLE_MODELS_STRING = _env.get("ENSEMBLE_MODELS", "ArcFace:0.45,Facenet512:0.35,SFace:0.20")
 
-# Parse ensemble models configuration
+# Parse ensemble models configuration ("Name:weight,Name:weight")
+_ENSEMBLE_MODEL_RE = re.compile(r'([A-Za-z0-9_]+)\s*:\s*([0-9.]+)')
 ENSEMBLE_MODELS_CONFIG = {}
 if ENABLE_ENSEMBLE_RECOGNITION and ENSEMBLE_MODELS_STRING:
-    for model_config in ENSEMBLE_MODELS_STRING.split(','):
-        if ':' in model_config:
-            model_name, weight = model_config.strip().split(':')
-            model_name = model_name.strip()
-            if model_name in MODEL_CONFIGS:
-                ENSEMBLE_MODELS_CONFIG[model_name] = {
-                    'weight': float(weight),
-                    'threshold': MODEL_CONFIGS[model_name]['threshold']
-                }
+    ENSEMBLE_MODELS_CONFIG = {
+        match.group(1): {
+            'weight': float(match.group(2)),
+            'threshold': MODEL_CONFIGS[match.group(1)].threshold
+        }
+        for match in _ENSEMBLE_MODEL_RE.finditer(ENSEMBLE_MODELS_STRING)
+        if match.group(1) in MODEL_CONFIGS
+    }
 
 # Advanced preprocessing
-ENABLE_FACE_ALIGNMENT = os.getenv("ENABLE_FACE_ALIGNMENT", "true").lower() == "true"
-ENABLE_ILLUMINATION_NORMALIZATION = os.getenv("ENABLE_ILLUMINATION_NORMALIZATION", "true").lower() == "true"
-ENABLE_SHARPNESS_ENHANCEMENT = os.getenv("ENABLE_SHARPNESS_ENHANCEMENT", "true").lower() == "true"
-ENABLE_NOISE_REDUCTION = os.getenv("ENABLE_NOISE_REDUCTION", "true").lower() == "true"
-ENABLE_SUPER_RESOLUTION = os.getenv("ENABLE_SUPER_RESOLUTION", "true").lower() == "true"
+ENABLE_FACE_ALIGNMENT = _env_bool("ENABLE_FACE_ALIGNMENT", True)
+ENABLE_ILLUMINATION_NORMALIZATION = _env_bool("ENABLE_ILLUMINATION_NORMALIZATION", True)
+ENABLE_SHARPNESS_ENHANCEMENT = _env_bool("ENABLE_SHARPNESS_ENHANCEMENT", True)
+ENABLE_NOISE_REDUCTION = _env_bool("ENABLE_NOISE_REDUCTION", True)
+ENABLE_SUPER_RESOLUTION = _env_bool("ENABLE_SUPER_RESOLUTION", True)
 
 # Quality filtering
-ENABLE_QUALITY_FILTERING = os.getenv("ENABLE_QUALITY_FILTERING", "true").lower() == "true"
-MIN_FACE_QUALITY_SCORE = float(os.getenv("MIN_FACE_QUALITY_SCORE", "0.4"))
-MIN_SHARPNESS_THRESHOLD = float(os.getenv("MIN_SHARPNESS_THRESHOLD", "50.0"))
-REJECT_BLURRY_FACES = os.getenv("REJECT_BLURRY_FACES", "true").lower() == "true"
-REJECT_OCCLUDED_FACES = os.getenv("REJECT_OCCLUDED_FACES", "true").lower() == "true"
+ENABLE_QUALITY_FILTERING = _env_bool("ENABLE_QUALITY_FILTERING", True)
+MIN_FACE_QUALITY_SCORE = _env_float("MIN_FACE_QUALITY_SCORE", 0.4)
+MIN_SHARPNESS_THRESHOLD = _env_float("MIN_SHARPNESS_THRESHOLD", 50.0)
+REJECT_BLURRY_FACES = _env_bool("REJECT_BLURRY_FACES", True)
+REJECT_OCCLUDED_FACES = _env_bool("REJECT_OCCLUDED_FACES", True)
 
 # Data augmentation
-ENABLE_DATA_AUGMENTATION = os.getenv("ENABLE_DATA_AUGMENTATION", "true").lower() == "true"
-AUGMENTATION_VARIATIONS = int(os.getenv("AUGMENTATION_VARIATIONS", "5"))
+ENABLE_DATA_AUGMENTATION = _env_bool("ENABLE_DATA_AUGMENTATION", True)
+AUGMENTATION_VARIATIONS = _env_int("AUGMENTATION_VARIATIONS", 5)
 
 # Confidence thresholds
-MIN_RECOGNITION_CONFIDENCE = float(os.getenv("MIN_RECOGNITION_CONFIDENCE", "0.50"))
-HIGH_CONFIDENCE_THRESHOLD = float(os.getenv("HIGH_CONFIDENCE_THRESHOLD", "0.80"))
+MIN_RECOGNITION_CONFIDENCE = _env_float("MIN_RECOGNITION_CONFIDENCE", 0.50)
+HIGH_CONFIDENCE_THRESHOLD = _env_float("HIGH_CONFIDENCE_THRESHOLD", 0.80)
 
 # Advanced detection
-ENABLE_MULTI_DETECTOR_FALLBACK = os.getenv("ENABLE_MULTI_DETECTOR_FALLBACK", "true").lower() == "true"
-DETECTOR_FALLBACK_SEQUENCE = os.getenv("DETECTOR_FALLBACK_SEQUENCE", "mtcnn,retinaface,mediapipe,opencv").split(',')
+ENABLE_MULTI_DETECTOR_FALLBACK = _env_bool("ENABLE_MULTI_DETECTOR_FALLBACK", True)
+DETECTOR_FALLBACK_SEQUENCE = tuple(
+    detector.strip()
+    for detector in _env.get("DETECTOR_FALLBACK_SEQUENCE", "mtcnn,retinaface,mediapipe,opencv").split(',')
+    if detector.strip()
+)
 
 # Logging
-LOG_QUALITY_METRICS = os.getenv("LOG_QUALITY_METRICS", "true").lower() == "true"
-LOG_ENSEMBLE_DECISIONS = os.getenv("LOG_ENSEMBLE_DECISIONS", "true").lower() == "true"
-SAVE_PROBLEMATIC_FACES = os.getenv("SAVE_PROBLEMATIC_FACES", "false").lower() == "true"
+LOG_QUALITY_METRICS = _env_bool("LOG_QUALITY_METRICS", True)
+LOG_ENSEMBLE_DECISIONS = _env_bool("LOG_ENSEMBLE_DECISIONS", True)
+SAVE_PROBLEMATIC_FACES = _env_bool("SAVE_PROBLEMATIC_FACES", False)
 
 # Face detector backends configuration
 DETECTOR_CONFIGS = {
@@ -219,69 +453,142 @@ DETECTOR_CONFIGS = {
     }
 }
 
-# Check detector availability
-def check_detector_availability():
-    """Check which detector backends are available"""
+DETECTOR_CONFIGS = _freeze(DETECTOR_CONFIGS)
+
+# Top-level module each detector backend needs importable
+DETECTOR_MODULES = {
+    "opencv": "cv2",
+    "mtcnn": "mtcnn",
+    "ssd": "tensorflow",
+    "retinaface": "retinaface",
+    "dlib": "dlib",
+    "mediapipe": "mediapipe"
+}
+
+
+# Probe results persist across restarts (uvicorn --reload re-runs this module on every edit)
+detector_probe_cache_path = ROOT_DIR / ".detector_probe.json"
+
+
+def _detector_probe_key():
+    """Interpreter plus the mtimes of its package directories - installs and uninstalls change them"""
+    import site
+    
+    directories = list(getattr(site, "getsitepackages", list)())
+    if site.ENABLE_USER_SITE:
+        directories.append(site.getusersitepackages())
+    
+    key = [sys.executable]
+    for directory in directories:
+        try:
+            key.append(os.stat(directory).st_mtime_ns)
+        except OSError:
+            key.append(None)
+    return key
+
+
+def _read_detector_probes():
+    key = _detector_probe_key()
+    try:
+        with open(detector_probe_cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return key, dict(cached["detectors"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # Missing or stale cache - probe again
+    return key, {}
+
+
+_detector_probe_key_value, _detector_probes = _read_detector_probes()
+
+
+def _is_detector_available(detector_name):
+    """
+    Check whether a single detector backend is installed (memoized)
+    
+    Uses find_spec so the package is located on sys.path without being
+    executed - importing TensorFlow just to see that it exists takes seconds.
+    Results are kept in .detector_probe.json until the environment changes.
+    """
+    if detector_name not in _detector_probes:
+        module_name = DETECTOR_MODULES.get(detector_name)
+        _detector_probes[detector_name] = (
+            module_name is not None and importlib.util.find_spec(module_name) is not None
+        )
+        _write_json_cache(detector_probe_cache_path,
+                          {"key": _detector_probe_key_value, "detectors": _detector_probes})
+    return _detector_probes[detector_name]
+
+
+@lru_cache(maxsize=None)
+def get_detector_availability():
+    """
+    Check which detector backends are available
+    
+    Probed on first call rather than at import - importing every backend
+    (TensorFlow, dlib, mediapipe, ...) costs seconds of startup.
+    
+    Returns:
+        Tuple of (available_detectors, unavailable_detectors)
+    """
     available_detectors = []
     unavailable_detectors = []
     
     for detector_name in DETECTOR_CONFIGS.keys():
-        try:
-            if detector_name == 'opencv':
-                import cv2
-                available_detectors.append(detector_name)
-            elif detector_name == 'mtcnn':
-                import mtcnn
-                available_detectors.append(detector_name)
-            elif detector_name == 'ssd':
-                import tensorflow
-                available_detectors.append(detector_name)
-            elif detector_name == 'retinaface':
-                from retinaface import RetinaFace  # Updated import
-                available_detectors.append(detector_name)
-            elif detector_name == 'dlib':
-                import dlib
-                available_detectors.append(detector_name)
-            elif detector_name == 'mediapipe':
-                import mediapipe
-                available_detectors.append(detector_name)
-        except ImportError:
+        if _is_detector_available(detector_name):
+            available_detectors.append(detector_name)
+        else:
             unavailable_detectors.append(detector_name)
     
     return available_detectors, unavailable_detectors
 
-# Get available detectors
-AVAILABLE_DETECTORS, UNAVAILABLE_DETECTORS = check_detector_availability()
-
-# Validate selected detector
-if FACE_DETECTOR_BACKEND not in AVAILABLE_DETECTORS:
-    print(f"⚠️ WARNING: Selected detector '{FACE_DETECTOR_BACKEND}' is not available!")
-    print(f"Available detectors: {', '.join(AVAILABLE_DETECTORS)}")
-    if AVAILABLE_DETECTORS:
+# Validate selected detector - only the selected backend is probed at import
+if not _is_detector_available(FACE_DETECTOR_BACKEND):
+    _available_detectors, _ = get_detector_availability()
+    _startup_messages.append(f"⚠️ WARNING: Selected detector '{FACE_DETECTOR_BACKEND}' is not available!")
+    _startup_messages.append(f"Available detectors: {', '.join(_available_detectors)}")
+    if _available_detectors:
         # Fall back to first available detector
-        fallback_detector = AVAILABLE_DETECTORS[0]
-        print(f"🔄 Falling back to '{fallback_detector}'")
+        fallback_detector = _available_detectors[0]
+        _startup_messages.append(f"🔄 Falling back to '{fallback_detector}'")
         FACE_DETECTOR_BACKEND = fallback_detector
     else:
+        _flush_startup_messages()
         raise RuntimeError("No face detector backends are available!")
 
+# Drop cascade entries whose packages aren't installed so detection doesn't pay
+# for a failing DeepFace call on every photo (backends we can't probe are kept).
+# With the cascade disabled only the pinned backend is used, so nothing else is probed.
+if ENABLE_MULTI_DETECTOR:
+    DETECTOR_FALLBACK_SEQUENCE = tuple(
+        detector for detector in DETECTOR_FALLBACK_SEQUENCE
+        if detector not in DETECTOR_MODULES or _is_detector_available(detector)
+    ) or (FACE_DETECTOR_BACKEND,)
+
 # Server settings
 HOST = "0.0.0.0"
 PORT = 8000
 DEBUG = True
 
 # Logging settings
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVEL = _env.get("LOG_LEVEL", "INFO")
 LOG_FILE = ROOT_DIR / "dental_attendance.log"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 # Configurable logging throttle interval in milliseconds
 # Controls the minimum time between similar log messages
 # This value is read directly from the .env file
-_throttle_ms = os.getenv("LOG_THROTTLE_MS")
-if _throttle_ms is None:
-    raise ValueError("LOG_THROTTLE_MS must be set in the .env file")
-LOG_THROTTLE_MS = int(_throttle_ms)
+@lru_cache(maxsize=None)
+def get_log_throttle_ms():
+    """Read and validate LOG_THROTTLE_MS once; it's required and has no default"""
+    throttle_ms = _env.get("LOG_THROTTLE_MS")
+    if throttle_ms is None:
+        _flush_startup_messages()
+        raise ValueError("LOG_THROTTLE_MS must be set in the .env file")
+    return int(throttle_ms)
+
+
+LOG_THROTTLE_MS = get_log_throttle_ms()
 
 # CORS settings
 CORS_ORIGINS = ["*"]  # In production, specify actual origins
@@ -290,19 +597,29 @@ CORS_ORIGINS = ["*"]  # In production, specify actual origins
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 
+_flush_startup_messages()
+
 # Create directories if they don't exist
 def ensure_directories():
     """Create necessary directories"""
-    directories = [
-        STATIC_DIR,
-        STUDENT_PHOTOS_DIR,
-        ATTENDANCE_PHOTOS_DIR,
-        DATASET_DIR,
-        EXPORTS_DIR
+    subdirectories = [
+        __getattr__("STUDENT_PHOTOS_DIR"),
+        __getattr__("ATTENDANCE_PHOTOS_DIR"),
+        __getattr__("DATASET_DIR"),
+        __getattr__("EXPORTS_DIR")
     ]
     
-    for directory in directories:
-        directory.mkdir(parents=True, exist_ok=True)
+    # One directory listing tells us which already exist, instead of a mkdir per path
+    try:
+        with os.scandir(STATIC_DIR) as entries:
+            existing = {entry.name for entry in entries if entry.is_dir()}
+    except FileNotFoundError:
+        STATIC_DIR.mkdir(parents=True, exist_ok=True)
+        existing = set()
+    
+    for directory in subdirectories:
+        if directory.name not in existing:
+            directory.mkdir(parents=True, exist_ok=True)
 
 if __name__ == "__main__":
     ensure_directories()
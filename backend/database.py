@@ -5,66 +5,71 @@ This module provides SQLAlchemy ORM models for SQLite with class support.
 """
 
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional
 
 from sqlalchemy import (
     Boolean,
-    Column,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
+    LargeBinary,
     String,
     Text,
-    create_engine,
+    event,
+    inspect,
+    insert,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    contains_eager,
+    mapped_column,
+    relationship,
+    selectinload,
+    sessionmaker,
 )
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
 
 # Import configuration
-from config import DATABASE_URL, DATABASE_TYPE, DB_ENGINE_ARGS
+from config import DATABASE_TYPE, get_engine
 
 # Engine and session factory - supports both PostgreSQL and SQLite
-if DATABASE_TYPE == "postgresql":
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,  # PostgreSQL connection health check
-        pool_size=10,        # Connection pool size
-        max_overflow=20,     # Additional connections allowed
-        echo=False  # Set to True for SQL debugging
-    )
-else:
-    # SQLite configuration
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args=DB_ENGINE_ARGS,  # SQLite-specific: allow multiple threads
-        echo=False  # Set to True for SQL debugging
-    )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = get_engine()
+# Autoflush so a query sees objects added earlier in the same session. Objects
+# aren't expired on commit: sessions live for one request, and expiring would
+# re-SELECT every attribute read after commit (refresh() where a reload is wanted).
+SessionLocal = sessionmaker(autocommit=False, autoflush=True, expire_on_commit=False, bind=engine)
 
-Base = declarative_base()
+
+class Base(DeclarativeBase):
+    """Declarative base shared by all models"""
 
 
 class User(Base):
     """User accounts for authentication and authorization"""
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(150), unique=True, nullable=False, index=True)
-    password_hash = Column(String(255), nullable=False)
-    role = Column(String(50), nullable=False, index=True)  # "superadmin" | "teacher" | "student"
-    profile_photo = Column(String(500), nullable=True)  # Path or URL to profile photo
-    is_active = Column(Boolean, default=True)
-    is_primary_admin = Column(Boolean, default=False)  # Protected superadmin (cannot be modified by others)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    username: Mapped[str] = mapped_column(String(150), unique=True, nullable=False, index=True)
+    password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
+    role: Mapped[str] = mapped_column(String(50), nullable=False, index=True)  # "superadmin" | "teacher" | "student"
+    profile_photo: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)  # Path or URL to profile photo
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    is_primary_admin: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)  # Protected superadmin (cannot be modified by others)
     
     # Soft delete fields
-    is_deleted = Column(Boolean, default=False, index=True)
-    deleted_at = Column(DateTime, nullable=True)
-    deletion_reason = Column(Text, nullable=True)
-    deleted_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    is_deleted: Mapped[Optional[bool]] = mapped_column(Boolean, default=False, index=True)
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    deletion_reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    deleted_by_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}', role='{self.role}', is_active={self.is_active}, is_primary={self.is_primary_admin}, is_deleted={self.is_deleted})>"
@@ -74,18 +79,18 @@ class Class(Base):
     """Class/Section model for organizing students"""
     __tablename__ = "classes"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), nullable=False, index=True)  # e.g., "BDS 1st Year"
-    section = Column(String(200), nullable=False, index=True)  # e.g., "A", "B", "Section A - Subject Name"
-    description = Column(Text, nullable=True)
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    name: Mapped[str] = mapped_column(String(100), nullable=False, index=True)  # e.g., "BDS 1st Year"
+    section: Mapped[str] = mapped_column(String(200), nullable=False, index=True)  # e.g., "A", "B", "Section A - Subject Name"
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    students = relationship("Student", back_populates="class_obj")
-    subjects = relationship("Subject", back_populates="class_obj", cascade="all, delete-orphan")
-    attendance_sessions = relationship("AttendanceSession", back_populates="class_obj")
+    students: Mapped[List["Student"]] = relationship("Student", back_populates="class_obj")
+    subjects: Mapped[List["Subject"]] = relationship("Subject", back_populates="class_obj", cascade="all, delete-orphan")
+    attendance_sessions: Mapped[List["AttendanceSession"]] = relationship("AttendanceSession", back_populates="class_obj")
 
     def __repr__(self):
         return f"<Class(id={self.id}, name='{self.name}', section='{self.section}')>"
@@ -95,22 +100,22 @@ class Subject(Base):
     """Subject model for organizing subjects per class"""
     __tablename__ = "subjects"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(200), nullable=False, index=True)  # e.g., "Mathematics", "Physics"
-    code = Column(String(50), nullable=True, index=True)  # e.g., "MATH101", "PHY201"
-    description = Column(Text, nullable=True)
-    credits = Column(Integer, nullable=True)  # Credit hours
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    name: Mapped[str] = mapped_column(String(200), nullable=False, index=True)  # e.g., "Mathematics", "Physics"
+    code: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, index=True)  # e.g., "MATH101", "PHY201"
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    credits: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Credit hours
     
     # Class assignment - subjects belong to specific classes
-    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False, index=True)
+    class_id: Mapped[int] = mapped_column(Integer, ForeignKey("classes.id"), nullable=False, index=True)
     
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    class_obj = relationship("Class", back_populates="subjects")
-    attendance_sessions = relationship("AttendanceSession", back_populates="subject")
+    class_obj: Mapped["Class"] = relationship("Class", back_populates="subjects")
+    attendance_sessions: Mapped[List["AttendanceSession"]] = relationship("AttendanceSession", back_populates="subject")
 
     def __repr__(self):
         return f"<Subject(id={self.id}, name='{self.name}', code='{self.code}', class_id={self.class_id})>"
@@ -120,45 +125,48 @@ class Student(Base):
     """Student model with class assignment"""
     __tablename__ = "students"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(200), nullable=False, index=True)
-    age = Column(Integer, nullable=False)
-    roll_no = Column(String(50), unique=True, nullable=False, index=True)
-    prn = Column(String(50), unique=True, nullable=False, index=True)
-    seat_no = Column(String(50), unique=True, nullable=False, index=True)
-    email = Column(String(255), nullable=True)
-    phone = Column(String(20), nullable=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    name: Mapped[str] = mapped_column(String(200), nullable=False, index=True)
+    age: Mapped[int] = mapped_column(Integer, nullable=False)
+    roll_no: Mapped[str] = mapped_column(String(50), unique=True, nullable=False, index=True)
+    prn: Mapped[str] = mapped_column(String(50), unique=True, nullable=False, index=True)
+    seat_no: Mapped[str] = mapped_column(String(50), unique=True, nullable=False, index=True)
+    email: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    phone: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     
     # Additional student information
-    gender = Column(String(20), nullable=True)  # Male, Female, Other
-    blood_group = Column(String(10), nullable=True)  # A+, A-, B+, B-, AB+, AB-, O+, O-
-    parents_mobile = Column(String(20), nullable=True)  # Parent/Guardian contact
+    gender: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)  # Male, Female, Other
+    blood_group: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)  # A+, A-, B+, B-, AB+, AB-, O+, O-
+    parents_mobile: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)  # Parent/Guardian contact
     
-    photo_path = Column(String(500), nullable=True)
-    face_encoding_path = Column(String(500), nullable=True)
+    photo_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    face_encoding_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    face_encoding: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True, deferred=True)  # Raw float32 primary embedding, loaded on access
     
     # Enhanced embedding fields
-    embedding_variants_path = Column(String(500), nullable=True)
-    embedding_metadata_path = Column(String(500), nullable=True)
-    embedding_confidence = Column(Float, default=0.8)
-    adaptive_threshold = Column(Float, default=0.6)
+    embedding_variants_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    embedding_metadata_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    embedding_confidence: Mapped[Optional[float]] = mapped_column(Float, default=0.8)
+    adaptive_threshold: Mapped[Optional[float]] = mapped_column(Float, default=0.6)
     
     # Model tracking for compatibility
-    embedding_model = Column(String(50), nullable=True)  # e.g., "Facenet512", "ArcFace"
-    embedding_detector = Column(String(50), nullable=True)  # e.g., "mtcnn", "retinaface"
-    has_enhanced_embeddings = Column(Boolean, default=False)
+    embedding_model: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # e.g., "Facenet512", "ArcFace"
+    embedding_detector: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # e.g., "mtcnn", "retinaface"
+    has_enhanced_embeddings: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
     
     # Class assignment
-    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False, index=True)
-    class_section = Column(String(200), nullable=True)  # Denormalized for convenience
+    class_id: Mapped[int] = mapped_column(Integer, ForeignKey("classes.id"), nullable=False, index=True)
+    class_section: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)  # Denormalized for convenience
     
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    class_obj = relationship("Class", back_populates="students")
-    attendance_records = relationship("AttendanceRecord", back_populates="student")
+    class_obj: Mapped["Class"] = relationship("Class", back_populates="students")
+    # lazy="raise": a student can have hundreds of records, so loading them must be
+    # an explicit per-query choice (see with_attendance) rather than an N+1 lazy load
+    attendance_records: Mapped[List["AttendanceRecord"]] = relationship("AttendanceRecord", back_populates="student", lazy="raise")
 
     def __repr__(self):
         return f"<Student(id={self.id}, name='{self.name}', roll_no='{self.roll_no}', class_id={self.class_id})>"
@@ -168,51 +176,73 @@ class AttendanceSession(Base):
     """Attendance session model with class and subject filtering"""
     __tablename__ = "attendance_sessions"
 
-    id = Column(Integer, primary_key=True, index=True)
-    session_name = Column(String(200), nullable=False, index=True)
-    photo_path = Column(String(500), nullable=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_name: Mapped[str] = mapped_column(String(200), nullable=False, index=True)
+    photo_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     
-    # Class-specific session
-    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False, index=True)
+    # Class-specific session - indexed through ix_sessions_class_created and
+    # ix_sessions_class_type, which both lead with it
+    class_id: Mapped[int] = mapped_column(Integer, ForeignKey("classes.id"), nullable=False)
     
     # Subject-specific session (optional - for subject-wise attendance)
-    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=True, index=True)
+    subject_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("subjects.id"), nullable=True, index=True)
     
-    total_detected = Column(Integer, default=0)
-    total_present = Column(Integer, default=0)
-    confidence_avg = Column(Float, default=0.0)
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
-    # Session type: normal or extra
-    session_type = Column(String(20), default="normal", index=True)
+    total_detected: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    total_present: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    confidence_avg: Mapped[Optional[float]] = mapped_column(Float, default=0.0)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    # Session type: normal or extra - only two values, so it's indexed together
+    # with class_id (ix_sessions_class_type) rather than on its own
+    session_type: Mapped[Optional[str]] = mapped_column(String(20), default="normal")
 
     # Relationships
-    class_obj = relationship("Class", back_populates="attendance_sessions")
-    subject = relationship("Subject", back_populates="attendance_sessions")
-    attendance_records = relationship("AttendanceRecord", back_populates="session")
+    class_obj: Mapped["Class"] = relationship("Class", back_populates="attendance_sessions")
+    subject: Mapped[Optional["Subject"]] = relationship("Subject", back_populates="attendance_sessions")
+    # lazy="raise": callers pick a loader strategy (see load_session_with_records)
+    attendance_records: Mapped[List["AttendanceRecord"]] = relationship("AttendanceRecord", back_populates="session", lazy="raise")
+
+    __table_args__ = (
+        Index("ix_sessions_class_type", "class_id", "session_type"),
+    )
 
     def __repr__(self):
         return f"<AttendanceSession(id={self.id}, name='{self.session_name}', class_id={self.class_id})>"
 
 
+# A class's sessions, newest first, straight from the index with no sort step
+Index("ix_sessions_class_created", AttendanceSession.class_id, AttendanceSession.created_at.desc())
+
+
 class AttendanceRecord(Base):
     """Individual attendance record"""
     __tablename__ = "attendance_records"
 
-    id = Column(Integer, primary_key=True, index=True)
-    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
-    session_id = Column(Integer, ForeignKey("attendance_sessions.id"), nullable=False, index=True)
-    is_present = Column(Boolean, default=False)
-    confidence = Column(Float, default=0.0)
-    detection_details = Column(Text, nullable=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    student_id: Mapped[int] = mapped_column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    # Indexed through ix_records_session_student, whose leading column it is
+    session_id: Mapped[int] = mapped_column(Integer, ForeignKey("attendance_sessions.id"), nullable=False)
+    is_present: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+    confidence: Mapped[Optional[float]] = mapped_column(Float, default=0.0)
+    # Stored as JSONB on PostgreSQL, JSON text on SQLite; read back as a dict.
+    # none_as_null keeps None as SQL NULL rather than a JSON 'null' value.
+    detection_details: Mapped[Optional[dict]] = mapped_column(
+        JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"),
+        nullable=True,
+    )
     # Extended status and metadata
-    status = Column(String(20), default="auto")  # auto|present|absent|medical|authorized
-    note = Column(Text, nullable=True)
-    attachment_path = Column(String(500), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    status: Mapped[Optional[str]] = mapped_column(String(20), default="auto")  # auto|present|absent|medical|authorized
+    note: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attachment_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
 
     # Relationships
-    student = relationship("Student", back_populates="attendance_records")
-    session = relationship("AttendanceSession", back_populates="attendance_records")
+    student: Mapped["Student"] = relationship("Student", back_populates="attendance_records")
+    session: Mapped["AttendanceSession"] = relationship("AttendanceSession", back_populates="attendance_records")
+
+    __table_args__ = (
+        # One record per student per session; also serves "records for session X"
+        Index("ix_records_session_student", "session_id", "student_id", unique=True),
+    )
 
     def __repr__(self):
         return f"<AttendanceRecord(id={self.id}, student_id={self.student_id}, session_id={self.session_id}, present={self.is_present})>"
@@ -222,22 +252,212 @@ class LeaveRecord(Base):
     """Explicit leave/medical records with optional document attachment"""
     __tablename__ = "leave_records"
 
-    id = Column(Integer, primary_key=True, index=True)
-    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
-    leave_date = Column(DateTime, default=datetime.utcnow, index=True)
-    leave_end_date = Column(DateTime, nullable=True)  # For multi-day leaves
-    leave_type = Column(String(20), nullable=False)  # medical | authorized
-    sessions_count = Column(Integer, default=1, nullable=False)  # Number of lecture sessions covered by this leave
-    note = Column(Text, nullable=True)
-    document_path = Column(String(500), nullable=True)
-    is_approved = Column(Boolean, default=True)  # Admin can toggle approval
-    created_at = Column(DateTime, default=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    student_id: Mapped[int] = mapped_column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    leave_date: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    leave_end_date: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # For multi-day leaves
+    leave_type: Mapped[str] = mapped_column(String(20), nullable=False)  # medical | authorized
+    sessions_count: Mapped[int] = mapped_column(Integer, default=1, nullable=False)  # Number of lecture sessions covered by this leave
+    note: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    document_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    is_approved: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)  # Admin can toggle approval
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
 
-    student = relationship("Student")
+    student: Mapped["Student"] = relationship("Student")
 
     def __repr__(self):
         return f"<LeaveRecord(id={self.id}, student_id={self.student_id}, type={self.leave_type}, sessions={self.sessions_count})>"
 
+# Database triggers keeping attendance_sessions.total_present equal to the
+# session's present records, so corrections to records never leave it stale
+# and reports can read the column instead of counting. Counts are recomputed
+# (not incremented), which also corrects the value set when a session is created.
+_COUNT_PRESENT_SQL = (
+    "UPDATE attendance_sessions SET total_present = ("
+    "SELECT COUNT(*) FROM attendance_records "
+    "WHERE session_id = {ref}.session_id AND is_present"
+    ") WHERE id = {ref}.session_id;"
+)
+
+_SQLITE_SESSION_COUNT_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS trg_records_present_insert AFTER INSERT ON attendance_records "
+    f"BEGIN {_COUNT_PRESENT_SQL.format(ref='NEW')} END",
+    "CREATE TRIGGER IF NOT EXISTS trg_records_present_update AFTER UPDATE OF is_present, session_id ON attendance_records "
+    f"BEGIN {_COUNT_PRESENT_SQL.format(ref='OLD')} {_COUNT_PRESENT_SQL.format(ref='NEW')} END",
+    "CREATE TRIGGER IF NOT EXISTS trg_records_present_delete AFTER DELETE ON attendance_records "
+    f"BEGIN {_COUNT_PRESENT_SQL.format(ref='OLD')} END",
+]
+
+_POSTGRES_SESSION_COUNT_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION update_session_present_count() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            {_COUNT_PRESENT_SQL.format(ref='OLD')}
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            {_COUNT_PRESENT_SQL.format(ref='NEW')}
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_records_present ON attendance_records",
+    "CREATE TRIGGER trg_records_present "
+    "AFTER INSERT OR DELETE OR UPDATE OF is_present, session_id ON attendance_records "
+    "FOR EACH ROW EXECUTE FUNCTION update_session_present_count()",
+]
+
+
+def install_session_count_triggers(connection) -> None:
+    """Create (or replace) the total_present triggers; safe to run repeatedly"""
+    if connection.dialect.name == "postgresql":
+        statements = _POSTGRES_SESSION_COUNT_TRIGGERS
+    else:
+        statements = _SQLITE_SESSION_COUNT_TRIGGERS
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+def delete_duplicate_attendance_records(connection) -> int:
+    """
+    Keep only the newest record per (session_id, student_id)
+    
+    Older databases could hold several rows for one student in a session, which
+    blocks the unique ix_records_session_student index. Returns the number of
+    rows deleted; the total_present triggers adjust the session counts.
+    """
+    result = connection.execute(text("""
+        DELETE FROM attendance_records
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM attendance_records GROUP BY session_id, student_id
+        )
+    """))
+    return result.rowcount or 0
+
+
+@lru_cache(maxsize=None)
+def has_record_key_index(bind=engine) -> bool:
+    """Whether the unique ix_records_session_student index exists (cached per engine; cleared when it is created)"""
+    return any(
+        idx["name"] == "ix_records_session_student"
+        for idx in inspect(bind).get_indexes("attendance_records")
+    )
+
+
+def ensure_record_key_index() -> bool:
+    """
+    Create the unique (session_id, student_id) index on existing databases
+    
+    Fresh databases get it from create_all; older ones are deduplicated first
+    so the index can be built. Returns whether the index exists afterwards.
+    """
+    if has_record_key_index():
+        return True
+    try:
+        with engine.begin() as connection:
+            removed = delete_duplicate_attendance_records(connection)
+            if removed:
+                print(f"🧹 Removed {removed} duplicate attendance records")
+            connection.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_records_session_student "
+                "ON attendance_records (session_id, student_id)"
+            ))
+        print("✅ Created index ix_records_session_student")
+    except Exception as e:
+        print(f"⚠️ Could not create index ix_records_session_student: {e}")
+    has_record_key_index.cache_clear()
+    return has_record_key_index()
+
+
+@event.listens_for(AttendanceRecord.__table__, "after_create")
+def _create_session_count_triggers(target, connection, **kw):
+    install_session_count_triggers(connection)
+
+
+def with_attendance(query):
+    """
+    Eager-load students' attendance records and their sessions for a Student query
+    
+    selectinload issues one extra IN query per relationship instead of a JOIN,
+    so students with many records don't multiply the result rows.
+    """
+    return query.options(
+        selectinload(Student.attendance_records).selectinload(AttendanceRecord.session)
+    )
+
+
+def load_session_with_records(db_session, session_id: int) -> Optional["AttendanceSession"]:
+    """
+    Load an attendance session with its records and their students in one query
+    
+    The JOINs that fetch the records and students also populate the
+    relationships (contains_eager), so nothing is joined twice and no
+    follow-up query is issued per record.
+    """
+    return (
+        db_session.query(AttendanceSession)
+        .outerjoin(AttendanceSession.attendance_records)
+        .outerjoin(AttendanceRecord.student)
+        .options(
+            contains_eager(AttendanceSession.attendance_records)
+            .contains_eager(AttendanceRecord.student)
+        )
+        .filter(AttendanceSession.id == session_id)
+        .one_or_none()
+    )
+
+
+def bulk_create(db_session, model, mappings) -> None:
+    """
+    Insert many rows of a model in one statement instead of one ORM add per row
+    
+    Column defaults still apply. SQLAlchemy batches the rows into multi-VALUES
+    INSERTs (insertmanyvalues), so this is one round-trip per page rather than
+    per row. The caller commits.
+    """
+    if mappings:
+        db_session.execute(insert(model), mappings)
+
+
+def upsert_attendance_records(db_session, records) -> None:
+    """
+    Write a session's attendance records in one INSERT ... ON CONFLICT statement
+    
+    Rows are keyed by (session_id, student_id) through ix_records_session_student;
+    an existing record gets its is_present, confidence and detection_details
+    replaced instead of a duplicate being added. Without that index (it could
+    not be built) the rows are plainly inserted. Every mapping must carry the
+    same keys. The caller commits.
+    """
+    if not records:
+        return
+    bind = db_session.get_bind()
+    if not has_record_key_index(bind.engine):
+        # ON CONFLICT needs the unique index; callers write into a session
+        # created in the same request, so there is nothing to conflict with
+        bulk_create(db_session, AttendanceRecord, records)
+        return
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        # ON CONFLICT DO UPDATE rather than INSERT OR REPLACE, which deletes the
+        # old row and gives the record a new id
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    stmt = dialect_insert(AttendanceRecord).values(records)
+    db_session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["session_id", "student_id"],
+            set_={
+                "is_present": stmt.excluded.is_present,
+                "confidence": stmt.excluded.confidence,
+                "detection_details": stmt.excluded.detection_details,
+            },
+        )
+    )
+
+
 def drop_all_tables() -> None:
     """Drop all existing tables - FRESH START"""
     Base.metadata.drop_all(bind=engine)
@@ -247,6 +467,8 @@ def drop_all_tables() -> None:
 def create_all_tables() -> None:
     """Create all tables with new schema"""
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes of tables that already exist
+    ensure_record_key_index()
     print("✅ All tables created successfully")
 
 
@@ -287,10 +509,7 @@ def create_sample_classes(db_session) -> None:
         {"name": "BTech TYAIML", "section": "B", "description": "Bachelor of Technology - Third Year AI & Machine Learning Section B"},
     ]
     
-    for class_data in sample_classes:
-        class_obj = Class(**class_data)
-        db_session.add(class_obj)
-    
+    bulk_create(db_session, Class, sample_classes)
     db_session.commit()
     print("✅ Sample BTech classes created successfully!")
 
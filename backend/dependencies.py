@@ -3,18 +3,23 @@ Dependencies for the Dental Attendance System with Class-Based Support.
 """
 
 import logging
-from typing import Generator
+import threading
+from typing import TYPE_CHECKING, Generator
 from functools import lru_cache
 from sqlalchemy.orm import Session
 
 # Import database components
 from database import SessionLocal, engine
-from face_recognition import ClassBasedFaceRecognizer
+
+if TYPE_CHECKING:
+    # Imported on first use instead - it pulls in DeepFace/TensorFlow
+    from face_recognition import ClassBasedFaceRecognizer
 
 logger = logging.getLogger(__name__)
 
-# Global face recognizer instance
-_face_recognizer: ClassBasedFaceRecognizer = None
+# Serializes the first construction; sync dependencies run on a thread pool,
+# so concurrent first requests would otherwise each load the models
+_face_recognizer_lock = threading.Lock()
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -28,27 +33,35 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-@lru_cache()
-def initialize_face_recognizer() -> ClassBasedFaceRecognizer:
+@lru_cache(maxsize=None)
+def _build_face_recognizer() -> "ClassBasedFaceRecognizer":
+    from face_recognition import ClassBasedFaceRecognizer
+
+    logger.info("Initializing face recognizer...")
+    recognizer = ClassBasedFaceRecognizer()
+    logger.info("Face recognizer initialized successfully!")
+    return recognizer
+
+
+def initialize_face_recognizer() -> "ClassBasedFaceRecognizer":
     """
     Initialize the face recognizer with class-based filtering support.
+    
+    lru_cache alone doesn't stop two threads that miss at the same time from
+    both building it, so the first build happens under a lock. Later calls
+    are answered by the cache without locking.
     """
-    global _face_recognizer
-    if _face_recognizer is None:
-        logger.info("Initializing face recognizer...")
-        _face_recognizer = ClassBasedFaceRecognizer()
-        logger.info("Face recognizer initialized successfully!")
-    return _face_recognizer
+    if _build_face_recognizer.cache_info().currsize:
+        return _build_face_recognizer()
+    with _face_recognizer_lock:
+        return _build_face_recognizer()
 
 
-def get_face_recognizer() -> ClassBasedFaceRecognizer:
+def get_face_recognizer() -> "ClassBasedFaceRecognizer":
     """
     Dependency to get the face recognizer instance.
     """
-    if _face_recognizer is None:
-        initialize_face_recognizer()
-    return _face_recognizer
-
+    return initialize_face_recognizer()
 
 def get_db_connection():
     """
@@ -1,8 +1,11 @@
 """
 Enhanced error handling utilities for the Dental Attendance System
 """
+import importlib
+import importlib.util
 import logging
 import traceback
+from importlib import metadata
 from typing import Dict, Any, Optional
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse
@@ -38,6 +41,24 @@ class FileProcessingError(AttendanceSystemError):
     def __init__(self, message: str, details: Optional[Dict] = None):
         super().__init__(message, "FILE_PROCESSING_ERROR", details)
 
+# HTTP status per error type; subclasses resolve through their MRO
+_STATUS_BY_TYPE = {
+    ValidationError: 400,
+    FaceRecognitionError: 422,
+    DatabaseError: 500,
+    FileProcessingError: 500,
+}
+
+def error_status_code(error: Exception, default: int = 500) -> int:
+    """HTTP status for an exception - HTTPException keeps its own"""
+    if isinstance(error, HTTPException):
+        return error.status_code
+    for cls in type(error).__mro__:
+        status_code = _STATUS_BY_TYPE.get(cls)
+        if status_code is not None:
+            return status_code
+    return default
+
 def create_error_response(
     error: Exception,
     status_code: int = 500,
@@ -52,13 +73,6 @@ def create_error_response(
             "message": error.message,
             "details": error.details
         }
-        if isinstance(error, ValidationError):
-            status_code = 400
-        elif isinstance(error, FaceRecognitionError):
-            status_code = 422
-        elif isinstance(error, DatabaseError):
-            status_code = 500
-            
     elif isinstance(error, HTTPException):
         response = {
             "error": True,
@@ -66,8 +80,6 @@ def create_error_response(
             "message": error.detail,
             "details": {"status_code": error.status_code}
         }
-        status_code = error.status_code
-        
     else:
         # Generic error
         response = {
@@ -77,8 +89,8 @@ def create_error_response(
             "details": {"exception_type": type(error).__name__}
         }
     
-    # Add traceback in debug mode
-    if include_traceback:
+    # Add traceback in debug mode - formatting it is only worth it when debug logging is on
+    if include_traceback and logger.isEnabledFor(logging.DEBUG):
         response["traceback"] = traceback.format_exc()
     
     # Log the error
@@ -99,17 +111,9 @@ def safe_execute(func, error_message: str = "Operation failed", **kwargs):
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler for FastAPI"""
     error_response = create_error_response(exc, include_traceback=True)
-    status_code = 500
     
-    if isinstance(exc, HTTPException):
-        status_code = exc.status_code
-    elif isinstance(exc, ValidationError):
-        status_code = 400
-    elif isinstance(exc, FaceRecognitionError):
-        status_code = 422
-        
     return JSONResponse(
-        status_code=status_code,
+        status_code=error_status_code(exc),
         content=error_response
     )
 
@@ -124,40 +128,110 @@ def handle_face_recognition_errors(func):
             raise FaceRecognitionError(error_msg, {"original_error": str(e)})
     return wrapper
 
-def validate_image_file(file, max_size: int = 10 * 1024 * 1024):
-    """Validate uploaded image file"""
+# Leading bytes of the image formats the recognizer decodes: JPEG, PNG, WebP
+# (RIFF....WEBP), BMP. Checked instead of trusting the client's content type.
+_IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"RIFF", b"BM")
+_SNIFF_BYTES = 12
+
+def _looks_like_image(head: bytes) -> bool:
+    """Check an upload's first bytes against the known image signatures"""
+    if head.startswith(b"RIFF"):
+        return head[8:12] == b"WEBP"
+    return head.startswith(_IMAGE_SIGNATURES)
+
+def validate_image_file(file, max_size: int = 10 * 1024 * 1024, request: Optional[Request] = None):
+    """
+    Validate uploaded image file
+    
+    Cheapest checks first: the request's Content-Length (when a request is
+    passed) and the upload size reject oversized bodies before any of the file
+    is read, then only the first few bytes are read to confirm the format.
+    Only pass the request for single-file uploads - Content-Length covers the
+    whole multipart body.
+    """
     if not file:
         raise ValidationError("No file provided")
     
-    if not file.content_type.startswith('image/'):
-        raise ValidationError(f"Invalid file type: {file.content_type}. Only image files are allowed.")
+    too_large = f"File size too large. Maximum allowed: {max_size // (1024*1024)}MB"
+    if request is not None:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_size:
+            raise ValidationError(too_large)
     
     # Check file size (if available)
-    if hasattr(file, 'size') and file.size > max_size:
-        raise ValidationError(f"File size too large. Maximum allowed: {max_size // (1024*1024)}MB")
+    size = getattr(file, 'size', None)
+    if size is not None and size > max_size:
+        raise ValidationError(too_large)
+    
+    content_type = file.content_type or ""
+    if not content_type.startswith('image/'):
+        raise ValidationError(f"Invalid file type: {file.content_type}. Only image files are allowed.")
+    
+    # Sniff the magic bytes, then rewind so the handler reads the whole file
+    stream = getattr(file, 'file', None)
+    if stream is not None:
+        position = stream.tell()
+        head = stream.read(_SNIFF_BYTES)
+        stream.seek(position)
+        if not _looks_like_image(head):
+            raise ValidationError("File content is not a supported image (JPEG, PNG, WebP or BMP)")
     
     return True
 
-def log_system_info():
-    """Log system information for debugging"""
+def require_image_upload(file, max_size: int = 10 * 1024 * 1024, request: Optional[Request] = None):
+    """validate_image_file for route handlers - a rejected upload becomes a 400 HTTPException"""
+    try:
+        validate_image_file(file, max_size, request)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.message) from e
+
+# Packages reported by log_system_info: label -> (import name, distribution names)
+_SYSTEM_PACKAGES = {
+    "OpenCV": ("cv2", ("opencv-python", "opencv-python-headless",
+                       "opencv-contrib-python", "opencv-contrib-python-headless")),
+    "TensorFlow": ("tensorflow", ("tensorflow", "tensorflow-cpu", "tensorflow-macos")),
+    "DeepFace": ("deepface", ("deepface",)),
+}
+
+def _installed_version(distributions) -> Optional[str]:
+    """Version of the first installed distribution, read from its metadata"""
+    for name in distributions:
+        try:
+            return metadata.version(name)
+        except metadata.PackageNotFoundError:
+            continue
+    return None
+
+# Set once log_system_info has run - installed versions don't change within a process
+_system_info_logged = False
+
+def log_system_info(import_modules: bool = False):
+    """
+    Log system information for debugging
+    
+    Versions come from package metadata, so nothing is imported - importing
+    TensorFlow alone takes seconds and over a GB of memory. import_modules=True
+    also imports each installed package to check that it actually loads.
+    Later calls are no-ops unless they ask for that import check.
+    """
+    global _system_info_logged
+    if _system_info_logged and not import_modules:
+        return
+    _system_info_logged = True
+    
     logger.info(f"Python version: {sys.version}")
     logger.info(f"Platform: {sys.platform}")
     
     # Log available packages
-    try:
-        import cv2
-        logger.info(f"OpenCV version: {cv2.__version__}")
-    except ImportError:
-        logger.warning("OpenCV not available")
-    
-    try:
-        import tensorflow as tf
-        logger.info(f"TensorFlow version: {tf.__version__}")
-    except ImportError:
-        logger.warning("TensorFlow not available")
-    
-    try:
-        import deepface
-        logger.info("DeepFace available")
-    except ImportError:
-        logger.warning("DeepFace not available")
+    for label, (module_name, distributions) in _SYSTEM_PACKAGES.items():
+        version = _installed_version(distributions)
+        if version is None and importlib.util.find_spec(module_name) is None:
+            logger.warning(f"{label} not available")
+            continue
+        logger.info(f"{label} version: {version or 'unknown'}")
+        
+        if import_modules:
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                logger.warning(f"{label} is installed but failed to import: {e}")
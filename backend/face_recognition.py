@@ -12,11 +12,15 @@ import cv2
 import numpy as np
 import logging
 import shutil
-from typing import Dict, Any, List, Tuple, Optional
+from collections import Counter
+from typing import Dict, Any, List, Tuple, Optional, ClassVar, Set
 
-# Configure TensorFlow for CPU-only mode
+# Configure TensorFlow for CPU-only mode; what was set up is recorded once
+# here so recognizers never re-import or re-probe TensorFlow
+_TF_INIT: Dict[str, Any] = {}
 try:
     import tensorflow as tf
+    _TF_INIT.update(version=tf.__version__, mode='cpu')
     
     # Force CPU mode
     tf.config.set_visible_devices([], 'GPU')
@@ -32,7 +36,7 @@ from deepface import DeepFace
 from utils.logging_utils import create_throttled_logger
 from config import (
     LOG_THROTTLE_MS, FACE_RECOGNITION_MODEL, FACE_DETECTOR_BACKEND, 
-    FACE_DISTANCE_THRESHOLD, MODEL_CONFIGS, ADAPTIVE_THRESHOLD_MODE,
+    FACE_DISTANCE_THRESHOLD, FACE_DISTANCE_THRESHOLD_EXPLICIT, MODEL_CONFIGS, ModelConfig, ADAPTIVE_THRESHOLD_MODE,
     # New .env-controlled settings
     MIN_CONFIDENCE_THRESHOLD as CONFIG_MIN_CONFIDENCE,
     MIN_FACE_SIZE as CONFIG_MIN_FACE_SIZE,
@@ -41,7 +45,7 @@ from config import (
     ENABLE_MULTI_DETECTOR as CONFIG_ENABLE_MULTI_DETECTOR,
     ENABLE_QUALITY_ASSESSMENT as CONFIG_ENABLE_QUALITY_ASSESSMENT,
     THRESHOLD_SMALL_GROUP_OFFSET, THRESHOLD_LARGE_GROUP_OFFSET,
-    AMBIGUITY_MARGIN, DETECTOR_FALLBACK_SEQUENCE
+    AMBIGUITY_MARGIN, DETECTOR_FALLBACK_SEQUENCE, STATIC_DIR_STR
 )
 
 # --- All Configuration Now Controlled via config.py/.env ---
@@ -67,12 +71,11 @@ THRESHOLD_LARGE_GROUP = DISTANCE_THRESHOLD + THRESHOLD_LARGE_GROUP_OFFSET  # For
 DETECTOR_CASCADE = DETECTOR_FALLBACK_SEQUENCE
 
 # Get model-specific configuration
-MODEL_CONFIG = MODEL_CONFIGS.get(RECOGNITION_MODEL, {"threshold": 20.0, "embedding_size": 512})
+MODEL_CONFIG = MODEL_CONFIGS.get(RECOGNITION_MODEL, ModelConfig(threshold=20.0, embedding_size=512))
 
 # Determine if user explicitly set threshold in .env vs using system default
-import os
-ENV_THRESHOLD_EXPLICIT = os.getenv("FACE_DISTANCE_THRESHOLD") is not None
-MODEL_DEFAULT_THRESHOLD = MODEL_CONFIG["threshold"]
+ENV_THRESHOLD_EXPLICIT = FACE_DISTANCE_THRESHOLD_EXPLICIT
+MODEL_DEFAULT_THRESHOLD = MODEL_CONFIG.threshold
 
 if ENV_THRESHOLD_EXPLICIT:
     # User explicitly set threshold in .env file - always respect this
@@ -92,6 +95,49 @@ DISTANCE_THRESHOLD = EFFECTIVE_THRESHOLD
 logger = create_throttled_logger(__name__, LOG_THROTTLE_MS)
 
 
+# Numba is optional - fuses the quality statistics into one pass over the crop
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _quality_stats(gray):
+        """
+        Mean, standard deviation and Laplacian variance of a grayscale image in one pass
+        
+        The Laplacian is the 3x3 [[0,1,0],[1,-4,1],[0,1,0]] kernel with reflect-101
+        borders, matching cv2.Laplacian's default.
+        """
+        height, width = gray.shape
+        n = height * width
+        sum_x = 0.0
+        sum_x2 = 0.0
+        lap_sum = 0.0
+        lap_sum2 = 0.0
+        for i in range(height):
+            up = i - 1 if i > 0 else min(1, height - 1)
+            down = i + 1 if i < height - 1 else max(height - 2, 0)
+            for j in range(width):
+                left = j - 1 if j > 0 else min(1, width - 1)
+                right = j + 1 if j < width - 1 else max(width - 2, 0)
+                x = float(gray[i, j])
+                sum_x += x
+                sum_x2 += x * x
+                lap = (float(gray[up, j]) + float(gray[down, j]) +
+                       float(gray[i, left]) + float(gray[i, right]) - 4.0 * x)
+                lap_sum += lap
+                lap_sum2 += lap * lap
+        mean = sum_x / n
+        lap_mean = lap_sum / n
+        std = np.sqrt(max(sum_x2 / n - mean * mean, 0.0))
+        lap_var = max(lap_sum2 / n - lap_mean * lap_mean, 0.0)
+        return mean, std, lap_var
+
+
 # 🎯 Helper Functions for Face Quality Assessment
 def calculate_face_quality_score(face_image: np.ndarray, facial_area: dict) -> float:
     """
@@ -105,8 +151,15 @@ def calculate_face_quality_score(face_image: np.ndarray, facial_area: dict) -> f
         else:
             gray = face_image
         
-        # 1. Sharpness Score (Laplacian variance)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+        # Sharpness (Laplacian variance), brightness (mean) and contrast (std)
+        if NUMBA_AVAILABLE:
+            mean_brightness, contrast, laplacian_var = _quality_stats(np.ascontiguousarray(gray))
+        else:
+            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+            mean_brightness = np.mean(gray)
+            contrast = np.std(gray)
+        
+        # 1. Sharpness Score
         sharpness_score = min(laplacian_var / 500.0, 1.0)  # Normalize to 0-1
         
         # 2. Size Score (face area)
@@ -116,13 +169,11 @@ def calculate_face_quality_score(face_image: np.ndarray, facial_area: dict) -> f
         size_score = min(face_area_pixels / 10000.0, 1.0)  # Normalize (100x100 = good)
         
         # 3. Brightness Score (mean luminance)
-        mean_brightness = np.mean(gray)
         # Optimal brightness around 100-150
         brightness_score = 1.0 - abs(mean_brightness - 125) / 125.0
         brightness_score = max(0, brightness_score)
         
         # 4. Contrast Score (standard deviation)
-        contrast = np.std(gray)
         contrast_score = min(contrast / 50.0, 1.0)  # Normalize
         
         # Combined quality score (weighted average)
@@ -184,6 +235,10 @@ def get_adaptive_threshold(num_faces: int, face_quality: float, base_threshold:
     return final_threshold
 
 
+# Laplacian variance above which a face crop is treated as already sharp
+SHARP_FACE_LAPLACIAN_VARIANCE = 200.0
+
+
 def enhance_face_image(face_image: np.ndarray) -> np.ndarray:
     """
     Apply preprocessing to improve face image quality.
@@ -201,20 +256,31 @@ def enhance_face_image(face_image: np.ndarray) -> np.ndarray:
         else:
             face_rgb = face_image.copy()
         
-        # 1. Histogram Equalization (in YCrCb space to preserve color)
+        # Crops that are already sharp gain nothing from enhancement
+        gray = cv2.cvtColor(face_rgb, cv2.COLOR_RGB2GRAY)
+        if cv2.Laplacian(gray, cv2.CV_64F).var() > SHARP_FACE_LAPLACIAN_VARIANCE:
+            return face_rgb
+        
+        # Each step writes into an existing buffer: face_rgb and one scratch array
+        # are the only full-size images allocated past this point
+        
+        # 1. Local contrast equalization (CLAHE on luma, in YCrCb space to preserve color)
         ycrcb = cv2.cvtColor(face_rgb, cv2.COLOR_RGB2YCrCb)
-        ycrcb[:, :, 0] = cv2.equalizeHist(ycrcb[:, :, 0])
-        face_rgb = cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2RGB)
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        ycrcb[:, :, 0] = clahe.apply(ycrcb[:, :, 0])
+        face_rgb = cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2RGB, dst=face_rgb)
         
-        # 2. Adaptive Sharpening
-        gaussian = cv2.GaussianBlur(face_rgb, (0, 0), 2.0)
-        face_rgb = cv2.addWeighted(face_rgb, 1.5, gaussian, -0.5, 0)
+        # 2. Adaptive Sharpening (unsharp mask; the blur buffer is reused for the result)
+        scratch = ycrcb  # Same shape and dtype, no longer needed
+        scratch = cv2.GaussianBlur(face_rgb, (0, 0), 2.0, dst=scratch)
+        scratch = cv2.addWeighted(face_rgb, 1.5, scratch, -0.5, 0, dst=scratch)
         
-        # 3. Denoise (mild to preserve details)
-        face_rgb = cv2.fastNlMeansDenoisingColored(face_rgb, None, 10, 10, 7, 21)
+        # 3. Denoise (mild, edge-preserving; non-local means is far too slow per crop)
+        face_rgb = cv2.bilateralFilter(scratch, d=5, sigmaColor=35, sigmaSpace=35, dst=face_rgb)
         
-        # 4. Normalize to [0, 255] range
-        face_rgb = np.clip(face_rgb, 0, 255).astype(np.uint8)
+        # 4. Normalize to [0, 255] range (uint8 results are already saturated by OpenCV)
+        if face_rgb.dtype != np.uint8:
+            face_rgb = np.clip(face_rgb, 0, 255).astype(np.uint8)
         
         return face_rgb
     except Exception as e:
@@ -222,11 +288,124 @@ def enhance_face_image(face_image: np.ndarray) -> np.ndarray:
         return face_image  # Return original if enhancement fails
 
 
+def _represent_images(images: List[np.ndarray], detector_backend: str, **represent_kwargs) -> List[Optional[np.ndarray]]:
+    """
+    Embed the first face of each image, with None where no face is detected
+    
+    All images go to DeepFace.represent in one call when the installed DeepFace
+    accepts a list of images, so the recognition model runs one batched forward
+    pass instead of one per image. Older versions that reject a list, or any
+    failure of the batched call, fall back to one call per image.
+    """
+    try:
+        batch_results = DeepFace.represent(
+            img_path=images,
+            model_name=RECOGNITION_MODEL,
+            detector_backend=detector_backend,
+            enforce_detection=False,
+            **represent_kwargs
+        )
+    except Exception as e:
+        # Unsupported list input or a detector/TF failure; per-image calls isolate it
+        logger.debug(f"Batched represent failed, embedding images one by one: {e}")
+        batch_results = None
+    
+    # Batched calls return one list of faces per image
+    if batch_results is not None and len(batch_results) == len(images) and all(
+            isinstance(faces, list) for faces in batch_results):
+        embeddings = []
+        for faces in batch_results:
+            # Without enforce_detection, an image with no face comes back whole with confidence 0
+            if faces and faces[0].get('face_confidence', 1) > 0:
+                embeddings.append(np.asarray(faces[0]["embedding"]))
+            else:
+                embeddings.append(None)
+        return embeddings
+    
+    embeddings = []
+    for image in images:
+        try:
+            emb_obj = DeepFace.represent(
+                img_path=image,
+                model_name=RECOGNITION_MODEL,
+                detector_backend=detector_backend,
+                enforce_detection=True,
+                **represent_kwargs
+            )
+            embeddings.append(np.asarray(emb_obj[0]["embedding"]))  # type: ignore
+        except Exception as e:
+            logger.debug(f"Detector {detector_backend} failed: {e}")
+            embeddings.append(None)
+    return embeddings
+
+
+# Sidecar holding the averaged vector of a stacked embedding file
+AVERAGED_EMBEDDING_SUFFIX = '.avg.npy'
+
+
+def _enhanced_embedding_averaging(embeddings: np.ndarray) -> np.ndarray:
+    """Apply enhanced averaging with outlier detection"""
+    # Simple outlier detection for loading (lighter than registration)
+    mean_emb = np.mean(embeddings, axis=0)
+    distances = np.linalg.norm(embeddings - mean_emb, axis=1)
+    threshold = np.mean(distances) + 2 * np.std(distances)
+    
+    # Keep embeddings within threshold
+    filtered_embeddings = embeddings[distances <= threshold]
+    
+    if len(filtered_embeddings) == 0:
+        filtered_embeddings = embeddings[:1]  # Keep at least one
+    
+    # Enhanced quality scoring
+    if len(filtered_embeddings) > 1:
+        filtered_mean = np.mean(filtered_embeddings, axis=0)
+        consistency_scores = 1.0 / (1.0 + np.linalg.norm(filtered_embeddings - filtered_mean, axis=1))
+        magnitude_scores = 1.0 / (1.0 + np.abs(np.linalg.norm(filtered_embeddings, axis=1) - np.linalg.norm(filtered_mean)))
+        quality_scores = (consistency_scores * 0.7) + (magnitude_scores * 0.3)
+        
+        # Exponential weighting for high-quality embeddings
+        quality_weights = np.exp(quality_scores * 2.0)
+        quality_weights = quality_weights / np.sum(quality_weights)
+        
+        return np.average(filtered_embeddings, axis=0, weights=quality_weights).astype(np.float32)
+    else:
+        return filtered_embeddings[0]
+
+
+# Root of the per-student dataset directories
+DATASET_DIR_STR = os.path.join(STATIC_DIR_STR, "dataset")
+
+# Stored encoding paths are relative to backend/ (see fix_production_paths.py)
+BACKEND_DIR_STR = os.path.dirname(STATIC_DIR_STR)
+
+
+def _resolve_embedding_path(path: str) -> Optional[str]:
+    """
+    Locate a stored face_encoding_path on disk, or None if it is missing
+    
+    Relative paths are tried against backend/ first, which is where they live
+    for everything written by the app; the working-directory candidates are
+    only checked for legacy rows that miss there.
+    """
+    if os.path.isabs(path):
+        return path if os.path.exists(path) else None
+    
+    candidates = (
+        os.path.join(BACKEND_DIR_STR, path),
+        path,
+        os.path.join('backend', path),
+    )
+    return next((p for p in candidates if os.path.exists(p)), None)
+
 
 class ClassBasedFaceRecognizer:
     """
     Face recognition system with class-based filtering for SQLite backend.
     """
+    
+    # Student dataset directories already created by this process
+    _created_dirs: ClassVar[Set[str]] = set()
+    
     def __init__(self):
         """
         Initializes the recognizer with class-based support.
@@ -235,6 +414,15 @@ class ClassBasedFaceRecognizer:
         self.current_class_students = []  # Students for currently selected class
         self.tf_version = None
         
+        # Embeddings packed row-per-student (row i = known_students_db[i]) so a face
+        # is compared with everyone in one matrix-vector product
+        self._all_emb_matrix = np.empty((0, 0), dtype=np.float32)
+        self._all_emb_ids = np.empty(0, dtype=np.int64)
+        self._all_emb_norms = np.empty(0, dtype=np.float32)
+        self._all_emb_sq_norms = np.empty(0, dtype=np.float32)
+        self._all_emb_valid = np.empty(0, dtype=bool)
+        self._class_idx = np.empty(0, dtype=np.intp)  # Rows of current_class_students
+        
         # Check TensorFlow status
         self._check_tensorflow_setup()
         
@@ -243,6 +431,20 @@ class ClassBasedFaceRecognizer:
             logger.info(f"🏗️ Building {RECOGNITION_MODEL} model...")
             DeepFace.build_model(RECOGNITION_MODEL)
             
+            # One throwaway forward pass so graph tracing and buffer allocation
+            # happen at startup instead of on the first upload
+            try:
+                DeepFace.represent(
+                    img_path=np.zeros((160, 160, 3), dtype=np.uint8),
+                    model_name=RECOGNITION_MODEL,
+                    detector_backend='skip',  # Trace only the embedding graph
+                    enforce_detection=False,
+                    align=False
+                )
+                logger.info(f"🔥 {RECOGNITION_MODEL} model warmed up")
+            except Exception as e:
+                logger.debug(f"Model warm-up skipped: {e}")
+            
             # Log detailed model configuration
             logger.info(f"✅ {RECOGNITION_MODEL} model built successfully!")
             logger.info(f"📊 Model Details:")
@@ -256,12 +458,12 @@ class ClassBasedFaceRecognizer:
             # Log model-specific configuration
             if RECOGNITION_MODEL in MODEL_CONFIGS:
                 config = MODEL_CONFIGS[RECOGNITION_MODEL]
-                logger.info(f"   ⚙️ Embedding Dimensions: {config['embedding_size']}d")
-                logger.info(f"   🎚️ Model Default Threshold: {config['threshold']}")
+                logger.info(f"   ⚙️ Embedding Dimensions: {config.embedding_size}d")
+                logger.info(f"   🎚️ Model Default Threshold: {config.threshold}")
                 
                 # Show if threshold is customized
                 if IS_CUSTOM_THRESHOLD:
-                    logger.info(f"   🔄 Using explicit .env threshold: {DISTANCE_THRESHOLD} (model default: {config['threshold']})")
+                    logger.info(f"   🔄 Using explicit .env threshold: {DISTANCE_THRESHOLD} (model default: {config.threshold})")
                 else:
                     logger.info(f"   ✅ Using model default threshold: {DISTANCE_THRESHOLD}")
             
@@ -273,22 +475,14 @@ class ClassBasedFaceRecognizer:
         """
         Check TensorFlow installation - CPU-only mode.
         """
-        try:
-            import tensorflow as tf
-            self.tf_version = tf.__version__
-            
-            
-            logger.info(f"� TENSORFLOW SETUP")
-            logger.info(f"   � Version: {self.tf_version}")
-            logger.info(f"   🖥️ Mode: CPU ONLY")
-            
-                
-        except ImportError:
+        if 'version' not in _TF_INIT:
             logger.error("❌ TensorFlow not found! Install with: pip install tensorflow")
             raise ImportError("TensorFlow is required for face recognition")
-        except Exception as e:
-            logger.error(f"❌ TensorFlow setup failed: {e}")
-            raise
+        
+        self.tf_version = _TF_INIT['version']
+        logger.info(f"� TENSORFLOW SETUP")
+        logger.info(f"   � Version: {self.tf_version}")
+        logger.info(f"   🖥️ Mode: CPU ONLY")
 
     def load_all_students(self, db_session):
         """Load all active students from database."""
@@ -308,68 +502,31 @@ class ClassBasedFaceRecognizer:
                 # Normalize path - convert forward slashes to OS-specific separator
                 path = path.replace('/', os.path.sep)
                 
-                # Handle both relative and absolute paths
-                if not os.path.isabs(path):
-                    possible_paths = [
-                        path,
-                        os.path.join(os.getcwd(), path),
-                        os.path.join('backend', path),
-                    ]
-                else:
-                    possible_paths = [path]
-                    
-                full_path = None
-                for p in possible_paths:
-                    if os.path.exists(p):
-                        full_path = p
-                        break
+                full_path = _resolve_embedding_path(path)
                         
                 if full_path:
                     try:
-                        embedding = np.load(full_path)
+                        # Memory-mapped: single-vector files are copied once, stacks are only
+                        # read when their cached average is stale
+                        stored = np.load(full_path, mmap_mode='r')
                         
-                        # Enhanced embedding processing for better accuracy
-                        if embedding.ndim == 2:
-                            # Multiple embeddings detected - use enhanced averaging (same as registration)
-                            if len(embedding) > 1:
-                                # Apply same outlier detection and quality assessment as registration
-                                def enhanced_embedding_averaging(embeddings):
-                                    """Apply enhanced averaging with outlier detection"""
-                                    # Simple outlier detection for loading (lighter than registration)
-                                    mean_emb = np.mean(embeddings, axis=0)
-                                    distances = [np.linalg.norm(emb - mean_emb) for emb in embeddings]
-                                    threshold = np.mean(distances) + 2 * np.std(distances)
-                                    
-                                    # Keep embeddings within threshold
-                                    filtered_embeddings = [emb for i, emb in enumerate(embeddings) 
-                                                         if distances[i] <= threshold]
-                                    
-                                    if not filtered_embeddings:
-                                        filtered_embeddings = [embeddings[0]]  # Keep at least one
-                                    
-                                    # Enhanced quality scoring
-                                    if len(filtered_embeddings) > 1:
-                                        filtered_mean = np.mean(filtered_embeddings, axis=0)
-                                        quality_scores = []
-                                        
-                                        for emb in filtered_embeddings:
-                                            consistency_score = 1.0 / (1.0 + np.linalg.norm(emb - filtered_mean))
-                                            magnitude_score = 1.0 / (1.0 + abs(np.linalg.norm(emb) - np.linalg.norm(filtered_mean)))
-                                            combined_quality = (consistency_score * 0.7) + (magnitude_score * 0.3)
-                                            quality_scores.append(combined_quality)
-                                        
-                                        # Exponential weighting for high-quality embeddings
-                                        quality_weights = np.exp(np.array(quality_scores) * 2.0)
-                                        quality_weights = quality_weights / np.sum(quality_weights)
-                                        
-                                        return np.average(filtered_embeddings, axis=0, weights=quality_weights)
-                                    else:
-                                        return filtered_embeddings[0]
-                                
-                                embedding = enhanced_embedding_averaging(embedding)
-                                logger.debug(f"🎯 Enhanced averaging for {student.name}: {len(embedding)} -> 1 optimized embedding")
+                        if stored.ndim == 2 and len(stored) > 1:
+                            # Multiple embeddings - use enhanced averaging (same as registration),
+                            # cached next to the source file until it changes
+                            avg_path = os.path.splitext(full_path)[0] + AVERAGED_EMBEDDING_SUFFIX
+                            if os.path.exists(avg_path) and os.path.getmtime(avg_path) >= os.path.getmtime(full_path):
+                                embedding = np.load(avg_path).astype(np.float32)
                             else:
-                                embedding = embedding[0]  # Single embedding in 2D array
+                                embedding = _enhanced_embedding_averaging(np.asarray(stored, dtype=np.float32))
+                                try:
+                                    np.save(avg_path, embedding, allow_pickle=False)
+                                except OSError as e:
+                                    logger.debug(f"Could not cache averaged embedding at {avg_path}: {e}")
+                                logger.debug(f"🎯 Enhanced averaging for {student.name}: {len(stored)} -> 1 optimized embedding")
+                        elif stored.ndim == 2:
+                            embedding = np.array(stored[0], dtype=np.float32)  # Single embedding in 2D array
+                        else:
+                            embedding = np.array(stored, dtype=np.float32)  # fp16 on disk for enhanced embeddings
                                 
                         self.known_students_db.append({
                             'id': student.id,
@@ -384,6 +541,7 @@ class ClassBasedFaceRecognizer:
                     except Exception as e:
                         logger.warning(f"Could not load encoding for {student.name}: {e}")
         
+        self._rebuild_embedding_matrix()
         logger.info(f"Loaded {len(self.known_students_db)} student embeddings from SQLite.")
 
     def load_class_students(self, db_session, class_id: int):
@@ -396,18 +554,16 @@ class ClassBasedFaceRecognizer:
             logger.error(f"Class with ID {class_id} not found")
             return
             
-        self.current_class_students = []
-        students = db_session.query(Student).filter(
+        student_ids = [student_id for (student_id,) in db_session.query(Student.id).filter(
             Student.class_id == class_id,
             Student.is_active == True
-        ).all()
+        )]
         
-        for student in students:
-            # Find student in known_students_db
-            for known_student in self.known_students_db:
-                if known_student['id'] == student.id:
-                    self.current_class_students.append(known_student)
-                    break
+        # Class members' rows in the packed matrix; the list follows the same order
+        if self._all_emb_matrix.shape[0] != len(self.known_students_db):
+            self._rebuild_embedding_matrix()
+        self._class_idx = np.flatnonzero(np.isin(self._all_emb_ids, student_ids))
+        self.current_class_students = [self.known_students_db[row] for row in self._class_idx]
         
         logger.info(f"Loaded {len(self.current_class_students)} students for class {class_obj.name} {class_obj.section}")
 
@@ -416,20 +572,14 @@ class ClassBasedFaceRecognizer:
         path = student_info.get('face_encoding_path')
         if path and os.path.exists(path):
             try:
-                embedding = np.load(path)
+                embedding = np.load(path).astype(np.float32)
                 
                 # Enhanced embedding processing
                 if embedding.ndim == 2:
                     if len(embedding) > 1:
                         # Quality-weighted averaging for multiple embeddings
                         mean_embedding = np.mean(embedding, axis=0)
-                        quality_scores = []
-                        
-                        for emb in embedding:
-                            distance_from_mean = np.linalg.norm(emb - mean_embedding)
-                            quality_scores.append(1.0 / (1.0 + distance_from_mean))
-                        
-                        quality_scores = np.array(quality_scores)
+                        quality_scores = 1.0 / (1.0 + np.linalg.norm(embedding - mean_embedding, axis=1))
                         quality_weights = quality_scores / np.sum(quality_scores)
                         embedding = np.average(embedding, axis=0, weights=quality_weights)
                         
@@ -450,6 +600,7 @@ class ClassBasedFaceRecognizer:
                     'embedding': embedding
                 }
                 self.known_students_db.append(student_data)
+                self._rebuild_embedding_matrix()
                 logger.info(f"✅ Enhanced embedding added to memory for {student_info['name']}")
             except Exception as e:
                 logger.warning(f"Could not load encoding for {student_info['name']}: {e}")
@@ -461,17 +612,58 @@ class ClassBasedFaceRecognizer:
         self.current_class_students = [s for s in self.current_class_students if s['id'] != student_id]
         
         if len(self.known_students_db) < original_count:
+            self._rebuild_embedding_matrix()
             logger.info(f"Removed student with ID {student_id} from memory.")
 
-    @staticmethod
-    def _student_output_dir(student_name: str, student_roll_no: str) -> Tuple[str, str, str]:
-        from config import STATIC_DIR  # Import here to avoid circular imports
+    def _rebuild_embedding_matrix(self):
+        """
+        Pack known_students_db embeddings into one contiguous (N, D) float32 matrix
+        
+        Embeddings are kept raw (not L2-normalized) because matching uses the
+        euclidean distance between them; norms are precomputed for it and for
+        the cosine term. Rows whose dimension differs from the majority (left
+        over from another model) are zero-filled and marked invalid so they
+        never match. Also re-derives the current class's rows.
+        """
+        embeddings = [np.asarray(s['embedding'], dtype=np.float32).ravel() for s in self.known_students_db]
+        num_students = len(embeddings)
+        self._all_emb_ids = np.fromiter((s['id'] for s in self.known_students_db), dtype=np.int64, count=num_students)
+        
+        if embeddings:
+            dim = Counter(len(e) for e in embeddings).most_common(1)[0][0]
+            valid = np.fromiter((len(e) == dim for e in embeddings), dtype=bool, count=num_students)
+            matrix = np.zeros((num_students, dim), dtype=np.float32)
+            for row, embedding in enumerate(embeddings):
+                if valid[row]:
+                    matrix[row] = embedding
+            if not valid.all():
+                logger.warning(f"⚠️ {num_students - int(valid.sum())} student embeddings are not {dim}-dimensional and will not be matched")
+        else:
+            valid = np.empty(0, dtype=bool)
+            matrix = np.empty((0, 0), dtype=np.float32)
+        
+        self._all_emb_matrix = matrix
+        self._all_emb_valid = valid
+        self._all_emb_sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        self._all_emb_norms = np.sqrt(self._all_emb_sq_norms)
+        
+        # Keep the class view pointing at current rows (and current embedding dicts)
+        class_ids = [s['id'] for s in self.current_class_students]
+        self._class_idx = np.flatnonzero(np.isin(self._all_emb_ids, class_ids))
+        self.current_class_students = [self.known_students_db[row] for row in self._class_idx]
+
+    @classmethod
+    def _student_output_dir(cls, student_name: str, student_roll_no: str) -> Tuple[str, str, str]:
         student_dir_name = f"{student_name.replace(' ', '_')}_{student_roll_no}"
-        output_dir = STATIC_DIR / "dataset" / student_dir_name
-        output_dir.mkdir(parents=True, exist_ok=True)
-        final_photo_path = output_dir / "face.jpg"
-        embedding_path = output_dir / "face_embedding.npy"
-        return str(output_dir), str(final_photo_path), str(embedding_path)
+        output_dir = os.path.join(DATASET_DIR_STR, student_dir_name)
+        # Directories are created once per process; the isdir check catches ones
+        # removed since (student deletion and photo updates rmtree them)
+        if output_dir not in cls._created_dirs or not os.path.isdir(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+            cls._created_dirs.add(output_dir)
+        final_photo_path = os.path.join(output_dir, "face.jpg")
+        embedding_path = os.path.join(output_dir, "face_embedding.npy")
+        return output_dir, final_photo_path, embedding_path
 
     @staticmethod
     def generate_and_save_embedding(image_path: str, student_name: str, student_roll_no: str) -> Dict[str, str]:
@@ -489,8 +681,8 @@ class ClassBasedFaceRecognizer:
                 enforce_detection=True
             )
             
-            embedding = embedding_obj[0]["embedding"]  # type: ignore
-            np.save(embedding_path, embedding)
+            embedding = np.ascontiguousarray(embedding_obj[0]["embedding"], dtype=np.float32)  # type: ignore
+            np.save(embedding_path, embedding, allow_pickle=False)
             logger.info(f"Embedding saved to {embedding_path}")
 
             return {"photo_path": final_photo_path, "embedding_path": embedding_path}
@@ -508,51 +700,51 @@ class ClassBasedFaceRecognizer:
             output_dir, final_photo_path, embedding_path = ClassBasedFaceRecognizer._student_output_dir(student_name, student_roll_no)
             shutil.copy(image_paths[0], final_photo_path)
 
-            all_embeddings: List[np.ndarray] = []
-            valid_images_count = 0
-            
+            # Decode every image once; each detector pass reuses the arrays
+            images = []
             for p in image_paths:
-                try:
-                    # Enhanced preprocessing: Multiple extractions for robustness
-                    if ENHANCED_PREPROCESSING:
-                        # Try multiple detector backends for better face extraction
-                        detectors = ['mtcnn', 'retinaface', 'opencv']
-                        embedding_extracted = False
-                        
-                        for detector in detectors:
-                            try:
-                                emb_obj = DeepFace.represent(
-                                    img_path=p,
-                                    model_name=RECOGNITION_MODEL,
-                                    detector_backend=detector,
-                                    enforce_detection=True,
-                                    align=True,  # Enable face alignment for consistency
-                                    normalization='Facenet2018'  # Use advanced normalization
-                                )
-                                all_embeddings.append(np.array(emb_obj[0]["embedding"]))  # type: ignore
-                                valid_images_count += 1
-                                embedding_extracted = True
-                                logger.info(f"✅ Successfully extracted embedding from {p} using {detector}")
-                                break
-                            except Exception as det_e:
-                                logger.debug(f"Detector {detector} failed for {p}: {det_e}")
-                                continue
-                        
-                        if not embedding_extracted:
-                            logger.warning(f"⚠️ All detectors failed for image {p}")
+                image = cv2.imread(p)
+                if image is None:
+                    logger.warning(f"Skipping image {p}: could not be read")
+                images.append(image)
+            
+            embeddings_by_image: List[Optional[np.ndarray]] = [None] * len(image_paths)
+            pending = [i for i, image in enumerate(images) if image is not None]
+            
+            if ENHANCED_PREPROCESSING:
+                # Try multiple detector backends for better face extraction; each pass
+                # only retries the images the previous detectors found no face in
+                for detector in ['mtcnn', 'retinaface', 'opencv']:
+                    if not pending:
+                        break
+                    found = _represent_images(
+                        [images[i] for i in pending],
+                        detector,
+                        align=True,  # Enable face alignment for consistency
+                        normalization='Facenet2018'  # Use advanced normalization
+                    )
+                    still_pending = []
+                    for i, embedding in zip(pending, found):
+                        if embedding is None:
+                            still_pending.append(i)
+                        else:
+                            embeddings_by_image[i] = embedding
+                            logger.info(f"✅ Successfully extracted embedding from {image_paths[i]} using {detector}")
+                    pending = still_pending
+                
+                for i in pending:
+                    logger.warning(f"⚠️ All detectors failed for image {image_paths[i]}")
+            elif pending:
+                # Original method
+                for i, embedding in zip(pending, _represent_images([images[i] for i in pending], DETECTOR_BACKEND)):
+                    if embedding is None:
+                        logger.warning(f"Skipping image {image_paths[i]}: no face detected")
                     else:
-                        # Original method
-                        emb_obj = DeepFace.represent(
-                            img_path=p,
-                            model_name=RECOGNITION_MODEL,
-                            detector_backend=DETECTOR_BACKEND,
-                            enforce_detection=True
-                        )
-                        all_embeddings.append(np.array(emb_obj[0]["embedding"]))  # type: ignore
-                        valid_images_count += 1
-                        
-                except Exception as e:
-                    logger.warning(f"Skipping image {p} due to embedding error: {e}")
+                        embeddings_by_image[i] = embedding
+            
+            # Image order is kept regardless of which detector succeeded
+            all_embeddings: List[np.ndarray] = [e for e in embeddings_by_image if e is not None]
+            valid_images_count = len(all_embeddings)
 
             if not all_embeddings:
                 raise ValueError("None of the provided images contained a valid, clear single face")
@@ -564,53 +756,40 @@ class ClassBasedFaceRecognizer:
                 # Step 1: Outlier Detection using IQR method
                 def detect_outliers(embeddings):
                     """Detect outlier embeddings using statistical methods"""
-                    pairwise_distances = []
-                    for i, emb1 in enumerate(embeddings):
-                        for j, emb2 in enumerate(embeddings):
-                            if i != j:
-                                pairwise_distances.append(np.linalg.norm(emb1 - emb2))
+                    count = len(embeddings)
+                    if count < 2:
+                        return np.arange(count)  # Keep all if only one embedding
                     
-                    if len(pairwise_distances) == 0:
-                        return np.arange(len(embeddings))  # Keep all if only one embedding
+                    # All pairwise distances at once; the diagonal (self-distance) is excluded
+                    distance_matrix = np.linalg.norm(embeddings[:, None, :] - embeddings[None, :, :], axis=2)
+                    off_diagonal = ~np.eye(count, dtype=bool)
                     
                     # Calculate IQR for outlier detection
-                    q1, q3 = np.percentile(pairwise_distances, [25, 75])
+                    q1, q3 = np.percentile(distance_matrix[off_diagonal], [25, 75])
                     iqr = q3 - q1
                     outlier_threshold = q3 + 1.5 * iqr
                     
                     # Find embeddings that are not outliers
-                    non_outliers = []
-                    for i, emb in enumerate(embeddings):
-                        distances_to_others = [np.linalg.norm(emb - other) for j, other in enumerate(embeddings) if i != j]
-                        avg_distance = np.mean(distances_to_others) if distances_to_others else 0
-                        if avg_distance <= outlier_threshold:
-                            non_outliers.append(i)
+                    avg_distances = distance_matrix.sum(axis=1) / (count - 1)
+                    non_outliers = np.flatnonzero(avg_distances <= outlier_threshold)
                     
-                    return non_outliers if non_outliers else [0]  # Keep at least one embedding
+                    return non_outliers if len(non_outliers) else np.array([0])  # Keep at least one embedding
                 
                 # Remove outliers
-                valid_indices = detect_outliers(all_embeddings)
-                filtered_embeddings = [all_embeddings[i] for i in valid_indices]
-                filtered_stacked = np.stack(filtered_embeddings, axis=0)
+                valid_indices = detect_outliers(stacked)
+                filtered_stacked = stacked[valid_indices]
                 
-                logger.info(f"🧹 Outlier detection: kept {len(filtered_embeddings)}/{len(all_embeddings)} embeddings")
+                logger.info(f"🧹 Outlier detection: kept {len(filtered_stacked)}/{len(all_embeddings)} embeddings")
                 
-                # Step 2: Advanced Quality Scoring
+                # Step 2: Advanced Quality Scoring (multi-factor, one row per embedding)
                 mean_embedding = np.mean(filtered_stacked, axis=0)
-                quality_scores = []
+                consistency_scores = 1.0 / (1.0 + np.linalg.norm(filtered_stacked - mean_embedding, axis=1))
+                magnitude_scores = 1.0 / (1.0 + np.abs(np.linalg.norm(filtered_stacked, axis=1) - np.linalg.norm(mean_embedding)))
                 
-                for emb in filtered_embeddings:
-                    # Multi-factor quality assessment
-                    consistency_score = 1.0 / (1.0 + np.linalg.norm(emb - mean_embedding))
-                    magnitude_score = 1.0 / (1.0 + abs(np.linalg.norm(emb) - np.linalg.norm(mean_embedding)))
-                    
-                    # Combined quality score
-                    combined_quality = (consistency_score * 0.7) + (magnitude_score * 0.3)
-                    quality_scores.append(combined_quality)
+                # Combined quality score
+                quality_scores = (consistency_scores * 0.7) + (magnitude_scores * 0.3)
                 
                 # Step 3: Enhanced Weighted Averaging
-                quality_scores = np.array(quality_scores)
-                
                 # Apply exponential emphasis to high-quality embeddings
                 quality_weights = np.exp(quality_scores * 2.0)  # Exponential weighting
                 quality_weights = quality_weights / np.sum(quality_weights)
@@ -618,16 +797,17 @@ class ClassBasedFaceRecognizer:
                 # Final weighted average
                 final_embedding = np.average(filtered_stacked, axis=0, weights=quality_weights)
                 
-                logger.info(f"📊 Enhanced averaging: {len(filtered_embeddings)} embeddings")
+                logger.info(f"📊 Enhanced averaging: {len(filtered_stacked)} embeddings")
                 logger.info(f"🎯 Quality weights: {quality_weights}")
                 logger.info(f"⚡ Final embedding norm: {np.linalg.norm(final_embedding):.3f}")
                 
                 # Save both individual embeddings and metadata
-                np.save(embedding_path, filtered_stacked)  # Keep filtered embeddings
+                np.save(embedding_path, np.ascontiguousarray(filtered_stacked, dtype=np.float32),
+                        allow_pickle=False)  # Keep filtered embeddings
             else:
                 # Single embedding case
                 stacked = np.stack(all_embeddings, axis=0)
-                np.save(embedding_path, stacked)
+                np.save(embedding_path, np.ascontiguousarray(stacked, dtype=np.float32), allow_pickle=False)
                 logger.info(f"💾 Saved single high-quality embedding to {embedding_path}")
                 
             logger.info(f"✨ Registration success rate: {valid_images_count}/{len(image_paths)} images processed")
@@ -656,12 +836,12 @@ class ClassBasedFaceRecognizer:
                     "method": "enhanced"
                 }
             
-            # Get student IDs for matching
+            # Get student IDs for matching: profiles and the gallery cover every
+            # student, the class roster only restricts which ones can match
+            student_ids = [s['id'] for s in self.known_students_db]
             if class_id and self.current_class_students:
-                student_ids = [s['id'] for s in self.current_class_students]
-                class_student_ids = student_ids
+                class_student_ids = [s['id'] for s in self.current_class_students]
             else:
-                student_ids = [s['id'] for s in self.known_students_db]
                 class_student_ids = None
             
             # Extract embeddings from detected faces
@@ -779,12 +959,18 @@ class ClassBasedFaceRecognizer:
         import time
         start_time = time.time()
         
+        # Packed matrix must match the student list (it's rebuilt if the list was replaced)
+        if self._all_emb_matrix.shape[0] != len(self.known_students_db):
+            self._rebuild_embedding_matrix()
+        
         # Determine which student database to use
         if class_id and self.current_class_students:
             students_to_match = self.current_class_students
+            match_rows = self._class_idx
             logger.info(f"Matching against {len(students_to_match)} students from class {class_id}")
         elif self.known_students_db:
             students_to_match = self.known_students_db
+            match_rows = slice(None)
             logger.info(f"Matching against all {len(students_to_match)} students")
         else:
             logger.warning("No students loaded for matching")
@@ -862,8 +1048,13 @@ class ClassBasedFaceRecognizer:
             logger.info(f"⏱️ Total Processing Time: {total_time:.2f}s")
             return results
 
-        known_embeddings = [student['embedding'] for student in students_to_match]
-        matched_student_indices = set()
+        # Candidate rows, gathered once per photo: row i is students_to_match[i]
+        known_matrix = self._all_emb_matrix[match_rows]
+        known_norms = self._all_emb_norms[match_rows]
+        known_sq_norms = self._all_emb_sq_norms[match_rows]
+        # Students already matched to a face (or with unusable embeddings) are skipped
+        unavailable = ~self._all_emb_valid[match_rows]
+        debug_candidates = logger.logger.isEnabledFor(logging.DEBUG)
         
         recognition_start = time.time()
         faces_processed = 0
@@ -961,43 +1152,35 @@ class ClassBasedFaceRecognizer:
             adaptive_threshold = get_adaptive_threshold(num_faces, face_quality, DISTANCE_THRESHOLD)
             logger.debug(f"Face {faces_processed}: threshold={adaptive_threshold:.1f} (quality={face_quality:.2f})")
 
-            # Enhanced matching with multiple distance metrics
-            min_distance = float('inf')
+            # Enhanced matching with multiple distance metrics - against all candidates at once
+            probe = np.asarray(detected_embedding, dtype=np.float32)
+            probe_norm = float(np.linalg.norm(probe))
+            dots = known_matrix @ probe
+            # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b (clipped: rounding can dip below 0)
+            euclidean_dists = np.sqrt(np.maximum(known_sq_norms + probe_norm * probe_norm - 2.0 * dots, 0.0))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cosine_similarities = dots / (known_norms * probe_norm)
+            cosine_distances = 1 - cosine_similarities
+            
+            # Weighted combination of distance metrics
+            combined_distances = (0.7 * euclidean_dists) + (0.3 * cosine_distances * 20)  # Scale cosine to similar range
+            combined_distances[unavailable | np.isnan(combined_distances)] = np.inf
+            
+            # Log distance for each candidate
+            if debug_candidates:
+                for i in np.flatnonzero(~unavailable):
+                    logger.debug(f"   📐 Student '{students_to_match[i]['name']}': euclidean={euclidean_dists[i]:.2f}, cosine_sim={cosine_similarities[i]:.3f}, combined={combined_distances[i]:.2f}")
+            
             best_student_idx = -1
-            second_best_distance = float('inf')
-            confidence_scores = []
-
-            for i, known_embedding in enumerate(known_embeddings):
-                if i in matched_student_indices:
-                    continue
-                
-                # Multiple distance calculations for robustness
-                euclidean_dist = np.linalg.norm(np.array(detected_embedding) - np.array(known_embedding))
-                cosine_similarity = np.dot(detected_embedding, known_embedding) / (
-                    np.linalg.norm(detected_embedding) * np.linalg.norm(known_embedding)
-                )
-                cosine_distance = 1 - cosine_similarity
-                
-                # Weighted combination of distance metrics
-                combined_distance = (0.7 * euclidean_dist) + (0.3 * cosine_distance * 20)  # Scale cosine to similar range
-                
-                # Log distance for each candidate
-                logger.debug(f"   📐 Student '{students_to_match[i]['name']}': euclidean={euclidean_dist:.2f}, cosine_sim={cosine_similarity:.3f}, combined={combined_distance:.2f}")
-                
-                if combined_distance < min_distance:
-                    second_best_distance = min_distance  # Track second-best for ambiguity detection
-                    min_distance = combined_distance
-                    best_student_idx = i
-                elif combined_distance < second_best_distance:
-                    second_best_distance = combined_distance
-                    
-                # Store additional confidence metrics
-                confidence_scores.append({
-                    'student_idx': i,
-                    'euclidean': euclidean_dist,
-                    'cosine_sim': cosine_similarity,
-                    'combined': combined_distance
-                })
+            min_distance = float('inf')
+            second_best_distance = float('inf')  # Track second-best for ambiguity detection
+            if len(combined_distances):
+                best = int(np.argmin(combined_distances))
+                if np.isfinite(combined_distances[best]):
+                    best_student_idx = best
+                    min_distance = float(combined_distances[best])
+                    combined_distances[best] = np.inf
+                    second_best_distance = float(combined_distances.min())
             
             # 🔍 Log best match decision details
             if best_student_idx != -1:
@@ -1012,12 +1195,8 @@ class ClassBasedFaceRecognizer:
                 # Calculate match confidence
                 base_confidence = float(max(0, 1 - (min_distance / adaptive_threshold)))
                 
-                # Find cosine similarity for best match
-                best_confidence_entry = next(
-                    (conf for conf in confidence_scores if conf['student_idx'] == best_student_idx),
-                    None
-                )
-                cosine_sim = best_confidence_entry['cosine_sim'] if best_confidence_entry else 0.0
+                # Cosine similarity for best match
+                cosine_sim = float(cosine_similarities[best_student_idx])
                 cosine_confidence = max(0, cosine_sim)
                 
                 # Combined confidence (weighted average)
@@ -1066,7 +1245,7 @@ class ClassBasedFaceRecognizer:
                             'face_quality': float(face_quality),
                             'threshold_used': float(adaptive_threshold)
                         })
-                        matched_student_indices.add(best_student_idx)
+                        unavailable[best_student_idx] = True
                         logger.info(f"✅ MATCH #{faces_processed}: {matched_student['name']} "
                                   f"(conf: {quality_adjusted_confidence:.2f}, dist: {min_distance:.1f}, "
                                   f"quality: {face_quality:.2f}, threshold: {adaptive_threshold:.1f})")
@@ -20,13 +20,13 @@ import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from sqlalchemy import create_engine, text
-from config import DATABASE_URL
+from sqlalchemy import text
+from config import get_engine
 
 def fix_production_paths():
     """Fix hardcoded absolute paths in the database."""
     
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
     
     print("=" * 60)
     print("🔧 PRODUCTION PATH MIGRATION")
@@ -114,7 +114,7 @@ def fix_production_paths():
 
 def verify_paths():
     """Verify current path status in database."""
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
     
     print()
     print("📊 CURRENT PATH STATUS:")
@@ -21,8 +21,8 @@ Features:
 
 import sys
 from datetime import datetime
-from sqlalchemy import create_engine, text, inspect
-from config import DATABASE_URL
+from sqlalchemy import text, inspect
+from config import DATABASE_URL, get_engine
 
 def run_initialization():
     """Master database initialization"""
@@ -34,7 +34,7 @@ def run_initialization():
     print(f"🔗 Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'SQLite'}")
     print("=" * 70)
     
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()  # Same engine (and pool) the models module uses
     inspector = inspect(engine)
     
     success_count = 0
@@ -49,8 +49,8 @@ def run_initialization():
             print("\n📋 STEP 1: Creating tables...")
             
             # Import models to create tables
-            from database import Base, engine as db_engine
-            Base.metadata.create_all(bind=db_engine)
+            from database import Base
+            Base.metadata.create_all(bind=engine)
             print("   ✅ All tables created/verified")
             success_count += 1
             
@@ -148,6 +148,22 @@ def run_initialization():
                 print(f"   ⚠️  Could not update leave_records (table may not exist yet): {e}")
                 skip_count += 1
             
+            # Convert attendance_records.detection_details from TEXT to JSONB (PostgreSQL)
+            if engine.dialect.name == "postgresql":
+                from migrations.convert_detection_details_jsonb import convert_detection_details_to_jsonb
+                try:
+                    with connection.begin_nested():
+                        converted = convert_detection_details_to_jsonb(connection)
+                    if converted:
+                        print("   ✅ detection_details is now JSONB")
+                        success_count += 1
+                    else:
+                        print("   ℹ️  detection_details already JSONB")
+                        skip_count += 1
+                except Exception as e:
+                    print(f"   ⚠️  Could not convert detection_details to JSONB: {e}")
+                    error_count += 1
+            
             # ================================================================
             # STEP 3: CHECK PRIMARY ADMIN STATUS
             # ================================================================
@@ -215,20 +231,67 @@ def run_initialization():
                 ("idx_attendance_sessions_subject_id", "CREATE INDEX IF NOT EXISTS idx_attendance_sessions_subject_id ON attendance_sessions(subject_id)"),
                 ("idx_students_class_id", "CREATE INDEX IF NOT EXISTS idx_students_class_id ON students(class_id)"),
                 ("idx_classes_is_active", "CREATE INDEX IF NOT EXISTS idx_classes_is_active ON classes(is_active) WHERE is_active = TRUE"),
+                ("ix_sessions_class_type", "CREATE INDEX IF NOT EXISTS ix_sessions_class_type ON attendance_sessions(class_id, session_type)"),
+                ("ix_sessions_class_created", "CREATE INDEX IF NOT EXISTS ix_sessions_class_created ON attendance_sessions(class_id, created_at DESC)"),
+                ("ix_records_session_student", "CREATE UNIQUE INDEX IF NOT EXISTS ix_records_session_student ON attendance_records(session_id, student_id)"),
             ]
             
+            # Duplicate attendance rows would block the unique record index
+            from database import delete_duplicate_attendance_records
+            removed = delete_duplicate_attendance_records(connection)
+            if removed:
+                print(f"   🧹 Removed {removed} duplicate attendance records")
+            
+            failed_indexes = set()
             for idx_name, idx_sql in indexes_to_create:
                 try:
-                    connection.execute(text(idx_sql))
+                    # Savepoint per index: on PostgreSQL a failed statement would
+                    # otherwise abort the whole initialization transaction
+                    with connection.begin_nested():
+                        connection.execute(text(idx_sql))
                 except Exception as e:
                     if "already exists" in str(e).lower():
                         pass  # Index already exists
                     else:
+                        failed_indexes.add(idx_name)
                         print(f"   ⚠️  Warning creating index {idx_name}: {e}")
             
+            # Indexes superseded by composites above: (old index, replacement).
+            # Only dropped once the replacement exists, so a failed unique index
+            # (e.g. duplicate attendance rows) doesn't leave the column unindexed.
+            indexes_to_drop = [
+                ("ix_attendance_sessions_session_type", "ix_sessions_class_type"),  # only 'normal' | 'extra'
+                ("ix_attendance_sessions_class_id", "ix_sessions_class_created"),  # leading column of the composites
+                ("ix_attendance_records_session_id", "ix_records_session_student"),  # leading column of the composite
+            ]
+            
+            for idx_name, replacement in indexes_to_drop:
+                if replacement in failed_indexes:
+                    print(f"   ⚠️  Keeping index {idx_name}: {replacement} was not created")
+                    continue
+                try:
+                    with connection.begin_nested():
+                        connection.execute(text(f"DROP INDEX IF EXISTS {idx_name}"))
+                except Exception as e:
+                    print(f"   ⚠️  Warning dropping index {idx_name}: {e}")
+            
             print("   ✅ All indexes created/verified")
             success_count += 1
             
+            # Triggers keeping attendance_sessions.total_present in step with its records
+            # (created with the table on fresh databases; installed here for existing ones)
+            from database import install_session_count_triggers
+            install_session_count_triggers(connection)
+            connection.execute(text("""
+                UPDATE attendance_sessions SET total_present = (
+                    SELECT COUNT(*) FROM attendance_records
+                    WHERE attendance_records.session_id = attendance_sessions.id
+                    AND attendance_records.is_present
+                )
+            """))
+            print("   ✅ Session present-count triggers installed and counts backfilled")
+            success_count += 1
+            
             # ================================================================
             # STEP 6: VERIFY FOREIGN KEYS
             # ================================================================
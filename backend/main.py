@@ -105,14 +105,17 @@ async def lifespan(app: FastAPI):
             from migrations.add_model_tracking import add_model_tracking_columns
             add_model_tracking_columns()
             logger.info("✅ Model tracking migrations complete")
+            
+            # detection_details must be JSONB for the JSON-typed model column
+            from migrations.convert_detection_details_jsonb import migrate_detection_details
+            migrate_detection_details()
         except Exception as e:
             logger.warning(f"Migration warning: {e}")
         
-        # Initialize face recognizer
-        initialize_face_recognizer()
+        # Initialize face recognizer before serving so no request pays for the model load
+        recognizer = initialize_face_recognizer()
         
         # Load students into recognizer (will be empty on fresh start)
-        recognizer = get_face_recognizer()
         db = SessionLocal()
         try:
             recognizer.load_all_students(db)
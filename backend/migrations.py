@@ -5,7 +5,7 @@ Handles schema migrations and database setup.
 """
 
 import logging
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import text, inspect
 from config import DATABASE_TYPE
 
 logger = logging.getLogger(__name__)
@@ -61,10 +61,14 @@ def run_light_migrations(engine):
         bool_default_true = "BOOLEAN DEFAULT TRUE"
         datetime_type = "TIMESTAMP"
         float_type = "DOUBLE PRECISION DEFAULT 0.0"
+        blob_type = "BYTEA"
+        json_type = "JSONB"
     else:
         bool_default_true = "BOOLEAN DEFAULT 1"
         datetime_type = "DATETIME"
         float_type = "REAL DEFAULT 0.0"
+        blob_type = "BLOB"
+        json_type = "TEXT"
     
     try:
         with engine.begin() as conn:
@@ -73,6 +77,7 @@ def run_light_migrations(engine):
             _add_column_if_missing(conn, "students", "phone", "TEXT", engine)
             _add_column_if_missing(conn, "students", "photo_path", "TEXT", engine)
             _add_column_if_missing(conn, "students", "face_encoding_path", "TEXT", engine)
+            _add_column_if_missing(conn, "students", "face_encoding", blob_type, engine)
             _add_column_if_missing(conn, "students", "is_active", bool_default_true, engine)
             _add_column_if_missing(conn, "students", "created_at", datetime_type, engine)
             _add_column_if_missing(conn, "students", "updated_at", datetime_type, engine)
@@ -86,7 +91,7 @@ def run_light_migrations(engine):
 
             # attendance_records optional columns - CRITICAL: Add missing confidence column
             _add_column_if_missing(conn, "attendance_records", "confidence", float_type, engine)
-            _add_column_if_missing(conn, "attendance_records", "detection_details", "TEXT", engine)
+            _add_column_if_missing(conn, "attendance_records", "detection_details", json_type, engine)
             _add_column_if_missing(conn, "attendance_records", "created_at", datetime_type, engine)
             
         logger.info(f"✅ {db_type} light migrations completed")
@@ -13,13 +13,13 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine, text, inspect
-from config import DATABASE_URL
+from sqlalchemy import text, inspect
+from config import DATABASE_URL, get_engine
 
 def run_migration():
     """Add new columns to leave_records table for session-based attendance calculation"""
     
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
     inspector = inspect(engine)
     
     # Check if leave_records table exists
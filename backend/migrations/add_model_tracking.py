@@ -1,6 +1,7 @@
 """
 Migration: Add model tracking columns to students table
-Tracks which model and detector were used for embedding generation
+Tracks which model and detector were used for embedding generation, and
+stores the primary embedding itself in students.face_encoding
 """
 import logging
 from sqlalchemy import text, inspect
@@ -11,12 +12,14 @@ logger = logging.getLogger(__name__)
 
 
 def add_model_tracking_columns():
-    """Add embedding_model, embedding_detector, has_enhanced_embeddings columns if they don't exist"""
+    """Add embedding_model, embedding_detector, has_enhanced_embeddings and face_encoding columns if they don't exist"""
     
     columns_to_add = [
         ("embedding_model", "VARCHAR(50)"),
         ("embedding_detector", "VARCHAR(50)"),
-        ("has_enhanced_embeddings", "BOOLEAN DEFAULT FALSE")
+        ("has_enhanced_embeddings", "BOOLEAN DEFAULT FALSE"),
+        # Raw float32 primary embedding (see ai.embedding_storage.read_embedding_blob)
+        ("face_encoding", "BYTEA" if DATABASE_TYPE == "postgresql" else "BLOB")
     ]
     
     try:
@@ -0,0 +1,51 @@
+"""
+Migration: Store attendance_records.detection_details as JSONB (PostgreSQL)
+The model maps the column as JSON (JSONB on PostgreSQL); databases created
+before that still have a TEXT column, which reads back as a str instead of a
+dict. SQLite keeps TEXT - its JSON type already decodes the stored text.
+"""
+import logging
+from sqlalchemy import text, inspect
+from sqlalchemy.dialects.postgresql import JSONB
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+
+def convert_detection_details_to_jsonb(connection) -> bool:
+    """Convert a TEXT detection_details column to JSONB; returns True if it was converted"""
+    if connection.dialect.name != "postgresql":
+        return False
+
+    inspector = inspect(connection)
+    if 'attendance_records' not in inspector.get_table_names():
+        return False
+
+    record_columns = {col['name']: col['type'] for col in inspector.get_columns('attendance_records')}
+    detection_type = record_columns.get('detection_details')
+    if detection_type is None or isinstance(detection_type, JSONB):
+        return False
+
+    connection.execute(text("""
+        ALTER TABLE attendance_records
+        ALTER COLUMN detection_details TYPE JSONB
+        USING NULLIF(detection_details, '')::jsonb
+    """))
+    return True
+
+
+def migrate_detection_details():
+    """Run the conversion in its own transaction"""
+    try:
+        with engine.begin() as conn:
+            if convert_detection_details_to_jsonb(conn):
+                logger.info("✅ Converted attendance_records.detection_details to JSONB")
+        return True
+    except Exception as e:
+        logger.error(f"❌ detection_details JSONB migration failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate_detection_details()
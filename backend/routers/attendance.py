@@ -4,20 +4,21 @@ Handles class-specific attendance marking and analytics.
 """
 import os
 import shutil
-import json
 import logging
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, UploadFile, Form, File, HTTPException, Depends, Query
+from fastapi import APIRouter, UploadFile, Form, File, HTTPException, Depends, Query, Request
 from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from pydantic import BaseModel
 from sqlalchemy import and_, func
 
-from database import Student, Class, AttendanceSession, AttendanceRecord
+from database import Student, Class, AttendanceSession, AttendanceRecord, upsert_attendance_records
 from dependencies import get_db, get_face_recognizer
+from config import MAX_FILE_SIZE
+from error_handling import require_image_upload
 from utils.export_utils import attendance_exporter
 from utils.storage_utils import storage_manager
 import io
@@ -81,8 +82,7 @@ async def process_batch_attendance(
     
     try:
         for i, up in enumerate(photos):
-            if not (up.content_type or '').startswith('image/'):
-                raise HTTPException(status_code=400, detail="All files must be images")
+            require_image_upload(up, MAX_FILE_SIZE)
             url = await storage_manager.save_attendance_photo(up, f"{session_name}_{i+1}")
             saved_urls.append(url)
             
@@ -90,9 +90,9 @@ async def process_batch_attendance(
             photo_stats[i + 1] = {"faces_detected": 0, "students_identified": 0}
 
             # Map URL to local path for processing when local
-            from config import STATIC_DIR
+            from config import STATIC_DIR_STR
             if "/static/" in url:
-                local_path = str(STATIC_DIR / url.split("/static/")[1])
+                local_path = os.path.join(STATIC_DIR_STR, url.split("/static/")[1])
             else:
                 # For S3/GCS: skip preview processing in this minimal version
                 local_path = None
@@ -249,6 +249,7 @@ async def commit_batch_attendance(payload: CommitPayload, db: Session = Depends(
     return {"success": True, "session_id": session.id}
 @router.post("/mark")
 async def mark_attendance(
+    request: Request,
     session_name: str = Form(...),
     class_id: int = Form(...),  # REQUIRED: Class selection for attendance
     subject_id: Optional[int] = Form(None),  # Optional: Subject selection for attendance
@@ -257,8 +258,8 @@ async def mark_attendance(
     face_recognizer = Depends(get_face_recognizer)
 ):
     """Mark attendance for a specific class and optionally a subject"""
-    if not photo.content_type or not photo.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    # Size (Content-Length first), content type and magic bytes - before the photo is read
+    require_image_upload(photo, MAX_FILE_SIZE, request)
     
     # Validate class exists
     class_obj = db.query(Class).filter(Class.id == class_id).first()
@@ -299,10 +300,10 @@ async def mark_attendance(
             logger.info(f"Downloaded to temp file: {photo_path_for_processing}")
         else:
             # For local storage, convert URL back to file path
-            from config import STATIC_DIR
+            from config import STATIC_DIR_STR
             if "/static/" in photo_url:
                 relative_path = photo_url.split("/static/")[1]
-                photo_path_for_processing = str(STATIC_DIR / relative_path)
+                photo_path_for_processing = os.path.join(STATIC_DIR_STR, relative_path)
                 logger.info(f"Using local file path: {photo_path_for_processing}")
             else:
                 raise ValueError(f"Invalid local photo URL format: {photo_url}")
@@ -341,25 +342,31 @@ async def mark_attendance(
         db.commit()
         db.refresh(session)
 
-        # Mark identified students as present
-        identified_student_ids = {match["student_id"] for match in processing_result["identified_students"]}
+        # Mark identified students as present - one record per student, keeping the
+        # most confident match (ix_records_session_student is unique)
+        best_matches = {}
+        for match in processing_result["identified_students"]:
+            current = best_matches.get(match["student_id"])
+            if current is None or match["confidence"] > current["confidence"]:
+                best_matches[match["student_id"]] = match
+        identified_student_ids = set(best_matches)
         
-        for student_match in processing_result["identified_students"]:
+        records = []
+        for student_match in best_matches.values():
+            # The JSON column serializes it; only NumPy types need converting
             try:
-                facial_area = safe_json_serialize(student_match.get("facial_area", {}))
-                detection_details_json = json.dumps(facial_area)
+                detection_details = safe_json_serialize(student_match.get("facial_area", {}))
             except Exception as e:
                 logger.warning(f"Failed to serialize facial_area: {e}")
-                detection_details_json = json.dumps({})
+                detection_details = {}
                 
-            record = AttendanceRecord(
-                student_id=student_match["student_id"],
-                session_id=session.id,
-                is_present=True,
-                confidence=float(student_match["confidence"]),
-                detection_details=detection_details_json
-            )
-            db.add(record)
+            records.append({
+                "student_id": student_match["student_id"],
+                "session_id": session.id,
+                "is_present": True,
+                "confidence": float(student_match["confidence"]),
+                "detection_details": detection_details,
+            })
 
         # Mark remaining class students as absent
         class_students = db.query(Student).filter(
@@ -369,14 +376,16 @@ async def mark_attendance(
         
         for student in class_students:
             if student.id not in identified_student_ids:
-                record = AttendanceRecord(
-                    student_id=student.id,
-                    session_id=session.id,
-                    is_present=False,
-                    confidence=0.0
-                )
-                db.add(record)
-
+                records.append({
+                    "student_id": student.id,
+                    "session_id": session.id,
+                    "is_present": False,
+                    "confidence": 0.0,
+                    "detection_details": None,
+                })
+
+        # Whole class in one statement instead of one INSERT per student
+        upsert_attendance_records(db, records)
         db.commit()
 
         present_count = len(identified_student_ids)
@@ -417,6 +426,7 @@ async def mark_attendance(
 
 @router.post("/preview")
 async def preview_attendance(
+    request: Request,
     session_name: str = Form(...),
     class_id: int = Form(...),
     subject_id: Optional[int] = Form(None),
@@ -429,8 +439,8 @@ async def preview_attendance(
     Processes the photo and returns identified students along with all class students.
     Does NOT save attendance records - use /confirm to finalize.
     """
-    if not photo.content_type or not photo.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    # Size (Content-Length first), content type and magic bytes - before the photo is read
+    require_image_upload(photo, MAX_FILE_SIZE, request)
     
     # Validate class exists
     class_obj = db.query(Class).filter(Class.id == class_id).first()
@@ -469,10 +479,10 @@ async def preview_attendance(
             temp_file_path = temp_file.name
         else:
             # For local storage, convert URL back to file path
-            from config import STATIC_DIR
+            from config import STATIC_DIR_STR
             if "/static/" in photo_url:
                 relative_path = photo_url.split("/static/")[1]
-                photo_path_for_processing = str(STATIC_DIR / relative_path)
+                photo_path_for_processing = os.path.join(STATIC_DIR_STR, relative_path)
             else:
                 raise ValueError(f"Invalid local photo URL format: {photo_url}")
 
@@ -619,20 +629,21 @@ async def confirm_attendance(payload: ConfirmAttendancePayload, db: Session = De
         Student.is_active == True
     ).all()
 
-    # Create attendance records
+    # Create attendance records - whole class in one statement
+    records = []
     for student in class_students:
         is_present = student.id in present_set
         confidence = identified_map.get(student.id, {}).get("confidence", 0.0) if is_present else 0.0
         
-        record = AttendanceRecord(
-            student_id=student.id,
-            session_id=session.id,
-            is_present=is_present,
-            confidence=float(confidence),
-            detection_details=json.dumps({})
-        )
-        db.add(record)
+        records.append({
+            "student_id": student.id,
+            "session_id": session.id,
+            "is_present": is_present,
+            "confidence": float(confidence),
+            "detection_details": {},
+        })
 
+    upsert_attendance_records(db, records)
     db.commit()
 
     # Cleanup preview
@@ -660,25 +671,37 @@ async def get_attendance_sessions(
     db: Session = Depends(get_db)
 ):
     """Get attendance sessions with optional class filtering"""
-    query = db.query(AttendanceSession).join(Class)
+    query = db.query(AttendanceSession).join(AttendanceSession.class_obj).options(
+        contains_eager(AttendanceSession.class_obj)
+    )
     
     if class_id:
         query = query.filter(AttendanceSession.class_id == class_id)
         
     sessions = query.order_by(AttendanceSession.created_at.desc()).offset(offset).limit(limit).all()
     
+    # Counts for the whole page in two grouped queries instead of two per session;
+    # total_present itself is kept current by database triggers
+    records_counts = dict(
+        db.query(AttendanceRecord.session_id, func.count(AttendanceRecord.id))
+        .filter(AttendanceRecord.session_id.in_([s.id for s in sessions]))
+        .group_by(AttendanceRecord.session_id)
+        .all()
+    )
+    class_student_counts = dict(
+        db.query(Student.class_id, func.count(Student.id))
+        .filter(Student.class_id.in_({s.class_id for s in sessions}), Student.is_active == True)
+        .group_by(Student.class_id)
+        .all()
+    )
+    
     result = []
     for s in sessions:
-        # Get total students in the class at time of query
-        total_students = db.query(Student).filter(
-            Student.class_id == s.class_id,
-            Student.is_active == True
-        ).count()
+        # Total students in the class at time of query
+        total_students = class_student_counts.get(s.class_id, 0)
         
         # Also count from attendance records for this session (more accurate)
-        records_count = db.query(AttendanceRecord).filter(
-            AttendanceRecord.session_id == s.id
-        ).count()
+        records_count = records_counts.get(s.id, 0)
         
         # Use records count if available (reflects actual class size at time of session)
         actual_total = records_count if records_count > 0 else total_students
@@ -712,7 +735,16 @@ async def get_attendance_records(
     db: Session = Depends(get_db)
 ):
     """Get attendance records with filtering options"""
-    query = db.query(AttendanceRecord).join(Student).join(AttendanceSession)
+    # Reuse the filter JOINs to populate record.student / record.session
+    query = (
+        db.query(AttendanceRecord)
+        .join(AttendanceRecord.student)
+        .join(AttendanceRecord.session)
+        .options(
+            contains_eager(AttendanceRecord.student).joinedload(Student.class_obj),
+            contains_eager(AttendanceRecord.session)
+        )
+    )
     
     if session_id:
         query = query.filter(AttendanceRecord.session_id == session_id)
@@ -3,12 +3,14 @@ Configuration management API endpoints
 """
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from dataclasses import asdict
 from typing import Dict, List, Any
 import logging
 
 from config import (
-    MODEL_CONFIGS, DETECTOR_CONFIGS, AVAILABLE_DETECTORS, UNAVAILABLE_DETECTORS,
-    FACE_RECOGNITION_MODEL, FACE_DETECTOR_BACKEND, FACE_DISTANCE_THRESHOLD
+    MODEL_CONFIGS, DETECTOR_CONFIGS, get_detector_availability,
+    FACE_RECOGNITION_MODEL, FACE_DETECTOR_BACKEND, FACE_DISTANCE_THRESHOLD,
+    FACE_DISTANCE_THRESHOLD_EXPLICIT
 )
 from dependencies import get_db
 from database import Student
@@ -23,7 +25,7 @@ async def get_available_models():
     try:
         return {
             "current_model": FACE_RECOGNITION_MODEL,
-            "available_models": MODEL_CONFIGS,
+            "available_models": {name: asdict(config) for name, config in MODEL_CONFIGS.items()},
             "description": "Face recognition models with their default thresholds and embedding dimensions"
         }
     except Exception as e:
@@ -35,13 +37,14 @@ async def get_available_models():
 async def get_available_detectors():
     """Get all face detector backends and their availability status"""
     try:
+        available_detectors, unavailable_detectors = get_detector_availability()
         return {
             "current_detector": FACE_DETECTOR_BACKEND,
             "available_detectors": {
-                name: DETECTOR_CONFIGS[name] for name in AVAILABLE_DETECTORS
+                name: dict(DETECTOR_CONFIGS[name]) for name in available_detectors
             },
             "unavailable_detectors": {
-                name: DETECTOR_CONFIGS[name] for name in UNAVAILABLE_DETECTORS
+                name: dict(DETECTOR_CONFIGS[name]) for name in unavailable_detectors
             },
             "description": "Face detector backends with their performance characteristics"
         }
@@ -55,22 +58,23 @@ async def get_current_configuration():
     """Get current face recognition system configuration"""
     try:
         # Get model-specific threshold
-        model_default_threshold = MODEL_CONFIGS.get(FACE_RECOGNITION_MODEL, {}).get("threshold", "Unknown")
+        model_config = MODEL_CONFIGS.get(FACE_RECOGNITION_MODEL)
+        model_default_threshold = model_config.threshold if model_config else "Unknown"
         
         # Check if threshold is explicitly set in .env
-        import os
-        env_threshold_explicit = os.getenv("FACE_DISTANCE_THRESHOLD") is not None
+        env_threshold_explicit = FACE_DISTANCE_THRESHOLD_EXPLICIT
+        available_detectors, unavailable_detectors = get_detector_availability()
         
         return {
             "model": {
                 "name": FACE_RECOGNITION_MODEL,
-                "config": MODEL_CONFIGS.get(FACE_RECOGNITION_MODEL, {}),
+                "config": asdict(model_config) if model_config else {},
                 "available": FACE_RECOGNITION_MODEL in MODEL_CONFIGS
             },
             "detector": {
                 "name": FACE_DETECTOR_BACKEND,
-                "config": DETECTOR_CONFIGS.get(FACE_DETECTOR_BACKEND, {}),
-                "available": FACE_DETECTOR_BACKEND in AVAILABLE_DETECTORS
+                "config": dict(DETECTOR_CONFIGS.get(FACE_DETECTOR_BACKEND, {})),
+                "available": FACE_DETECTOR_BACKEND in available_detectors
             },
             "threshold": {
                 "current": FACE_DISTANCE_THRESHOLD,
@@ -80,8 +84,8 @@ async def get_current_configuration():
             },
             "system_status": {
                 "available_models": len(MODEL_CONFIGS),
-                "available_detectors": len(AVAILABLE_DETECTORS),
-                "unavailable_detectors": len(UNAVAILABLE_DETECTORS)
+                "available_detectors": len(available_detectors),
+                "unavailable_detectors": len(unavailable_detectors)
             }
         }
     except Exception as e:
@@ -94,11 +98,12 @@ async def get_detector_requirements():
     """Get installation requirements for all detector backends"""
     try:
         requirements = {}
+        available_detectors, _ = get_detector_availability()
         
         for detector_name, config in DETECTOR_CONFIGS.items():
             requirements[detector_name] = {
                 "requirements": config.get("requirements", []),
-                "available": detector_name in AVAILABLE_DETECTORS,
+                "available": detector_name in available_detectors,
                 "install_command": f"pip install {' '.join(config.get('requirements', []))}" if config.get('requirements') else "Already available"
             }
         
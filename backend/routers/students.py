@@ -13,8 +13,10 @@ from sqlalchemy.orm import Session
 
 from database import Student, Class, AttendanceRecord, AttendanceSession, LeaveRecord
 from dependencies import get_db, get_face_recognizer
-from config import STATIC_DIR
+from config import MAX_FILE_SIZE, STATIC_DIR_STR
+from error_handling import require_image_upload
 from utils.storage_utils import storage_manager
+from ai.embedding_storage import read_embedding_blob
 from routers.auth import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -327,7 +329,7 @@ async def get_students(
                 "photo_url": f"/static/dataset/{s.name.replace(' ', '_')}_{s.roll_no}/face.jpg" if s.photo_path else None,
                 "embedding_confidence": s.embedding_confidence,
                 "adaptive_threshold": s.adaptive_threshold,
-                "has_enhanced_embeddings": bool(s.embedding_variants_path)
+                "has_enhanced_embeddings": bool(s.has_enhanced_embeddings)
             }
             for s in students
         ]
@@ -369,7 +371,7 @@ async def get_students_simple(
                 "photo_url": f"/static/dataset/{s.name.replace(' ', '_')}_{s.roll_no}/face.jpg" if s.photo_path else None,
                 "embedding_confidence": s.embedding_confidence,
                 "adaptive_threshold": s.adaptive_threshold,
-                "has_enhanced_embeddings": bool(s.embedding_variants_path)
+                "has_enhanced_embeddings": bool(s.has_enhanced_embeddings)
             }
             for s in students
         ]
@@ -566,7 +568,7 @@ async def get_student(student_id: int, db: Session = Depends(get_db)):
         "photo_url": f"/static/dataset/{student.name.replace(' ', '_')}_{student.roll_no}/face.jpg" if student.photo_path else None,
         "embedding_confidence": student.embedding_confidence,
         "adaptive_threshold": student.adaptive_threshold,
-        "has_enhanced_embeddings": bool(student.embedding_variants_path)
+        "has_enhanced_embeddings": bool(student.has_enhanced_embeddings)
     }
 
 
@@ -625,9 +627,9 @@ async def register_student(
         if not upload_list:
             raise HTTPException(status_code=400, detail="At least one image file is required")
 
+        # Size, content type and magic bytes - before any upload is read
         for f in upload_list:
-            if not (f.content_type or '').startswith('image/'):
-                raise HTTPException(status_code=400, detail="All uploaded files must be images")
+            require_image_upload(f, MAX_FILE_SIZE)
 
         # Check for existing student
         existing = db.query(Student).filter(
@@ -669,7 +671,7 @@ async def register_student(
                 for photo_url in stored_photos:
                     if "/static/" in photo_url:
                         relative_path = photo_url.split("/static/")[1]
-                        local_path = str(STATIC_DIR / relative_path)
+                        local_path = os.path.join(STATIC_DIR_STR, relative_path)
                         temp_paths.append(local_path)
 
             # Generate face embeddings using enhanced system
@@ -716,6 +718,7 @@ async def register_student(
             parents_mobile=parents_mobile,
             photo_path=stored_photos[0] if stored_photos else None,  # Store primary photo URL
             face_encoding_path=embedding_info["embedding_path"],
+            face_encoding=read_embedding_blob(embedding_info["embedding_path"]),
             embedding_variants_path=embedding_info.get("variants_path"),
             embedding_metadata_path=embedding_info.get("metadata_path"),
             embedding_confidence=embedding_info.get("confidence_score", 0.8),
@@ -952,7 +955,7 @@ async def update_student(
                     for photo_url in stored_photos:
                         if "/static/" in photo_url:
                             relative_path = photo_url.split("/static/")[1]
-                            temp_paths.append(str(STATIC_DIR / relative_path))
+                            temp_paths.append(os.path.join(STATIC_DIR_STR, relative_path))
                 
                 # Generate NEW embeddings with CURRENT model (Facenet512)
                 from ai.embedding_integration import generate_student_embeddings
@@ -967,6 +970,7 @@ async def update_student(
                 # Update student with new embedding paths
                 student.photo_path = stored_photos[0] if stored_photos else None
                 student.face_encoding_path = embedding_info["embedding_path"]
+                student.face_encoding = read_embedding_blob(embedding_info["embedding_path"])
                 student.embedding_variants_path = embedding_info.get("variants_path")
                 student.embedding_metadata_path = embedding_info.get("metadata_path")
                 student.embedding_confidence = embedding_info.get("confidence_score", 0.8)
@@ -1150,12 +1154,7 @@ async def upgrade_student_embeddings(
             # Reload student in face recognizer memory
             fr = get_face_recognizer()
             if fr:
-                # Remove old entry
-                fr.known_students_db = [
-                    s for s in fr.known_students_db 
-                    if s['id'] != student_id
-                ]
-                # Add updated entry
+                # Replace the entry (add_student_to_memory drops the old one first)
                 fr.add_student_to_memory({
                     'id': student.id,
                     'name': student.name,
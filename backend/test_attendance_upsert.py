@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for upsert_attendance_records on an in-memory SQLite database.
+Checks that re-marking a student updates the existing record in place and
+that the total_present triggers follow the change.
+"""
+
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import (
+    Base,
+    Class,
+    Student,
+    AttendanceSession,
+    AttendanceRecord,
+    has_record_key_index,
+    upsert_attendance_records,
+)
+
+
+def _make_session():
+    """Fresh in-memory database with the full schema (index and triggers included)"""
+    engine = create_engine("sqlite://", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _seed(db):
+    """One class with two students and an empty attendance session"""
+    class_obj = Class(name="BDS 1st Year", section="A")
+    db.add(class_obj)
+    db.flush()
+
+    students = [
+        Student(name=f"Student {i}", age=20, roll_no=f"R{i}", prn=f"P{i}",
+                seat_no=f"S{i}", class_id=class_obj.id)
+        for i in range(2)
+    ]
+    db.add_all(students)
+    session = AttendanceSession(session_name="Morning", class_id=class_obj.id)
+    db.add(session)
+    db.commit()
+    return session, students
+
+
+def _record(session_id, student_id, is_present, confidence):
+    return {
+        "session_id": session_id,
+        "student_id": student_id,
+        "is_present": is_present,
+        "confidence": confidence,
+        "detection_details": {"confidence": confidence},
+    }
+
+
+def test_record_key_index_present():
+    db = _make_session()
+    assert has_record_key_index(db.get_bind())
+
+
+def test_upsert_updates_existing_record_in_place():
+    db = _make_session()
+    session, students = _seed(db)
+
+    upsert_attendance_records(db, [
+        _record(session.id, students[0].id, False, 0.1),
+        _record(session.id, students[1].id, True, 0.9),
+    ])
+    db.commit()
+
+    first = db.execute(
+        select(AttendanceRecord).where(AttendanceRecord.student_id == students[0].id)
+    ).scalar_one()
+    first_id = first.id
+    db.refresh(session)
+    assert session.total_present == 1
+
+    # Same (session, student) key again - must update rather than add a row
+    upsert_attendance_records(db, [_record(session.id, students[0].id, True, 0.8)])
+    db.commit()
+    db.expire_all()
+
+    records = db.execute(
+        select(AttendanceRecord).where(AttendanceRecord.session_id == session.id)
+    ).scalars().all()
+    assert len(records) == 2
+
+    updated = next(r for r in records if r.student_id == students[0].id)
+    assert updated.id == first_id
+    assert updated.is_present is True
+    assert updated.confidence == 0.8
+    assert updated.detection_details == {"confidence": 0.8}
+
+    db.refresh(session)
+    assert session.total_present == 2
+
+
+if __name__ == "__main__":
+    test_record_key_index_present()
+    test_upsert_updates_existing_record_in_place()
+    print("✅ All attendance upsert tests passed")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for the standard recognizer's class photo matching.
+Runs a student registered through the enhanced embedding writer and one
+registered through the standard path through process_class_photo; detection
+and embedding are replaced by synthetic faces so no model weights are needed.
+"""
+
+import os
+import sys
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import face_recognition
+from face_recognition import ClassBasedFaceRecognizer, DeepFace, DISTANCE_THRESHOLD
+from ai.embedding_storage import save_enhanced_embedding
+from ai.enhanced_embedding import EnhancedEmbeddingGenerator
+
+DIM = 512
+
+
+def _face(fill):
+    """Detected face whose pixel value identifies which embedding it yields"""
+    return {
+        "face": np.full((160, 160, 3), fill, dtype=np.float32),
+        "facial_area": {"x": 0, "y": 0, "w": 160, "h": 160},
+        "confidence": 0.99,
+    }
+
+
+def test_enhanced_student_matches_at_raw_scale():
+    rng = np.random.default_rng(3)
+    # ArcFace-like raw embeddings (norm ~28)
+    enhanced_embedding = (rng.normal(size=DIM) * 1.25).astype(np.float32)
+    standard_embedding = (rng.normal(size=DIM) * 1.25).astype(np.float32)
+
+    # Each face is a slightly different view of its student
+    face_embeddings = {
+        0.25: enhanced_embedding + rng.normal(scale=0.1, size=DIM),
+        0.75: standard_embedding + rng.normal(scale=0.1, size=DIM),
+    }
+
+    def represent(img_path, **kwargs):
+        embedding = face_embeddings.get(float(np.asarray(img_path).flat[0]), np.zeros(DIM))
+        return [{"embedding": np.asarray(embedding).tolist()}]
+
+    with tempfile.TemporaryDirectory() as root, \
+            mock.patch.object(DeepFace, "build_model"), \
+            mock.patch.object(DeepFace, "represent", side_effect=represent), \
+            mock.patch.object(DeepFace, "extract_faces", return_value=[_face(0.25), _face(0.75)]), \
+            mock.patch.object(face_recognition, "ENABLE_QUALITY_ASSESSMENT", False):
+        recognizer = ClassBasedFaceRecognizer()
+
+        # Enhanced registration: the generator's final embedding, saved by the enhanced writer
+        generator = EnhancedEmbeddingGenerator()
+        primary_embedding = generator._optimize_for_student(
+            {"ArcFace": {"quality_weighted": enhanced_embedding}}, "Student 1", "R1"
+        )
+        enhanced_paths = save_enhanced_embedding(os.path.join(root, "enhanced"), primary_embedding,
+                                                 {"confidence_score": 0.9, "method": "enhanced_ensemble"})
+        standard_path = os.path.join(root, "standard_embedding.npy")
+        np.save(standard_path, standard_embedding)
+
+        for student_id, path in ((1, enhanced_paths["embedding_path"]), (2, standard_path)):
+            recognizer.add_student_to_memory({
+                "id": student_id,
+                "name": f"Student {student_id}",
+                "roll_no": f"R{student_id}",
+                "class_id": 1,
+                "face_encoding_path": path,
+            })
+
+        results = recognizer.process_class_photo("class_photo.jpg")
+
+    identified = {s["student_id"]: s for s in results["identified_students"]}
+    assert set(identified) == {1, 2}
+    assert results["unidentified_faces_count"] == 0
+
+    # Both students are compared on the same (raw) scale
+    for student in identified.values():
+        assert student["euclidean_distance"] < DISTANCE_THRESHOLD / 4
+
+
+if __name__ == "__main__":
+    test_enhanced_student_matches_at_raw_scale()
+    print("✅ All class photo matching tests passed")
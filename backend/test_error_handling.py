@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for error_status_code - HTTP status resolution through the exception MRO.
+"""
+
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+
+from error_handling import (
+    AttendanceSystemError,
+    DatabaseError,
+    FaceRecognitionError,
+    FileProcessingError,
+    ValidationError,
+    error_status_code,
+)
+
+
+class RosterValidationError(ValidationError):
+    """Subclass without its own mapping - resolves through ValidationError"""
+
+
+def test_mapped_types():
+    assert error_status_code(ValidationError("bad input")) == 400
+    assert error_status_code(FaceRecognitionError("no face")) == 422
+    assert error_status_code(DatabaseError("db down")) == 500
+    assert error_status_code(FileProcessingError("bad file")) == 500
+
+
+def test_subclass_resolves_through_mro():
+    assert error_status_code(RosterValidationError("unknown roll number")) == 400
+
+
+def test_http_exception_keeps_its_status():
+    assert error_status_code(HTTPException(status_code=404, detail="missing")) == 404
+
+
+def test_unmapped_errors_use_default():
+    assert error_status_code(RuntimeError("boom")) == 500
+    assert error_status_code(AttendanceSystemError("generic")) == 500
+    assert error_status_code(KeyError("x"), default=503) == 503
+
+
+if __name__ == "__main__":
+    test_mapped_types()
+    test_subclass_resolves_through_mro()
+    test_http_exception_keeps_its_status()
+    test_unmapped_errors_use_default()
+    print("✅ All error handling tests passed")
@@ -235,20 +235,10 @@ async def run_embedding_upgrade_async(
             task_manager.update_progress(task_id, 90, "Saving embeddings to database...")
             
             # Update database
-            import numpy as np
-            import json
-            
             os.makedirs(student_dir, exist_ok=True)
             
-            # Save primary embedding
-            primary_path = os.path.join(student_dir, "face_embedding.npy")
-            np.save(primary_path, result['primary_embedding'])
-            
-            # Save variants
-            variants_path = os.path.join(student_dir, "embedding_variants.npy")
-            np.save(variants_path, result['embedding_variants'])
-            
-            # Save metadata with model info
+            # Save primary embedding and metadata with model info
+            from ai.embedding_storage import save_enhanced_embedding, read_embedding_blob
             from config import FACE_RECOGNITION_MODEL, FACE_DETECTOR_BACKEND
             
             metadata = {
@@ -261,16 +251,19 @@ async def run_embedding_upgrade_async(
                 'models_used': list(result['ensemble_embeddings'].keys())
             }
             
-            metadata_path = os.path.join(student_dir, "embedding_metadata.json")
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            saved_paths = save_enhanced_embedding(
+                student_dir, result['primary_embedding'], metadata
+            )
+            primary_path = saved_paths['embedding_path']
+            metadata_path = saved_paths['metadata_path']
             
             # Update student record
-            student.embedding_variants_path = variants_path
+            student.embedding_variants_path = None  # Legacy noise variants are no longer generated
             student.embedding_metadata_path = metadata_path
             student.embedding_confidence = result['confidence_score']
             student.has_enhanced_embeddings = True
             student.face_encoding_path = primary_path
+            student.face_encoding = read_embedding_blob(primary_path)
             student.embedding_model = FACE_RECOGNITION_MODEL
             student.embedding_detector = FACE_DETECTOR_BACKEND
             
@@ -10,7 +10,7 @@ from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException
 from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.utils import get_column_letter
@@ -255,7 +255,9 @@ class AttendanceExporter:
         # Get all attendance records
         detailed_records = []
         for session in sessions:
-            records = db.query(AttendanceRecord).join(Student).filter(
+            records = db.query(AttendanceRecord).join(AttendanceRecord.student).options(
+                contains_eager(AttendanceRecord.student)
+            ).filter(
                 AttendanceRecord.session_id == session.id
             ).all()
             
@@ -283,8 +283,8 @@ def log_startup_info():
     import platform
     from config import (
         PHOTO_STORAGE_TYPE, DATABASE_URL, FACE_RECOGNITION_MODEL, 
-        FACE_DETECTOR_BACKEND, FACE_DISTANCE_THRESHOLD, MODEL_CONFIGS,
-        LOG_THROTTLE_MS, PORT, HOST
+        FACE_DETECTOR_BACKEND, FACE_DISTANCE_THRESHOLD, FACE_DISTANCE_THRESHOLD_EXPLICIT,
+        MODEL_CONFIGS, LOG_THROTTLE_MS, PORT, HOST
     )
     
     logger.info("🚀 Starting BTech Attendance System")
@@ -316,8 +316,7 @@ def log_startup_info():
     logger.info(f"👁️ Detector: {FACE_DETECTOR_BACKEND}")
     
     # Check if threshold is explicitly set in .env
-    import os
-    env_threshold_set = os.getenv("FACE_DISTANCE_THRESHOLD") is not None
+    env_threshold_set = FACE_DISTANCE_THRESHOLD_EXPLICIT
     
     if env_threshold_set:
         logger.info(f"📏 .env Threshold: {FACE_DISTANCE_THRESHOLD} (explicit)")
@@ -327,13 +326,13 @@ def log_startup_info():
     # Model-specific configuration
     if FACE_RECOGNITION_MODEL in MODEL_CONFIGS:
         model_config = MODEL_CONFIGS[FACE_RECOGNITION_MODEL]
-        logger.info(f"⚙️ Model Default - Threshold: {model_config['threshold']}, Embedding Size: {model_config['embedding_size']}")
+        logger.info(f"⚙️ Model Default - Threshold: {model_config.threshold}, Embedding Size: {model_config.embedding_size}")
         
         # Show effective threshold logic
         if env_threshold_set:
             logger.info(f"🔄 Effective Threshold: {FACE_DISTANCE_THRESHOLD} (using explicit .env value)")
         else:
-            logger.info(f"✅ Effective Threshold: {model_config['threshold']} (using model default)")
+            logger.info(f"✅ Effective Threshold: {model_config.threshold} (using model default)")
     else:
         if env_threshold_set:
             logger.info(f"⚠️ No specific config found for {FACE_RECOGNITION_MODEL}, using explicit .env threshold: {FACE_DISTANCE_THRESHOLD}")
@@ -344,10 +343,11 @@ def log_startup_info():
     logger.info("📋 Available Models:")
     for model_name, config in MODEL_CONFIGS.items():
         status = "🟢 ACTIVE" if model_name == FACE_RECOGNITION_MODEL else "⚪"
-        logger.info(f"   {status} {model_name}: threshold={config['threshold']}, embedding={config['embedding_size']}d")
+        logger.info(f"   {status} {model_name}: threshold={config.threshold}, embedding={config.embedding_size}d")
     
     # Detector configuration
-    from config import DETECTOR_CONFIGS, AVAILABLE_DETECTORS, UNAVAILABLE_DETECTORS
+    from config import DETECTOR_CONFIGS, get_detector_availability
+    available_detectors, unavailable_detectors = get_detector_availability()
     logger.info("🔍 DETECTOR CONFIGURATION")
     if FACE_DETECTOR_BACKEND in DETECTOR_CONFIGS:
         detector_config = DETECTOR_CONFIGS[FACE_DETECTOR_BACKEND]
@@ -358,14 +358,14 @@ def log_startup_info():
     
     # Available detectors
     logger.info("📋 Available Detectors:")
-    for detector_name in AVAILABLE_DETECTORS:
+    for detector_name in available_detectors:
         config = DETECTOR_CONFIGS.get(detector_name, {})
         status = "🟢 ACTIVE" if detector_name == FACE_DETECTOR_BACKEND else "✅"
         logger.info(f"   {status} {detector_name}: {config.get('performance', 'Unknown')} performance, {config.get('accuracy', 'Unknown')} accuracy")
     
-    if UNAVAILABLE_DETECTORS:
+    if unavailable_detectors:
         logger.info("❌ Unavailable Detectors:")
-        for detector_name in UNAVAILABLE_DETECTORS:
+        for detector_name in unavailable_detectors:
             config = DETECTOR_CONFIGS.get(detector_name, {})
             requirements = ", ".join(config.get('requirements', ['Unknown']))
             logger.info(f"   ⚪ {detector_name}: requires {requirements}")
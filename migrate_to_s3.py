@@ -10,14 +10,12 @@ from pathlib import Path
 from dotenv import load_dotenv
 import boto3
 from botocore.exceptions import ClientError
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 # Add backend to path
 sys.path.append(str(Path(__file__).parent / "backend"))
 
-from database import Student, AttendanceSession
-from config import DATABASE_URL, STATIC_DIR
+from database import SessionLocal, Student, AttendanceSession
+from config import STATIC_DIR
 
 # Load environment variables from root .env (single source of truth)
 load_dotenv(Path(__file__).parent / ".env")
@@ -47,9 +45,7 @@ class S3Migrator:
             region_name=self.aws_region
         )
         
-        # Initialize database
-        engine = create_engine(DATABASE_URL)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        # Initialize database - shared session factory, so one engine and one model registry
         self.db = SessionLocal()
         
         logger.info("S3 Migrator initialized successfully")